@@ -0,0 +1,96 @@
+import os, sys, time
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from calculate.calculate_budget import aggregate_monthly, compute_rollups, compute_summary
+from visualize.visualize_budget import build_sankey
+
+SIZES = [(10_000, 1_000), (100_000, 2_000), (1_000_000, 10_000)]
+REFERENCE_MAX_ROWS = 10_000
+TOP_N = 10
+
+def generate_ledger(rows, merchants, seed=0):
+    """
+    Build a synthetic transaction ledger.
+
+    Args:
+        rows (int): Number of transactions.
+        merchants (int): Number of distinct expense merchants.
+        seed (int): Random seed.
+
+    Returns:
+        pd.DataFrame: Date, Source, Merchant, Category and Amount columns.
+    """
+    rng = np.random.default_rng(seed)
+    is_income = rng.random(rows) < 0.05
+    merchant = np.array([f"Merchant {i}" for i in range(merchants)])[rng.zipf(1.3, size=rows) % merchants]
+    source = np.array(["Groceries", "Dining", "Travel", "Shopping", "Bills & Utilities", "Rent", "Health"])[
+        rng.integers(0, 7, size=rows)
+    ]
+    return pd.DataFrame({
+        "Date": pd.Timestamp("2015-01-01") + pd.to_timedelta(rng.integers(0, 3650, size=rows), unit="D"),
+        "Source": np.where(is_income, np.array(["Job 1", "Job 2", "Interest"])[rng.integers(0, 3, size=rows)], source),
+        "Merchant": np.where(is_income, None, merchant),
+        "Category": np.where(is_income, "income", "expenses"),
+        "Amount": np.where(is_income, rng.gamma(4, 600, size=rows), rng.gamma(2, 40, size=rows)).round(2),
+    })
+
+def reference_sankey(data):
+    """The list-based builder the dashboard used before: one link per row and a linear search per node."""
+    nodes, links = [], {"source": [], "target": [], "value": []}
+
+    def add_node(label):
+        if label not in nodes:
+            nodes.append(label)
+        return nodes.index(label)
+
+    for _, row in data[data["Category"] == "income"].iterrows():
+        links["source"].append(add_node(row["Source"]))
+        links["target"].append(add_node("Budget"))
+        links["value"].append(row["Amount"])
+    for _, row in data[data["Category"] == "expenses"].iterrows():
+        links["source"].append(add_node("Budget"))
+        links["target"].append(add_node(row["Merchant"]))
+        links["value"].append(row["Amount"])
+    return nodes, links
+
+def link_totals(nodes, links):
+    """Amount per (source label, target label), for comparing builders."""
+    return pd.DataFrame({
+        "source": np.asarray(nodes, dtype=object)[np.asarray(links["source"])],
+        "target": np.asarray(nodes, dtype=object)[np.asarray(links["target"])],
+        "value": np.asarray(links["value"], dtype=float),
+    }).groupby(["source", "target"])["value"].sum()
+
+def main():
+    for rows, merchants in SIZES:
+        ledger = generate_ledger(rows, merchants)
+
+        start = time.perf_counter()
+        monthly = aggregate_monthly(ledger)
+        compute_rollups(monthly)
+        compute_summary(monthly)
+        rollup_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        nodes, links = build_sankey(ledger, TOP_N, merchants=True)
+        sankey_elapsed = time.perf_counter() - start
+        line = (
+            f"{rows:>9,} rows, {merchants:>6,} merchants: rollups {rollup_elapsed:6.3f}s | "
+            f"sankey {sankey_elapsed:6.3f}s, {len(nodes)} nodes, {len(links)} links"
+        )
+
+        if rows <= REFERENCE_MAX_ROWS:
+            # Compare without bucketing, with merchants as the expense nodes the old builder drew
+            flat = ledger.assign(Source=ledger["Source"].where(ledger["Category"] == "income", ledger["Merchant"]))
+            start = time.perf_counter()
+            reference = link_totals(*reference_sankey(flat))
+            reference_elapsed = time.perf_counter() - start
+            nodes, links = build_sankey(flat)
+            totals = link_totals(nodes, links).drop(("Budget", "Savings"), errors="ignore")
+            pd.testing.assert_series_equal(totals.sort_index(), reference.sort_index())
+            line += f" | reference {reference_elapsed:6.3f}s | outputs match"
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import os, re, sys, time
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from helpers.conversions.categorize_transactions import categorize, compile_rules
+
+SIZES = [10_000, 100_000, 1_000_000]
+REFERENCE_MAX_ROWS = 10_000
+MERCHANTS = 500
+STORES = 40
+
+def generate_rules(merchants):
+    """One keyword rule per merchant, a few regex rules and an amount rule, like a grown rules file."""
+    rules = [{"source": "Rent", "category": "expenses", "keywords": ["MERCHANT 7 "], "min_amount": 500}]
+    rules += [{"source": f"Budget {i % 25}", "keywords": [f"MERCHANT {i} "]} for i in range(0, merchants, 2)]
+    # A keyword that starts others ("MERCHANT 40 ", "MERCHANT 412 ", ...) outranks some of them
+    rules.insert(10, {"source": "Prefix", "keywords": ["merchant 4"]})
+    rules += [{"source": "Dining", "regex": r"\b(CAFE|COFFEE|PIZZA)\b"}, {"source": "Travel", "regex": r"\bAIR\w*\b"}]
+    return rules
+
+def generate_transactions(rows, seed=0):
+    """
+    Build synthetic card transactions.
+
+    Args:
+        rows (int): Number of transactions.
+        seed (int): Random seed.
+
+    Returns:
+        pd.DataFrame: Date, Description and signed Amount columns.
+    """
+    rng = np.random.default_rng(seed)
+    suffixes = np.array(["", " CAFE", " COFFEE", " AIRLINES", " LLC", " STORE"])
+    merchant = rng.zipf(1.2, size=rows) % MERCHANTS
+    descriptions = pd.Series(
+        [f"POS *MERCHANT {m} #{s}{suffix}" for m, s, suffix in zip(
+            merchant, rng.integers(0, STORES, size=rows), suffixes[rng.integers(0, len(suffixes), size=rows)]
+        )]
+    )
+    return pd.DataFrame({
+        "Date": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 1500, size=rows), unit="D"),
+        "Description": descriptions,
+        "Amount": -rng.gamma(2, 300, size=rows).round(2),
+    })
+
+def reference_sources(transactions, rules):
+    """Try every rule on every row in order, stopping at the first that matches."""
+    compiled = [
+        (re.compile("|".join(
+            [re.escape(keyword) for keyword in rule.get('keywords', [])] + ([rule['regex']] if 'regex' in rule else [])
+        ), re.IGNORECASE), rule) for rule in rules
+    ]
+    sources = []
+    for description, amount in zip(transactions['Description'], transactions['Amount']):
+        for pattern, rule in compiled:
+            if pattern.search(description) and rule.get('min_amount', 0) <= abs(amount) <= rule.get('max_amount', np.inf):
+                sources.append(rule['source'])
+                break
+        else:
+            sources.append("Uncategorized")
+    return sources
+
+def main():
+    rules = generate_rules(MERCHANTS)
+    matcher = compile_rules(rules)
+    for rows in SIZES:
+        transactions = generate_transactions(rows)
+        start = time.perf_counter()
+        ledger, unmatched = categorize(transactions, matcher, cache={})
+        elapsed = time.perf_counter() - start
+        line = (
+            f"{rows:>9,} rows, {transactions['Description'].nunique():>6,} descriptions, {len(rules)} rules: "
+            f"categorize {elapsed:6.3f}s ({rows / elapsed:,.0f} rows/s), {unmatched.mean():.1%} unmatched"
+        )
+
+        if rows <= REFERENCE_MAX_ROWS:
+            start = time.perf_counter()
+            reference = reference_sources(transactions, rules)
+            reference_elapsed = time.perf_counter() - start
+            assert ledger['Source'].tolist() == reference, "categories differ from the reference"
+            line += f" | reference {reference_elapsed:6.3f}s | outputs match"
+        print(line)
+
+if __name__ == "__main__":
+    main()
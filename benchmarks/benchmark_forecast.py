@@ -0,0 +1,50 @@
+import os, sys, tempfile, time
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from benchmarks.benchmark_budget import generate_ledger
+from calculate.calculate_forecast import classify_sources, compute_trend, load_state, update_state
+from helpers.utils.storage import write_table
+
+SIZES = [(100_000, 1_000), (1_000_000, 10_000)]
+APPENDED_MONTHS = 3
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        ledger_file = os.path.join(directory, "ledger.parquet")
+        for rows, merchants in SIZES:
+            # Source by merchant gives as many forecast series as merchants
+            ledger = generate_ledger(rows, merchants).sort_values("Date")
+            ledger["Source"] = ledger["Merchant"].fillna(ledger["Source"])
+            months = ledger["Date"].dt.to_period("M")
+            cutoff = months.max() - APPENDED_MONTHS
+
+            write_table(ledger[months <= cutoff], ledger_file, schema=None)
+            state, _ = update_state(load_state(None), ledger_file)
+
+            # Append the new months, then update the saved state and rebuild it from scratch
+            write_table(ledger, ledger_file, schema=None)
+            start = time.perf_counter()
+            incremental, added = update_state(state, ledger_file)
+            classify_sources(incremental)
+            incremental_elapsed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            rebuilt, _ = update_state(load_state(None), ledger_file)
+            classify_sources(rebuilt)
+            rebuild_elapsed = time.perf_counter() - start
+
+            pd.testing.assert_frame_equal(incremental, rebuilt)
+            compute_trend(rebuilt, classify_sources(rebuilt))
+
+            # Re-categorising a transaction in a folded month must rebuild the state
+            ledger.loc[ledger.index[-len(ledger) // 10], "Source"] = "Recategorised"
+            write_table(ledger, ledger_file, schema=None)
+            recategorised, _ = update_state(incremental, ledger_file)
+            pd.testing.assert_frame_equal(recategorised, update_state(load_state(None), ledger_file)[0])
+            print(
+                f"{rows:>9,} rows, {len(rebuilt):>6,} series: add {added} months {incremental_elapsed:6.3f}s | "
+                f"rebuild {months.nunique() - 1} months {rebuild_elapsed:6.3f}s | states match"
+            )
+
+if __name__ == "__main__":
+    main()
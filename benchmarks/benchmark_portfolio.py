@@ -0,0 +1,122 @@
+import os, sys, time
+import numpy as np
+import pandas as pd
+from datetime import datetime
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from calculate.calculate_lots import build_lots, realize_gains, summarize_positions
+from calculate.calculate_portfolio import compute_portfolio_stats
+from helpers.utils.constants import LTH_YEARS
+
+SIZES = [1_000, 100_000, 1_000_000]
+REFERENCE_MAX_ROWS = 10_000
+
+def generate_portfolio(rows, seed=0):
+    """
+    Build a synthetic portfolio and matching prices.
+
+    Args:
+        rows (int): Number of rows to generate.
+        seed (int): Random seed.
+
+    Returns:
+        tuple: (portfolio DataFrame, prices Series)
+    """
+    rng = np.random.default_rng(seed)
+    types = rng.choice(["stock", "etf", "crypto", "cash", "401k", "hsa", "bond"], size=rows, p=[0.5, 0.2, 0.1, 0.05, 0.05, 0.05, 0.05])
+    dates = pd.Timestamp("2015-01-01") + pd.to_timedelta(rng.integers(0, 3650, size=rows), unit="D")
+    purchase_date = pd.Series(dates.strftime("%Y-%m-%d"), dtype=object)
+    purchase_date[rng.random(rows) < 0.05] = np.nan
+    purchase_date[rng.random(rows) < 0.01] = "not a date"
+
+    portfolio = pd.DataFrame({
+        "Ticker": [f"T{i}" for i in rng.integers(0, 5000, size=rows)],
+        "Type": types,
+        "Quantity": rng.uniform(0, 500, size=rows).round(4),
+        "Cost Basis": rng.choice([0.0, 10.0, 100.0, 250.5], size=rows),
+        "Purchase Date": purchase_date,
+        "Liquidity": "medium",
+    })
+    portfolio.loc[rng.random(rows) < 0.01, "Quantity"] = np.nan
+
+    prices = pd.Series(rng.uniform(1, 1000, size=rows).round(2), index=portfolio.index)
+    prices[portfolio["Type"].isin(["cash", "401k", "hsa"])] = np.nan
+    prices[portfolio["Type"] == "bond"] = np.nan
+    return portfolio, prices
+
+def reference_portfolio_stats(portfolio, prices, as_of):
+    """Row-by-row calculation matching the original iterrows implementation."""
+    results = []
+    for index, row in portfolio.iterrows():
+        quantity, cost_basis, asset_type = row['Quantity'], row['Cost Basis'], row['Type']
+        purchase_date = row['Purchase Date']
+        if pd.isna(row['Ticker']) or pd.isna(quantity):
+            results.append((0.0, 0.0, 0.0, 0.0, ''))
+            continue
+        if asset_type == "cash":
+            price, value, gain_loss, percentage_gain_loss = 1, quantity, 0, 0
+        elif asset_type in ["401k", "hsa"]:
+            price = 1
+            value = price * quantity
+            gain_loss = value - cost_basis
+            percentage_gain_loss = (gain_loss / cost_basis) * 100 if cost_basis > 0 else 100
+        else:
+            price = prices.at[index]
+            if pd.isna(price):
+                results.append((0.0, 0.0, 0.0, 0.0, ''))
+                continue
+            value = price * quantity
+            gain_loss = value - (cost_basis * quantity) if cost_basis > 0 else value
+            percentage_gain_loss = (gain_loss / (cost_basis * quantity)) * 100 if cost_basis > 0 else 100
+        if not pd.isna(purchase_date):
+            try:
+                purchase_date_obj = datetime.strptime(str(purchase_date), "%Y-%m-%d")
+                long_term_hold = "Green" if (as_of - purchase_date_obj).days / 365 > LTH_YEARS else "Red"
+            except ValueError:
+                long_term_hold = "Invalid Date"
+        else:
+            long_term_hold = "No Date"
+        results.append((price, value, gain_loss, percentage_gain_loss, long_term_hold))
+    return pd.DataFrame(results, columns=['Current Price', 'Value', 'Gain/Loss', '% Gain/Loss', 'Long-Term Hold'])
+
+def time_lots(portfolio):
+    """
+    Time lot aggregation and a HIFO sale of half of every position.
+
+    Returns:
+        float: Elapsed seconds.
+    """
+    start = time.perf_counter()
+    lots, positions = build_lots(portfolio)
+    summary = summarize_positions(lots, positions)
+    sales = summary[["Ticker", "Type"]].assign(Quantity=summary["Quantity"] / 2)
+    realize_gains(lots, positions, sales, method="hifo")
+    return time.perf_counter() - start
+
+def main():
+    as_of = datetime.now()
+    columns = ['Current Price', 'Value', 'Gain/Loss', '% Gain/Loss', 'Long-Term Hold']
+    for rows in SIZES:
+        portfolio, prices = generate_portfolio(rows)
+
+        start = time.perf_counter()
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                result = compute_portfolio_stats(portfolio, prices, as_of=as_of)
+            finally:
+                sys.stdout = stdout
+        elapsed = time.perf_counter() - start
+        line = f"{rows:>9,} rows: vectorized {elapsed:8.3f}s | lots {time_lots(result):8.3f}s"
+
+        if rows <= REFERENCE_MAX_ROWS:
+            start = time.perf_counter()
+            expected = reference_portfolio_stats(portfolio, prices, as_of)
+            reference_elapsed = time.perf_counter() - start
+            pd.testing.assert_frame_equal(
+                result[columns].reset_index(drop=True), expected, check_dtype=False
+            )
+            line += f" | iterrows {reference_elapsed:8.3f}s | outputs match"
+        print(line)
+
+if __name__ == "__main__":
+    main()
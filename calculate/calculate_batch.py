@@ -0,0 +1,189 @@
+import argparse, glob, io, os, sys, time
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from calculate.calculate_portfolio import calculate_portfolio, get_quote_mask, load_portfolio
+from helpers.utils.api import get_prices
+from helpers.utils.cache import report_cache_stats
+from helpers.utils.constants import BATCH_CONSTANTS, FILE_PATHS, STORAGE_FORMAT
+from helpers.utils.storage import FORMATS, write_table
+
+def find_portfolios(source):
+    """
+    List the portfolio files in a directory or matching a glob pattern.
+
+    Args:
+        source (str): A directory (every CSV, Parquet and Feather file in it) or a glob pattern.
+
+    Returns:
+        list: Sorted file paths.
+    """
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+        return sorted(path for path in paths if os.path.splitext(path)[1].lower() in FORMATS)
+    return sorted(glob.glob(source))
+
+def get_output_paths(input_file, output_dir):
+    """
+    Per-portfolio output paths, named after the input file.
+
+    Returns:
+        tuple: (portfolio output path, positions output path)
+    """
+    name = os.path.splitext(os.path.basename(input_file))[0]
+    return (
+        os.path.join(output_dir, f"{name}_output.{STORAGE_FORMAT}"),
+        os.path.join(output_dir, f"{name}_positions.{STORAGE_FORMAT}"),
+    )
+
+def _calculate_one(job):
+    """
+    Calculate one portfolio in a worker process with the frame loaded and prices fetched by the parent.
+
+    Args:
+        job (tuple): (input_file, output_file, positions_file, portfolio, prices)
+
+    Returns:
+        dict: Summary row for the batch report, including the captured log.
+    """
+    input_file, output_file, positions_file, portfolio, prices = job
+    start = time.perf_counter()
+    log = io.StringIO()
+    summary = {"File": os.path.basename(input_file), "Output": output_file}
+
+    try:
+        # Quotes are shared, and the history store belongs to the main portfolio
+        with redirect_stdout(log):
+            positions = calculate_portfolio(
+                input_file, output_file, positions_file=positions_file, prices=prices,
+                record_history=False, portfolio=portfolio
+            )
+    except Exception as error:
+        summary["Status"] = f"Error: {type(error).__name__}: {error}"
+    else:
+        if positions is None:
+            summary["Status"] = "Empty"
+        else:
+            cost, value = positions['Cost Basis'].sum(), positions['Value'].sum()
+            summary.update({
+                "Status": "OK",
+                "Lots": int(positions['Lots'].sum()),
+                "Positions": len(positions),
+                "Cost Basis": cost,
+                "Value": value,
+                "Gain/Loss": value - cost,
+                "% Gain/Loss": (value - cost) / cost * 100 if cost > 0 else 0.0,
+                "Long-Term Gain": positions['Long-Term Gain'].sum(),
+                "Short-Term Gain": positions['Short-Term Gain'].sum(),
+                "Undated Gain": positions['Undated Gain'].sum(),
+            })
+
+    summary["Seconds"] = time.perf_counter() - start
+    summary["Log"] = log.getvalue()
+    return summary
+
+def calculate_batch(source, output_dir=None, max_workers=None):
+    """
+    Calculate many portfolios across a process pool with one shared quote fetch.
+
+    Every file is read once, up front, to collect its (Ticker, Type) pairs. The union is
+    priced once in this process, through the quote cache and rate limiter. Each worker
+    receives the loaded frame and only the prices its file needs, so no worker re-reads
+    the file or calls the API. Files that cannot be read are reported in the summary.
+
+    Args:
+        source (str): Directory or glob pattern of portfolio files.
+        output_dir (str, optional): Where outputs and the summary go. Defaults to FILE_PATHS['BATCH_OUTPUT'].
+        max_workers (int, optional): Process pool size. Defaults to BATCH_CONSTANTS['MAX_WORKERS'].
+
+    Returns:
+        pd.DataFrame: The consolidated summary, one row per file plus a Total row.
+    """
+    output_dir = output_dir or FILE_PATHS['BATCH_OUTPUT']
+    max_workers = max_workers or BATCH_CONSTANTS['MAX_WORKERS']
+    input_files = find_portfolios(source)
+    if not input_files:
+        print(f"No portfolio files found in {source}")
+        return pd.DataFrame()
+    os.makedirs(output_dir, exist_ok=True)
+    batch_start = time.perf_counter()
+
+    # Collect each file's quote keys, then fetch the de-duplicated union once
+    portfolios, file_keys, failed = {}, {}, {}
+    for input_file in input_files:
+        try:
+            portfolio = load_portfolio(input_file)
+            quoted = portfolio.loc[get_quote_mask(portfolio), ['Ticker', 'Type']].drop_duplicates()
+        except Exception as error:
+            failed[input_file] = {
+                "File": os.path.basename(input_file),
+                "Output": get_output_paths(input_file, output_dir)[0],
+                "Status": f"Error: {type(error).__name__}: {error}",
+                "Seconds": 0.0,
+                "Log": "",
+            }
+            continue
+        portfolios[input_file] = portfolio
+        file_keys[input_file] = list(quoted.itertuples(index=False, name=None))
+
+    unique_keys = list(dict.fromkeys(key for keys in file_keys.values() for key in keys))
+    fetch_start = time.perf_counter()
+    prices = get_prices(unique_keys)
+    total_keys = sum(len(keys) for keys in file_keys.values())
+    print(f"Fetched {len(unique_keys)} unique quotes for {total_keys} file-level lookups "
+          f"in {time.perf_counter() - fetch_start:.2f}s")
+    report_cache_stats()
+
+    jobs = [
+        (
+            input_file, *get_output_paths(input_file, output_dir), portfolio,
+            {key: prices[key] for key in file_keys[input_file]},
+        )
+        for input_file, portfolio in portfolios.items()
+    ]
+    if max_workers == 1 or len(jobs) <= 1:
+        completed_jobs = [_calculate_one(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            completed_jobs = list(executor.map(_calculate_one, jobs))
+    calculated = dict(zip(portfolios, completed_jobs))
+    results = [failed[input_file] if input_file in failed else calculated[input_file] for input_file in input_files]
+
+    for result in results:
+        print(f"{result['File']}: {result['Status']} in {result['Seconds']:.2f}s")
+        if result['Status'] != "OK" and result['Log'].strip():
+            print(result['Log'].rstrip())
+
+    summary = pd.DataFrame(results).drop(columns="Log")
+    completed = summary[summary['Status'] == "OK"]
+    if not completed.empty:
+        cost, value = completed['Cost Basis'].sum(), completed['Value'].sum()
+        summary = pd.concat([summary, pd.DataFrame([{
+            "File": "Total",
+            "Status": f"{len(completed)} of {len(summary)} OK",
+            "Lots": completed['Lots'].sum(),
+            "Positions": completed['Positions'].sum(),
+            "Cost Basis": cost,
+            "Value": value,
+            "Gain/Loss": value - cost,
+            "% Gain/Loss": (value - cost) / cost * 100 if cost > 0 else 0.0,
+            "Long-Term Gain": completed['Long-Term Gain'].sum(),
+            "Short-Term Gain": completed['Short-Term Gain'].sum(),
+            "Undated Gain": completed['Undated Gain'].sum(),
+            "Seconds": time.perf_counter() - batch_start,
+        }])], ignore_index=True)
+
+    summary_file = os.path.join(output_dir, f"batch_summary.{STORAGE_FORMAT}")
+    write_table(summary, summary_file, schema=None)
+    print(f"Processed {len(input_files)} portfolios in {time.perf_counter() - batch_start:.2f}s")
+    print(f"Batch summary saved to {summary_file}")
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calculate many portfolios at once")
+    parser.add_argument("--source", default=FILE_PATHS['BATCH_INPUT'], help="Directory or glob pattern of portfolio files")
+    parser.add_argument("--output-dir", default=None, help="Directory for outputs and the summary")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    args, _ = parser.parse_known_args()
+    calculate_batch(args.source, output_dir=args.output_dir, max_workers=args.workers)
@@ -1 +1,212 @@
-# TO DO
\ No newline at end of file
+import argparse, os, sys, time
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from helpers.utils.constants import BUDGET_CONSTANTS, FILE_PATHS
+from helpers.utils.schema import BUDGET_SCHEMA, BUDGET_SUMMARY_SCHEMA, LEDGER_SCHEMA, as_text
+from helpers.utils.storage import read_table, write_table
+
+ROLLUP_COLUMNS = ["Frequency", "Period", "Start", "Category", "Source", "Merchant", "Amount", "Transactions", "Share (%)"]
+SUMMARY_COLUMNS = [
+    "Frequency", "Period", "Start", "Income", "Expenses", "Savings", "Savings Rate (%)",
+    "Income Change", "Expenses Change", "Savings Change", "Savings Rate Change"
+]
+
+def load_ledger(input_file):
+    """
+    Read a transaction ledger, dropping rows that cannot be placed in a period.
+
+    Args:
+        input_file (str): Path to a ledger with Date, Source, Category and Amount columns.
+
+    Returns:
+        pd.DataFrame: Ledger rows with a date, a category and an amount.
+    """
+    ledger = read_table(input_file, LEDGER_SCHEMA)
+    return ledger.dropna(subset=['Date', 'Category', 'Amount'])
+
+def aggregate_monthly(ledger):
+    """
+    Sum a ledger by month, category, source and merchant.
+
+    This is the only pass over individual transactions; quarterly and yearly rollups
+    are built from its result, which has one row per source and merchant per month.
+
+    Args:
+        ledger (pd.DataFrame): Rows from `load_ledger`.
+
+    Returns:
+        pd.DataFrame: Columns Period (monthly periods), Category, Source, Merchant ("" when the
+                      ledger has none), Amount and Transactions.
+    """
+    merchant = ledger['Merchant'] if 'Merchant' in ledger else pd.Series(np.nan, index=ledger.index)
+    keys = [
+        ledger['Date'].dt.to_period("M").rename("Period"),
+        as_text(ledger['Category']).rename("Category"),
+        as_text(ledger['Source']).rename("Source"),
+        as_text(merchant).rename("Merchant"),
+    ]
+    return (
+        ledger.groupby(keys, sort=True)['Amount']
+        .agg(Amount="sum", Transactions="size")
+        .reset_index()
+    )
+
+def compute_rollups(monthly, periods=None):
+    """
+    Roll monthly totals up to every configured frequency.
+
+    Args:
+        monthly (pd.DataFrame): Monthly totals from `aggregate_monthly`.
+        periods (dict, optional): Frequency name to pandas period code.
+            Defaults to BUDGET_CONSTANTS['PERIODS'].
+
+    Returns:
+        pd.DataFrame: One row per frequency, period, category, source and merchant with its Amount,
+                      Transactions and Share (%) of the category's total for that period.
+    """
+    periods = periods or BUDGET_CONSTANTS['PERIODS']
+    rollups = []
+    for frequency, code in periods.items():
+        rollup = (
+            monthly.assign(Period=monthly['Period'].dt.asfreq(code))
+            .groupby(['Period', 'Category', 'Source', 'Merchant'], sort=True)[['Amount', 'Transactions']]
+            .sum()
+            .reset_index()
+        )
+        category_total = rollup.groupby(['Period', 'Category'])['Amount'].transform("sum")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rollup['Share (%)'] = np.where(category_total != 0, rollup['Amount'] / category_total * 100, np.nan)
+        rollup['Frequency'] = frequency
+        rollup['Start'] = rollup['Period'].dt.start_time
+        rollup['Period'] = rollup['Period'].astype(str)
+        rollups.append(rollup)
+
+    if not rollups:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+    return pd.concat(rollups, ignore_index=True)[ROLLUP_COLUMNS]
+
+def compute_summary(monthly, periods=None):
+    """
+    Income, expenses and savings for every period, with changes from the previous period.
+
+    Periods without transactions between the first and last are included with zero
+    totals, so each change compares consecutive periods (month over month for the
+    monthly rows, quarter over quarter and year over year for the others).
+
+    Args:
+        monthly (pd.DataFrame): Monthly totals from `aggregate_monthly`.
+        periods (dict, optional): Frequency name to pandas period code.
+            Defaults to BUDGET_CONSTANTS['PERIODS'].
+
+    Returns:
+        pd.DataFrame: Columns listed in SUMMARY_COLUMNS. Savings Rate (%) is savings as a
+                      percentage of income and is missing for periods without income.
+    """
+    periods = periods or BUDGET_CONSTANTS['PERIODS']
+    if monthly.empty:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+
+    summaries = []
+    for frequency, code in periods.items():
+        period = monthly['Period'].dt.asfreq(code)
+        totals = (
+            monthly.groupby([period, monthly['Category']])['Amount'].sum()
+            .unstack('Category')
+            .reindex(columns=['income', 'expenses'])
+            .reindex(pd.period_range(period.min(), period.max(), freq=code))
+            .fillna(0.0)
+        )
+        summary = pd.DataFrame({
+            "Income": totals['income'],
+            "Expenses": totals['expenses'],
+            "Savings": totals['income'] - totals['expenses'],
+        })
+        with np.errstate(divide="ignore", invalid="ignore"):
+            summary['Savings Rate (%)'] = np.where(
+                summary['Income'] > 0, summary['Savings'] / summary['Income'] * 100, np.nan
+            )
+        for column in ['Income', 'Expenses', 'Savings', 'Savings Rate']:
+            source = 'Savings Rate (%)' if column == 'Savings Rate' else column
+            summary[f"{column} Change"] = summary[source].diff()
+
+        summary['Frequency'] = frequency
+        summary['Start'] = summary.index.start_time
+        summary['Period'] = summary.index.astype(str)
+        summaries.append(summary)
+
+    return pd.concat(summaries, ignore_index=True)[SUMMARY_COLUMNS]
+
+def get_cash_flow(rollups, frequency=None, period=None):
+    """
+    The Source/Merchant/Category/Amount rows of one period, the shape of `income_expenses.csv`.
+
+    Args:
+        rollups (pd.DataFrame): Rollups from `compute_rollups`.
+        frequency (str, optional): Rollup to read. Defaults to BUDGET_CONSTANTS['DASHBOARD_PERIOD'].
+        period (str, optional): Period label such as "2024-03", "2024Q1" or "2024". Defaults to the latest.
+
+    Returns:
+        pd.DataFrame: Columns Source, Merchant, Category and Amount.
+    """
+    columns = ["Source", "Merchant", "Category", "Amount"]
+    rows = rollups[rollups['Frequency'] == (frequency or BUDGET_CONSTANTS['DASHBOARD_PERIOD'])]
+    if rows.empty:
+        return pd.DataFrame(columns=columns)
+    period = period or rows.loc[rows['Start'].idxmax(), 'Period']
+    return rows.loc[rows['Period'] == period, columns].reset_index(drop=True)
+
+def calculate_budget(input_file, output_file, summary_file):
+    """
+    Roll a transaction ledger up by month, quarter and year and save the aggregates.
+
+    Args:
+        input_file (str): Path to the ledger.
+        output_file (str): Path to save the rollups by category and source.
+        summary_file (str): Path to save income, expenses, savings rate and period-over-period changes.
+
+    Returns:
+        tuple: (rollups, summary) DataFrames.
+    """
+    start = time.perf_counter()
+    ledger = load_ledger(input_file)
+    monthly = aggregate_monthly(ledger)
+    rollups = compute_rollups(monthly)
+    summary = compute_summary(monthly)
+
+    write_table(rollups, output_file, BUDGET_SCHEMA)
+    write_table(summary, summary_file, BUDGET_SUMMARY_SCHEMA)
+    print(f"Aggregated {len(ledger)} transactions into {len(rollups)} rollup rows in {time.perf_counter() - start:.2f}s")
+    print(f"Budget rollups saved to {output_file}")
+    print(f"Budget summary saved to {summary_file}")
+    return rollups, summary
+
+def load_budget(input_file, output_file, summary_file):
+    """
+    Load saved budget aggregates, recalculating them when the ledger is newer.
+
+    Args:
+        input_file (str): Path to the ledger.
+        output_file (str): Path of the saved rollups.
+        summary_file (str): Path of the saved summary.
+
+    Returns:
+        tuple: (rollups, summary) DataFrames.
+    """
+    outputs = [output_file, summary_file]
+    if all(os.path.exists(path) for path in outputs) and all(
+        os.path.getmtime(path) >= os.path.getmtime(input_file) for path in outputs
+    ):
+        return read_table(output_file, BUDGET_SCHEMA), read_table(summary_file, BUDGET_SUMMARY_SCHEMA)
+    return calculate_budget(input_file, output_file, summary_file)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Roll a transaction ledger up into monthly, quarterly and yearly budgets")
+    parser.add_argument("--input", default=FILE_PATHS['LEDGER'], help="Transaction ledger")
+    parser.add_argument("--output", default=FILE_PATHS['BUDGET_OUTPUT'], help="Rollups by category and source")
+    parser.add_argument("--summary", default=FILE_PATHS['BUDGET_SUMMARY'], help="Income, expenses and savings by period")
+    args, _ = parser.parse_known_args()
+    if not os.path.exists(args.input):
+        print(f"Ledger {args.input} not found. See input/TEMPLATE_ledger.csv.")
+        sys.exit(1)
+    calculate_budget(args.input, args.output, args.summary)
@@ -0,0 +1,323 @@
+import argparse, json, os, sys, time
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from helpers.utils.constants import FILE_PATHS, FORECAST_CONSTANTS
+from helpers.utils.schema import LEDGER_SCHEMA, apply_schema, as_text
+from helpers.utils.storage import atomic_write, check_issues, get_format, iter_table_chunks, read_table, write_table
+
+KEYS = ["Category", "Source"]
+# The only ledger columns the forecast reads
+LEDGER_COLUMNS = ["Date", *KEYS, "Amount"]
+
+def _fingerprint_path(state_file):
+    return f"{os.path.splitext(state_file)[0]}_fingerprint.json"
+
+def _row_hashes(chunk):
+    """
+    A 32-bit hash of each row's date, category, source and amount, as int64.
+
+    Text columns repeat a few values, so each distinct text value is hashed once.
+    """
+    combined = np.zeros(len(chunk), dtype=np.uint64)
+    for column in LEDGER_COLUMNS:
+        if column not in chunk:
+            continue
+        values = chunk[column]
+        if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_datetime64_any_dtype(values):
+            hashes = pd.util.hash_array(values.to_numpy())
+        else:
+            codes, uniques = pd.factorize(values)
+            unique_hashes = pd.util.hash_pandas_object(pd.Series(uniques, dtype=object), index=False).to_numpy()
+            hashes = np.append(unique_hashes, np.uint64(0))[codes]
+        combined = combined * np.uint64(0x100000001B3) + hashes
+    return (combined >> np.uint64(32)).astype(np.int64)
+
+def load_state(state_file):
+    """
+    Load the rolling state: monthly totals per category and source for the latest closed months.
+
+    Args:
+        state_file (str): Path of the saved state, or None for an empty state.
+
+    Returns:
+        pd.DataFrame: Indexed by (Category, Source) with one monthly period column per month,
+                      oldest first. Empty if the file does not exist. `attrs['fingerprint']`
+                      holds the ledger fingerprint of the months folded in (see `read_new_months`).
+    """
+    if not state_file or not os.path.exists(state_file):
+        state = pd.DataFrame(index=pd.MultiIndex.from_arrays([[], []], names=KEYS))
+        state.attrs['fingerprint'] = {}
+        return state
+    state = read_table(state_file, {"Category": "text", "Source": "text"}).fillna({"Source": ""})
+    state = state.set_index(KEYS)
+    state.columns = pd.PeriodIndex(state.columns, freq="M")
+    state = state.astype(float)
+
+    # A state saved without a fingerprint never matches the ledger, so it is rebuilt once
+    fingerprint_file = _fingerprint_path(state_file)
+    fingerprint = {}
+    if os.path.exists(fingerprint_file):
+        with open(fingerprint_file, "r") as infile:
+            fingerprint = json.load(infile)
+    state.attrs['fingerprint'] = fingerprint
+    return state
+
+def save_state(state, state_file):
+    """Save the rolling state with "YYYY-MM" month columns, and its ledger fingerprint next to it."""
+    table = state.copy()
+    table.columns = table.columns.astype(str)
+    write_table(table.reset_index(), state_file, schema=None)
+    with atomic_write(_fingerprint_path(state_file)) as temp_path:
+        with open(temp_path, "w") as outfile:
+            json.dump(state.attrs.get('fingerprint', {}), outfile, indent=2, sort_keys=True)
+
+def read_new_months(ledger_file, after=None, chunk_size=None):
+    """
+    Sum the ledger rows dated after a month by category, source and month, and fingerprint every month.
+
+    The ledger is streamed in chunks, reading only the columns the forecast uses. Every
+    row's date and amount are parsed, but category and source are only cleaned and
+    grouped for rows after `after`, so months already in the state are not aggregated
+    again. The fingerprint of a month is its row count and the sum of a hash of each
+    row, so any added, removed, re-categorised or re-priced row changes it.
+
+    Args:
+        ledger_file (str): Path to the ledger.
+        after (pd.Period, optional): Last month already folded into the state.
+        chunk_size (int, optional): Rows per chunk. Defaults to FORECAST_CONSTANTS['CHUNK_SIZE'].
+
+    Returns:
+        tuple: (Series of amounts indexed by Category, Source and month, latest month in the ledger or None,
+                dict of "YYYY-MM" -> [rows, hash] for every month in the ledger)
+    """
+    parse_schema = {column: LEDGER_SCHEMA[column] for column in ["Date", "Amount"]}
+    key_schema = {column: LEDGER_SCHEMA[column] for column in KEYS}
+    chunk_size = chunk_size or FORECAST_CONSTANTS['CHUNK_SIZE']
+    parts, counts, latest = [], [], None
+    issues, first_row = [], 2 if get_format(ledger_file) == "csv" else 1
+    for chunk in iter_table_chunks(ledger_file, chunk_size, schema=None, columns=LEDGER_COLUMNS):
+        typed = apply_schema(chunk, parse_schema, issues, first_row)
+        dated = typed['Date'].notna() & typed['Amount'].notna()
+        month = typed['Date'].dt.to_period("M")[dated]
+        if len(month):
+            latest = month.max() if latest is None else max(latest, month.max())
+            counts.append(
+                pd.DataFrame({"Rows": 1, "Hash": _row_hashes(chunk[dated])}, index=month.index)
+                .groupby(month).sum()
+            )
+
+        # Clean the category and source of new rows only, reporting issues by their row in the file
+        new = dated & (typed['Date'].dt.to_period("M") > after) if after is not None else dated
+        if new.any():
+            new_issues = []
+            keys = apply_schema(chunk.loc[new, [column for column in KEYS if column in chunk]], key_schema, new_issues, 0)
+            positions = np.flatnonzero(new.to_numpy()) + first_row
+            issues.extend((positions[row], *issue) for row, *issue in new_issues)
+            rows = pd.concat([keys, typed.loc[new, ['Date', 'Amount']]], axis=1).dropna(subset=['Category'])
+            parts.append(
+                rows['Amount'].groupby(
+                    [as_text(rows['Category']), as_text(rows['Source']), rows['Date'].dt.to_period("M")]
+                ).sum()
+            )
+        first_row += len(chunk)
+    check_issues(issues, ledger_file)
+
+    amounts = pd.concat(parts) if parts else pd.Series(dtype=float)
+    if len(amounts):
+        amounts = amounts.groupby(level=[0, 1, 2]).sum().rename_axis(KEYS + ["Month"])
+    fingerprint = {}
+    if counts:
+        totals = pd.concat(counts).groupby(level=0).sum()
+        fingerprint = {
+            str(month): [int(rows), int(hashed) % 2 ** 32]
+            for month, rows, hashed in zip(totals.index, totals['Rows'], totals['Hash'])
+        }
+    return amounts, latest, fingerprint
+
+def update_state(state, ledger_file, chunk_size=None):
+    """
+    Fold the months closed since the last update into the rolling state.
+
+    The latest month in the ledger is still in progress and is left out until a later
+    month appears. Only rows after the state's last month are aggregated, so appending
+    a month of transactions costs one month of work. If the ledger's fingerprint for a
+    month already folded in has changed, e.g. after new categorisation rules or a late
+    transaction, the state is rebuilt from the whole ledger.
+
+    Args:
+        state (pd.DataFrame): State from `load_state`.
+        ledger_file (str): Path to the ledger.
+        chunk_size (int, optional): Rows per chunk read from the ledger.
+
+    Returns:
+        tuple: (updated state, number of months added)
+    """
+    through = state.columns.max() if len(state.columns) else None
+    amounts, latest, fingerprint = read_new_months(ledger_file, through, chunk_size)
+
+    folded = [str(month) for month in state.columns]
+    expected = state.attrs.get('fingerprint', {})
+    if any(fingerprint.get(month) != expected.get(month) for month in folded):
+        print("The ledger changed in months already in the rolling state. Rebuilding it.")
+        return update_state(load_state(None), ledger_file, chunk_size)
+
+    closed = amounts[amounts.index.get_level_values("Month") < latest] if len(amounts) else amounts
+    if closed.empty:
+        state.attrs['fingerprint'] = {month: fingerprint[month] for month in folded if month in fingerprint}
+        return state, 0
+    first = through + 1 if through is not None else closed.index.get_level_values("Month").min()
+    months = pd.period_range(first, latest - 1, freq="M")
+    added = closed.unstack("Month").reindex(columns=months)
+
+    state = pd.concat([state, added], axis=1).fillna(0.0)
+    state = state.iloc[:, -FORECAST_CONSTANTS['HISTORY_MONTHS']:]
+    # Sources with nothing in the kept months have left the window
+    state = state[(state != 0).any(axis=1)].sort_index()
+    state.attrs['fingerprint'] = {
+        str(month): fingerprint[str(month)] for month in state.columns if str(month) in fingerprint
+    }
+    return state, len(months)
+
+def classify_sources(state):
+    """
+    Rolling averages, recurrence and a monthly forecast for every category and source.
+
+    Over the last 12 months (or fewer when the state is younger), a source active in at
+    least RECURRING_SHARE of them with amounts varying by at most RECURRING_CV is
+    "Recurring" and forecast at its median amount. One active in more than ONE_OFF_SHARE
+    of months is "Variable" and forecast at its longest rolling average. Anything rarer
+    is "One-off" and not forecast.
+
+    Args:
+        state (pd.DataFrame): State from `update_state`.
+
+    Returns:
+        pd.DataFrame: Category, Source, Last Month, an "Avg NM" column per window in
+                      FORECAST_CONSTANTS['WINDOWS'], Active Months, Kind and Forecast.
+    """
+    windows = FORECAST_CONSTANTS['WINDOWS']
+    values = state.to_numpy(dtype=float)
+    if values.size == 0:
+        return pd.DataFrame(columns=KEYS + ["Last Month"] + [f"Avg {n}M" for n in windows] + ["Active Months", "Kind", "Forecast"])
+
+    recent = values[:, -12:]
+    active = recent != 0
+    active_months = active.sum(axis=1)
+    share = active_months / recent.shape[1]
+    # Inactive months are ignored; sources with no active month count as a single zero
+    active_values = np.where(active | (active_months[:, None] == 0), recent, np.nan)
+    median = np.nanmedian(active_values, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variation = np.nanstd(active_values, axis=1) / np.abs(np.nanmean(active_values, axis=1))
+
+    result = state.index.to_frame(index=False)
+    result['Last Month'] = values[:, -1]
+    for n in windows:
+        result[f"Avg {n}M"] = values[:, -n:].mean(axis=1)
+    result['Active Months'] = active_months
+    is_recurring = (share >= FORECAST_CONSTANTS['RECURRING_SHARE']) & (np.nan_to_num(variation) <= FORECAST_CONSTANTS['RECURRING_CV'])
+    is_variable = ~is_recurring & (share > FORECAST_CONSTANTS['ONE_OFF_SHARE'])
+    result['Kind'] = np.select([is_recurring, is_variable], ["Recurring", "Variable"], "One-off")
+    result['Forecast'] = np.select([is_recurring, is_variable], [median, result[f"Avg {max(windows)}M"]], 0.0)
+    return result
+
+def compute_trend(state, sources, horizon=None):
+    """
+    Monthly totals per category with rolling averages, followed by forecast months.
+
+    Args:
+        state (pd.DataFrame): State from `update_state`.
+        sources (pd.DataFrame): Output of `classify_sources`.
+        horizon (int, optional): Months to forecast. Defaults to FORECAST_CONSTANTS['HORIZON'].
+
+    Returns:
+        pd.DataFrame: Month, Start, Category, Actual, an "Avg NM" column per window and
+                      Forecast. Actual is missing for forecast months and Forecast for past ones.
+    """
+    horizon = FORECAST_CONSTANTS['HORIZON'] if horizon is None else horizon
+    windows = FORECAST_CONSTANTS['WINDOWS']
+    columns = ["Month", "Start", "Category", "Actual", *[f"Avg {n}M" for n in windows], "Forecast"]
+    if state.empty:
+        return pd.DataFrame(columns=columns)
+
+    # Months as rows, categories as columns
+    totals = state.groupby(level="Category").sum().T
+    actual = totals.stack().rename("Actual")
+    trend = [actual] + [totals.rolling(n, min_periods=1).mean().stack().rename(f"Avg {n}M") for n in windows]
+    trend = pd.concat(trend, axis=1).rename_axis(["Month", "Category"]).reset_index()
+
+    future = pd.period_range(state.columns.max() + 1, periods=horizon, freq="M")
+    forecast = sources.groupby("Category")['Forecast'].sum()
+    future = pd.DataFrame(
+        [(month, category, amount) for month in future for category, amount in forecast.items()],
+        columns=["Month", "Category", "Forecast"]
+    )
+    trend = pd.concat([trend, future], ignore_index=True)
+    trend['Start'] = pd.PeriodIndex(trend['Month'], freq="M").start_time
+    trend['Month'] = trend['Month'].astype(str)
+    return trend[columns]
+
+def calculate_forecast(ledger_file, state_file=None, output_file=None, trend_file=None, rebuild=False, chunk_size=None):
+    """
+    Update the rolling state from a ledger and save source analytics and the category trend.
+
+    Args:
+        ledger_file (str): Path to the ledger.
+        state_file (str, optional): Rolling state path. Defaults to FILE_PATHS['FORECAST_STATE'].
+        output_file (str, optional): Source analytics path. Defaults to FILE_PATHS['FORECAST_OUTPUT'].
+        trend_file (str, optional): Category trend path. Defaults to FILE_PATHS['FORECAST_TREND'].
+        rebuild (bool): Discard the saved state and aggregate the whole ledger again.
+        chunk_size (int, optional): Rows per chunk read from the ledger.
+
+    Returns:
+        tuple: (source analytics, trend) DataFrames.
+    """
+    start = time.perf_counter()
+    state_file = state_file or FILE_PATHS['FORECAST_STATE']
+    output_file = output_file or FILE_PATHS['FORECAST_OUTPUT']
+    trend_file = trend_file or FILE_PATHS['FORECAST_TREND']
+
+    state = load_state(None) if rebuild else load_state(state_file)
+    state, added = update_state(state, ledger_file, chunk_size)
+    sources = classify_sources(state)
+    trend = compute_trend(state, sources)
+
+    save_state(state, state_file)
+    write_table(sources, output_file, schema=None)
+    write_table(trend, trend_file, schema=None)
+
+    through = state.columns.max() if len(state.columns) else "none"
+    print(f"Added {added} months to the rolling state (through {through}) in {time.perf_counter() - start:.2f}s")
+    print(f"Source forecast saved to {output_file}")
+    print(f"Category trend saved to {trend_file}")
+    return sources, trend
+
+def load_forecast(ledger_file, trend_file=None):
+    """
+    Load the saved category trend, updating the rolling state first when the ledger is newer.
+
+    Args:
+        ledger_file (str): Path to the ledger.
+        trend_file (str, optional): Category trend path. Defaults to FILE_PATHS['FORECAST_TREND'].
+
+    Returns:
+        pd.DataFrame: The trend from `compute_trend`.
+    """
+    trend_file = trend_file or FILE_PATHS['FORECAST_TREND']
+    if os.path.exists(trend_file) and os.path.getmtime(trend_file) >= os.path.getmtime(ledger_file):
+        return read_table(trend_file, {"Month": "text", "Start": "date", "Category": "text"})
+    return calculate_forecast(ledger_file, trend_file=trend_file)[1]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rolling averages, recurring sources and a cash-flow forecast from the ledger")
+    parser.add_argument("--input", default=FILE_PATHS['LEDGER'], help="Transaction ledger")
+    parser.add_argument("--rebuild", action="store_true", help="Aggregate the whole ledger again instead of only new months")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Ledger rows read at a time")
+    args, _ = parser.parse_known_args()
+    if not os.path.exists(args.input):
+        print(f"Ledger {args.input} not found. See input/TEMPLATE_ledger.csv.")
+        sys.exit(1)
+    sources, _ = calculate_forecast(args.input, rebuild=args.rebuild, chunk_size=args.chunk_size)
+    with pd.option_context("display.max_rows", None, "display.width", 140, "display.float_format", "{:,.2f}".format):
+        print(sources.to_string(index=False))
@@ -0,0 +1,310 @@
+import argparse, os, sys
+import numpy as np
+import pandas as pd
+from datetime import datetime
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from helpers.utils.constants import FILE_PATHS, LTH_YEARS
+from helpers.utils.schema import as_text
+from helpers.utils.storage import read_table
+
+# One record per lot; `position` indexes the positions table returned by `build_lots`
+LOT_DTYPE = np.dtype([
+    ("row", np.int64),
+    ("position", np.int32),
+    ("quantity", np.float64),
+    ("unit_cost", np.float64),
+    ("price", np.float64),
+    ("purchase_date", "datetime64[D]"),
+])
+METHODS = ["fifo", "lifo", "hifo", "specific"]
+# Slivers narrower than this are floating-point noise from the cumulative sums
+MIN_MATCH_QUANTITY = 1e-9
+
+def build_lots(portfolio):
+    """
+    Convert a calculated portfolio into a lot array; every priced row is one lot.
+
+    Unit cost is derived from `Value - Gain/Loss`, so lot gains agree with the
+    calculate engine for every asset type.
+
+    Args:
+        portfolio (pd.DataFrame): A calculated portfolio.
+
+    Returns:
+        tuple: (lots, positions) where `lots` is a LOT_DTYPE array and `positions`
+               is a DataFrame of Ticker and Type indexed by position code.
+    """
+    priced = portfolio[
+        portfolio['Ticker'].notna() & (portfolio['Quantity'] > 0) & (portfolio['Current Price'] > 0)
+    ]
+    keys = pd.DataFrame({"Ticker": priced['Ticker'].astype(str), "Type": as_text(priced['Type'])})
+    codes = keys.groupby(['Ticker', 'Type'], sort=False).ngroup().to_numpy()
+
+    lots = np.empty(len(priced), dtype=LOT_DTYPE)
+    lots["row"] = priced.index.to_numpy()
+    lots["position"] = codes
+    lots["quantity"] = priced['Quantity'].to_numpy(dtype=float)
+    lots["unit_cost"] = ((priced['Value'] - priced['Gain/Loss']) / priced['Quantity']).to_numpy(dtype=float)
+    lots["price"] = priced['Current Price'].to_numpy(dtype=float)
+    lots["purchase_date"] = pd.to_datetime(priced['Purchase Date'], format="%Y-%m-%d", errors="coerce").to_numpy()
+
+    positions = keys.drop_duplicates().reset_index(drop=True)
+    return lots, positions
+
+def is_long_term(purchase_dates, as_of):
+    """
+    Flag lots held longer than LTH_YEARS. Lots without a date are never long-term.
+
+    Args:
+        purchase_dates (np.ndarray): datetime64[D] purchase dates.
+        as_of (datetime or np.ndarray): Reference date, or one date per lot.
+
+    Returns:
+        np.ndarray: Boolean array.
+    """
+    held_days = (np.asarray(as_of, dtype="datetime64[D]") - purchase_dates).astype("timedelta64[D]").astype(float)
+    return ~np.isnat(purchase_dates) & (held_days / 365 > LTH_YEARS)
+
+def summarize_positions(lots, positions, as_of=None):
+    """
+    Aggregate lots into positions with unrealized gains split by holding period.
+
+    Args:
+        lots (np.ndarray): LOT_DTYPE array.
+        positions (pd.DataFrame): Positions table from `build_lots`.
+        as_of (datetime, optional): Reference date. Defaults to now.
+
+    Returns:
+        pd.DataFrame: One row per position with Lots, Quantity, Cost Basis (total), Value,
+                      Gain/Loss, % Gain/Loss, Long-Term Quantity, Long-Term Gain,
+                      Short-Term Gain, Undated Gain and a Long-Term Hold flag (Green, Red,
+                      Mixed or No Date). % Gain/Loss follows the calculate engine: 100 for a
+                      position without cost. Lots without a purchase date have no holding
+                      period, so their gain is in Undated Gain rather than Short-Term Gain.
+    """
+    as_of = as_of or datetime.now()
+    count = len(positions)
+    position = lots["position"]
+    value = lots["quantity"] * lots["price"]
+    gain = value - lots["quantity"] * lots["unit_cost"]
+    long_term = is_long_term(lots["purchase_date"], as_of)
+    dated = ~np.isnat(lots["purchase_date"])
+
+    def total(weights):
+        return np.bincount(position, weights=weights, minlength=count)
+
+    summary = positions.copy()
+    summary["Lots"] = np.bincount(position, minlength=count)
+    summary["Quantity"] = total(lots["quantity"])
+    summary["Cost Basis"] = total(lots["quantity"] * lots["unit_cost"])
+    summary["Value"] = total(value)
+    summary["Gain/Loss"] = total(gain)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        summary["% Gain/Loss"] = np.where(summary["Cost Basis"] > 0, summary["Gain/Loss"] / summary["Cost Basis"] * 100, 100.0)
+    summary["Long-Term Quantity"] = total(np.where(long_term, lots["quantity"], 0.0))
+    summary["Long-Term Gain"] = total(np.where(long_term, gain, 0.0))
+    summary["Short-Term Gain"] = total(np.where(dated & ~long_term, gain, 0.0))
+    summary["Undated Gain"] = total(np.where(dated, 0.0, gain))
+
+    long_term_lots = np.bincount(position, weights=long_term, minlength=count)
+    dated_lots = np.bincount(position, weights=dated, minlength=count)
+    summary["Long-Term Hold"] = np.select(
+        [dated_lots == 0, long_term_lots == summary["Lots"], long_term_lots == 0],
+        ["No Date", "Green", "Red"],
+        "Mixed"
+    )
+    return summary
+
+def _sort_key(lots, method):
+    """Per-lot key ordering consumption within a position; lots without a date sort last."""
+    days = lots["purchase_date"].astype("datetime64[D]").astype(np.int64).astype(float)
+    days[np.isnat(lots["purchase_date"])] = np.inf
+    if method == "fifo":
+        return days
+    if method == "lifo":
+        return np.where(np.isinf(days), np.inf, -days)
+    if method == "hifo":
+        return -lots["unit_cost"]
+    return np.zeros(len(lots))
+
+def match_lots(lot_groups, lot_keys, lot_quantities, sale_groups, sale_quantities):
+    """
+    Match sale quantities against lots within groups, consuming lots in key order.
+
+    Within each group, lots are laid end to end on a cumulative quantity axis, and so
+    are the sales (in input order, clipped to the group's holdings). Sorting the lot and
+    sale end points of every group together, each gap between consecutive end points
+    belongs to exactly one lot and at most one sale, which running counts identify
+    without a per-group loop.
+
+    Args:
+        lot_groups (np.ndarray): Group code per lot.
+        lot_keys (np.ndarray): Consumption order within a group (ascending).
+        lot_quantities (np.ndarray): Quantity per lot.
+        sale_groups (np.ndarray): Group code per sale.
+        sale_quantities (np.ndarray): Quantity per sale.
+
+    Returns:
+        tuple: (lot index, sale index, matched quantity) arrays, one entry per match.
+    """
+    if len(lot_groups) == 0 or len(sale_groups) == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0, dtype=float)
+
+    lot_order = np.lexsort((np.arange(len(lot_groups)), lot_keys, lot_groups))
+    sale_order = np.argsort(sale_groups, kind="stable")
+    sorted_lot_groups = np.asarray(lot_groups)[lot_order]
+    sorted_sale_groups = np.asarray(sale_groups)[sale_order]
+
+    # Per-group running totals keep the axis small, so float error stays tiny
+    lot_end = pd.Series(lot_quantities[lot_order]).groupby(sorted_lot_groups).cumsum().to_numpy()
+    sale_end = pd.Series(sale_quantities[sale_order]).groupby(sorted_sale_groups).cumsum().to_numpy()
+    first_lot = np.searchsorted(sorted_lot_groups, sorted_sale_groups, side="left")
+    last_lot = np.searchsorted(sorted_lot_groups, sorted_sale_groups, side="right")
+    holdings = np.where(last_lot > first_lot, lot_end[np.maximum(last_lot - 1, 0)], 0.0)
+    sale_end = np.minimum(sale_end, holdings)
+
+    # Sweep the end points of every group in order; ties put lot ends first
+    groups = np.concatenate([sorted_lot_groups, sorted_sale_groups])
+    points = np.concatenate([lot_end, sale_end])
+    is_sale = np.concatenate([np.zeros(len(lot_end), dtype=bool), np.ones(len(sale_end), dtype=bool)])
+    order = np.lexsort((is_sale, points, groups))
+    groups, points, is_sale = groups[order], points[order], is_sale[order]
+
+    new_group = np.ones(len(groups), dtype=bool)
+    new_group[1:] = groups[1:] != groups[:-1]
+    group_start = np.maximum.accumulate(np.where(new_group, np.arange(len(groups)), 0))
+    widths = points - np.where(new_group, 0.0, np.concatenate([[0.0], points[:-1]]))
+
+    # Lots and sales already passed within the group index the ones covering each gap
+    lots_passed = np.cumsum(~is_sale) - ~is_sale
+    sales_passed = np.cumsum(is_sale) - is_sale
+    lot_position = np.searchsorted(sorted_lot_groups, groups, side="left") + lots_passed - lots_passed[group_start]
+    sale_position = np.searchsorted(sorted_sale_groups, groups, side="left") + sales_passed - sales_passed[group_start]
+
+    matched = (
+        (widths > MIN_MATCH_QUANTITY)
+        & (lot_position < np.searchsorted(sorted_lot_groups, groups, side="right"))
+        & (sale_position < np.searchsorted(sorted_sale_groups, groups, side="right"))
+    )
+    return lot_order[lot_position[matched]], sale_order[sale_position[matched]], widths[matched]
+
+def _describe(values, limit=10):
+    """Comma-separated preview of at most `limit` values."""
+    values = values.astype(str).tolist()
+    return ", ".join(values[:limit]) + (", ..." if len(values) > limit else "")
+
+def realize_gains(lots, positions, sales, method="fifo", as_of=None):
+    """
+    Compute realized gains for a set of sales and the lots that remain afterwards.
+
+    Args:
+        lots (np.ndarray): LOT_DTYPE array.
+        positions (pd.DataFrame): Positions table from `build_lots`.
+        sales (pd.DataFrame): Columns Ticker, Quantity and optionally Type, Price (defaults to
+                              the lot's current price) and Date (defaults to `as_of`). For the
+                              "specific" method a Row column names the portfolio row to sell from.
+        method (str): One of "fifo", "lifo", "hifo" or "specific".
+        as_of (datetime, optional): Default sale date. Defaults to now.
+
+    Returns:
+        tuple: (realized DataFrame with one row per lot consumed, remaining LOT_DTYPE array)
+
+    Raises:
+        ValueError: If `method` is not supported.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unsupported method '{method}'. Supported methods are: {', '.join(METHODS)}.")
+
+    as_of = pd.Timestamp(as_of or datetime.now())
+    sales = sales.reset_index(drop=True)
+    quantities = sales['Quantity'].to_numpy(dtype=float)
+
+    if method == "specific":
+        lot_groups = np.arange(len(lots))
+        lookup = pd.Series(lot_groups, index=lots["row"])
+        sale_groups = sales['Row'].map(lookup)
+    else:
+        lot_groups = lots["position"]
+        tickers = sales['Ticker'].astype(str).str.upper()
+        position_keys = positions.assign(Ticker=positions['Ticker'].str.upper()).reset_index()
+        if 'Type' in sales:
+            keys = pd.DataFrame({"Ticker": tickers, "Type": sales['Type'].fillna('').astype(str).str.lower()})
+            sale_groups = keys.merge(position_keys, on=['Ticker', 'Type'], how="left")['index']
+        else:
+            # Without a Type, sell from the first position with the ticker
+            sale_groups = tickers.map(position_keys.drop_duplicates('Ticker').set_index('Ticker')['index'])
+    sale_groups = sale_groups.fillna(-1).to_numpy(dtype=np.int64)
+
+    unknown = sale_groups < 0
+    if unknown.any():
+        print(f"No lots found for {_describe(sales.loc[unknown, 'Ticker' if method != 'specific' else 'Row'])}. Skipping.")
+
+    lot_index, sale_index, matched = match_lots(
+        lot_groups, _sort_key(lots, method), lots["quantity"], sale_groups[~unknown], quantities[~unknown]
+    )
+    sale_index = np.flatnonzero(~unknown)[sale_index]
+
+    filled = np.bincount(sale_index, weights=matched, minlength=len(sales))
+    unfilled = quantities - filled > MIN_MATCH_QUANTITY
+    if (unfilled & ~unknown).any():
+        print(f"Sale quantity exceeds holdings for {_describe(sales.loc[unfilled & ~unknown, 'Ticker'])}; selling what is held.")
+
+    sale_price = sales['Price'].to_numpy(dtype=float) if 'Price' in sales else np.full(len(sales), np.nan)
+    price = np.where(np.isnan(sale_price[sale_index]), lots["price"][lot_index], sale_price[sale_index])
+    sale_date = pd.to_datetime(sales['Date'], errors="coerce").fillna(as_of) if 'Date' in sales else pd.Series(as_of, index=sales.index)
+    sale_date = sale_date.to_numpy(dtype="datetime64[D]")[sale_index]
+    purchase_date = lots["purchase_date"][lot_index]
+
+    matched_positions = positions.iloc[lots["position"][lot_index]]
+    proceeds = matched * price
+    cost = matched * lots["unit_cost"][lot_index]
+    realized = pd.DataFrame({
+        "Ticker": matched_positions['Ticker'].to_numpy(),
+        "Type": matched_positions['Type'].to_numpy(),
+        "Row": lots["row"][lot_index],
+        "Purchase Date": purchase_date,
+        "Sale Date": sale_date,
+        "Quantity": matched,
+        "Proceeds": proceeds,
+        "Cost": cost,
+        "Gain/Loss": proceeds - cost,
+        "Term": np.where(is_long_term(purchase_date, sale_date), "Long", "Short"),
+    })
+
+    remaining = lots.copy()
+    remaining["quantity"] -= np.bincount(lot_index, weights=matched, minlength=len(lots))
+    remaining = remaining[remaining["quantity"] > MIN_MATCH_QUANTITY]
+    return realized, remaining
+
+def parse_sale(value):
+    """
+    Parse a --sell argument of the form TICKER:QUANTITY[:PRICE] (or ROW:QUANTITY[:PRICE]).
+
+    Returns:
+        dict: Sale record.
+    """
+    parts = value.split(":")
+    if len(parts) not in (2, 3):
+        raise argparse.ArgumentTypeError(f"Invalid sale '{value}'. Use TICKER:QUANTITY[:PRICE].")
+    sale = {"Ticker": parts[0].upper(), "Quantity": float(parts[1]), "Price": float(parts[2]) if len(parts) == 3 else np.nan}
+    if parts[0].isdigit():
+        sale["Row"] = int(parts[0])
+    return sale
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize tax lots and preview realized gains")
+    parser.add_argument("--sell", type=parse_sale, action="append", default=[],
+                        help="Sale to preview as TICKER:QUANTITY[:PRICE]; with --method specific use ROW:QUANTITY[:PRICE]")
+    parser.add_argument("--method", choices=METHODS, default="fifo", help="Lot selection method")
+    args, _ = parser.parse_known_args()
+
+    lots, positions = build_lots(read_table(FILE_PATHS['PORTFOLIO_OUTPUT']))
+    with pd.option_context("display.max_rows", None, "display.width", 160, "display.float_format", "{:,.2f}".format):
+        if not args.sell:
+            print(summarize_positions(lots, positions).to_string(index=False))
+        else:
+            realized, _ = realize_gains(lots, positions, pd.DataFrame(args.sell), method=args.method)
+            print(realized.to_string(index=False))
+            totals = realized.groupby("Term")["Gain/Loss"].sum()
+            print(f"Realized gain: ${totals.sum():,.2f} "
+                  f"(long-term ${totals.get('Long', 0):,.2f}, short-term ${totals.get('Short', 0):,.2f})")
@@ -1,85 +1,166 @@
+import os, sys
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from helpers.utils.api import get_price
-from helpers.utils.constants import FILE_PATHS, LTH_YEARS
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from calculate.calculate_lots import build_lots, summarize_positions
+from helpers.utils.api import get_portfolio_prices
+from helpers.utils.cache import report_cache_stats
+from helpers.utils.history import append_snapshot
+from helpers.utils.constants import FILE_PATHS, LTH_YEARS, PRICE_AS_OF_FORMAT
+from helpers.utils.storage import read_table, write_table
 
-def calculate_portfolio(input_file, output_file):
+def compute_portfolio_stats(portfolio, prices, as_of=None):
+    """
+    Compute price, value, gain/loss and long-term hold columns with column operations.
+
+    Args:
+        portfolio (pd.DataFrame): Portfolio with lower-cased `Type` values.
+        prices (pd.Series): Prices aligned to `portfolio.index`. NaN marks an unsupported asset type
+                           or a failed lookup.
+        as_of (datetime, optional): Date used for hold durations. Defaults to now.
+
+    Returns:
+        pd.DataFrame: The portfolio with `Current Price`, `Value`, `Gain/Loss`, `% Gain/Loss`,
+                      `Long-Term Hold` and `Price As Of` filled in. Rows with missing data
+                      or an unsupported type keep zeros and an empty hold flag.
+    """
+    as_of = as_of or datetime.now()
+    quantity = portfolio['Quantity']
+    cost_basis = portfolio['Cost Basis'] if 'Cost Basis' in portfolio else pd.Series(0, index=portfolio.index)
+    asset_type = portfolio['Type']
+
+    # Branch masks
+    valid = portfolio['Ticker'].notna() & asset_type.notna() & quantity.notna()
+    is_cash = valid & (asset_type == "cash")
+    is_flat = valid & asset_type.isin(["401k", "hsa"])
+    is_dynamic = valid & ~is_cash & ~is_flat
+    is_priced = is_dynamic & prices.notna()
+    has_cost = cost_basis > 0
+
+    # Report skipped rows once rather than per row
+    skipped_rows = portfolio.index[~valid]
+    if len(skipped_rows):
+        shown = ", ".join(str(index) for index in skipped_rows[:10])
+        print(f"Skipping {len(skipped_rows)} rows due to missing data: {shown}{', ...' if len(skipped_rows) > 10 else ''}")
+    for ticker in portfolio.loc[is_dynamic & ~is_priced, 'Ticker'].unique():
+        print(f"No price available for {ticker}. Skipping.")
+
+    # Cash and 401k/hsa balances are priced at 1
+    price = np.select([is_cash | is_flat, is_priced], [1.0, prices], 0.0)
+    value = np.select([is_cash, is_flat | is_priced], [quantity, price * quantity], 0.0)
+
+    total_cost = cost_basis * quantity
+    flat_gain = value - cost_basis
+    priced_gain = np.where(has_cost, value - total_cost, value)
+    gain_loss = np.select([is_flat, is_priced], [flat_gain, priced_gain], 0.0)
+
+    percentage_gain_loss = np.select(
+        [is_flat & has_cost, is_priced & has_cost, is_flat | is_priced],
+        [(gain_loss / cost_basis) * 100, (gain_loss / total_cost) * 100, 100.0],
+        0.0
+    )
+
+    # Determine long-term hold status with a single date parse
+    computed = is_cash | is_flat | is_priced
+    if 'Purchase Date' in portfolio:
+        purchase_date = portfolio['Purchase Date']
+    else:
+        purchase_date = pd.Series(np.nan, index=portfolio.index)
+    has_date = purchase_date.notna()
+    if pd.api.types.is_datetime64_any_dtype(purchase_date):
+        purchase_date_obj = purchase_date
+    else:
+        # Parse each distinct date string once; lots share far fewer dates than rows
+        date_codes, unique_dates = pd.factorize(purchase_date)
+        parsed_dates = pd.to_datetime(pd.Index(unique_dates).astype(str), format="%Y-%m-%d", errors="coerce")
+        parsed_dates = parsed_dates.append(pd.DatetimeIndex([pd.NaT]))  # code -1 marks a missing date
+        purchase_date_obj = pd.Series(parsed_dates[date_codes], index=portfolio.index)
+    hold_duration_years = (pd.Timestamp(as_of) - purchase_date_obj).dt.days / 365
+    long_term_hold = np.select(
+        [~computed, ~has_date, purchase_date_obj.isna(), hold_duration_years > LTH_YEARS],
+        ["", "No Date", "Invalid Date", "Green"],
+        "Red"
+    )
+
+    return portfolio.assign(**{
+        'Current Price': price,
+        'Value': value,
+        'Gain/Loss': gain_loss,
+        '% Gain/Loss': percentage_gain_loss,
+        'Long-Term Hold': long_term_hold,
+        'Price As Of': np.where(computed & (price > 0), pd.Timestamp(as_of).strftime(PRICE_AS_OF_FORMAT), None),
+    })
+
+def load_portfolio(input_file):
+    """
+    Read a portfolio file with its schema, reporting invalid values by row.
+
+    Args:
+        input_file (str): Path to the portfolio file (CSV, Parquet or Feather).
+
+    Returns:
+        pd.DataFrame: The portfolio with lower-cased categorical `Type` and `Liquidity`
+                      and parsed `Purchase Date`.
+    """
+    return read_table(input_file)
+
+def get_quote_mask(portfolio):
+    """
+    Rows that need a market quote; cash and 401k/hsa balances are priced at 1.
+
+    Args:
+        portfolio (pd.DataFrame): Portfolio with lower-cased `Type` values.
+
+    Returns:
+        pd.Series: Boolean mask of the rows to price.
+    """
+    return portfolio['Ticker'].notna() & portfolio['Quantity'].notna() & ~portfolio['Type'].isin(["cash", "401k", "hsa"])
+
+def calculate_portfolio(input_file, output_file, positions_file=None, prices=None, record_history=True, portfolio=None):
     """
     Process a portfolio CSV file, fetch current prices, and calculate stats.
 
+    Each row is treated as a tax lot; lots are also aggregated into one row per position.
+
     Args:
-        input_file (str): Path to the input CSV file containing the portfolio.
-        output_file (str): Path to save the processed portfolio CSV.
+        input_file (str): Path to the input file (CSV, Parquet or Feather) containing the portfolio.
+        output_file (str): Path to save the processed portfolio. The extension selects the format.
+        positions_file (str, optional): Path to save the per-position summary. Defaults to
+                                        FILE_PATHS['POSITIONS_OUTPUT'].
+        prices (dict, optional): Prices already fetched, keyed by (ticker, asset_type).
+        record_history (bool): Append a snapshot to the history store.
+        portfolio (pd.DataFrame, optional): The portfolio already loaded from `input_file`.
+
+    Returns:
+        pd.DataFrame: The positions summary, or None if the portfolio is empty.
     """
     # Load portfolio data
-    portfolio = pd.read_csv(input_file)
+    if portfolio is None:
+        portfolio = load_portfolio(input_file)
 
     if portfolio.empty:
         print("Portfolio is empty. Check your CSV file.")
-        return
-
-    # Initialize columns
-    portfolio['Type'] = portfolio['Type'].fillna('').astype(str).str.lower()
-    portfolio['Liquidity'] = portfolio['Liquidity'].fillna('').astype(str).str.lower()
-    portfolio['Current Price'] = 0
-    portfolio['Value'] = 0
-    portfolio['Gain/Loss'] = 0
-    portfolio['% Gain/Loss'] = 0
-    portfolio['Long-Term Hold'] = ''
-
-    total_value = 0
-
-    for index, row in portfolio.iterrows():
-        ticker = row['Ticker']
-        asset_type = row['Type']
-        quantity = row['Quantity']
-        cost_basis = row.get('Cost Basis', 0)
-        purchase_date = row.get('Purchase Date', '')
-
-        if pd.isna(ticker) or pd.isna(asset_type) or pd.isna(quantity):
-            print(f"Skipping row {index} due to missing data: {row}")
-            continue
-
-        # Handle different asset types
-        if asset_type == "cash":
-            price, value, gain_loss, percentage_gain_loss = 1, quantity, 0, 0
-        elif asset_type in ["401k", "hsa"]:
-            price = 1
-            value = price * quantity
-            gain_loss = value - cost_basis
-            percentage_gain_loss = (gain_loss / cost_basis) * 100 if cost_basis > 0 else 100
-        else:
-            price = get_price(ticker, asset_type)
-            if price is None:
-                print(f"Unknown asset type for {ticker}. Skipping.")
-                continue
-            value = price * quantity
-            gain_loss = value - (cost_basis * quantity) if cost_basis > 0 else value
-            percentage_gain_loss = (gain_loss / (cost_basis * quantity)) * 100 if cost_basis > 0 else 100
-
-        total_value += value
-
-        # Determine long-term hold status
-        if not pd.isna(purchase_date):
-            try:
-                purchase_date_obj = datetime.strptime(str(purchase_date), "%Y-%m-%d")
-                hold_duration_years = (datetime.now() - purchase_date_obj).days / 365
-                long_term_hold = "Green" if hold_duration_years > LTH_YEARS else "Red"
-            except ValueError:
-                long_term_hold = "Invalid Date"
-        else:
-            long_term_hold = "No Date"
-
-        # Update portfolio data
-        portfolio.at[index, 'Current Price'] = price
-        portfolio.at[index, 'Value'] = value
-        portfolio.at[index, 'Gain/Loss'] = gain_loss
-        portfolio.at[index, '% Gain/Loss'] = percentage_gain_loss
-        portfolio.at[index, 'Long-Term Hold'] = long_term_hold
+        return None
+
+    # Fetch each unique quote once, concurrently, and fan it out to every row
+    quotes = get_portfolio_prices(portfolio, mask=get_quote_mask(portfolio), prices=prices)
+
+    portfolio = compute_portfolio_stats(portfolio, quotes)
+
+    # Aggregate lots into positions with the long-term/short-term split
+    positions_file = positions_file or FILE_PATHS['POSITIONS_OUTPUT']
+    positions = summarize_positions(*build_lots(portfolio))
 
     # Save updated portfolio
-    portfolio.to_csv(output_file, index=False)
+    write_table(portfolio, output_file)
+    write_table(positions, positions_file, schema=None)
+    if record_history:
+        append_snapshot(portfolio)
     print(f"Portfolio saved to {output_file}")
+    print(f"Aggregated {int(positions['Lots'].sum())} lots into {len(positions)} positions, saved to {positions_file}")
+    report_cache_stats()
+    return positions
 
 if __name__ == "__main__":
     calculate_portfolio(FILE_PATHS['PORTFOLIO_INPUT'], FILE_PATHS['PORTFOLIO_OUTPUT'])
\ No newline at end of file
@@ -0,0 +1,304 @@
+import argparse, os, sys
+import numpy as np
+import pandas as pd
+from datetime import datetime
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from calculate.calculate_batch import find_portfolios
+from calculate.calculate_lots import is_long_term, match_lots
+from helpers.utils.constants import FILE_PATHS, REBALANCE_CONSTANTS
+from helpers.utils.schema import as_text
+from helpers.utils.storage import read_table, write_table
+
+# Asset types that can be bought and sold; 401k/hsa balances are left alone
+TRADABLE_TYPES = ["stock", "etf", "crypto"]
+GROUPS = {"type": "Type", "liquidity": "Liquidity", "ticker": "Ticker"}
+CASH_BUCKET = "cash"
+
+def get_account_name(path):
+    """Account name for a portfolio file, e.g. "household" for household_output.csv."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    return name[:-len("_output")] if name.endswith("_output") else name
+
+def load_targets(path):
+    """
+    Load target weights.
+
+    The file has columns Group (Type, Liquidity or Ticker), Key, Weight and an optional
+    Account; rows without an Account apply to every account without its own targets.
+    A Key of "cash" sets the cash weight; otherwise cash is kept as it is and the
+    weights apply to the rest of the account.
+
+    Args:
+        path (str): Path to the targets CSV.
+
+    Returns:
+        pd.DataFrame: Columns Account, Group, Key and Weight (a fraction).
+    """
+    targets = pd.read_csv(path)
+    if 'Account' not in targets:
+        targets['Account'] = np.nan
+    targets = targets.dropna(subset=['Group', 'Key', 'Weight']).copy()
+    targets['Account'] = targets['Account'].fillna('').astype(str).str.strip()
+    targets['Group'] = targets['Group'].astype(str).str.strip().str.lower()
+    targets['Weight'] = pd.to_numeric(targets['Weight'].astype(str).str.replace("%", ""), errors="coerce") / 100
+
+    invalid = ~targets['Group'].isin(GROUPS)
+    if invalid.any():
+        print(f"Ignoring targets with unknown groups: {', '.join(targets.loc[invalid, 'Group'].unique())}")
+        targets = targets[~invalid]
+
+    targets['Key'] = _normalize_keys(targets['Key'], targets['Group'])
+    return targets[['Account', 'Group', 'Key', 'Weight']]
+
+def _normalize_keys(keys, groups):
+    """Upper-case tickers, lower-case types and liquidity buckets."""
+    keys = keys.astype(str).str.strip()
+    keys = keys.str.upper().where(groups == "ticker", keys.str.lower())
+    return keys.where(keys.str.lower() != CASH_BUCKET, CASH_BUCKET)
+
+def build_holdings(portfolios, as_of=None):
+    """
+    Flatten calculated portfolios into one lot table with tax attributes.
+
+    Args:
+        portfolios (dict): Account name to calculated portfolio DataFrame.
+        as_of (datetime, optional): Reference date for holding periods. Defaults to now.
+
+    Returns:
+        pd.DataFrame: Tradable and cash lots with Account, Ticker, Type, Liquidity, Quantity,
+                      Price, Value, Unit Cost, Gain and Long-Term columns.
+    """
+    as_of = as_of or datetime.now()
+    frames = [portfolio.assign(Account=account) for account, portfolio in portfolios.items()]
+    lots = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if lots.empty:
+        return lots
+
+    lots['Type'] = as_text(lots['Type'])
+    lots['Liquidity'] = as_text(lots['Liquidity'])
+    lots['Ticker'] = lots['Ticker'].astype(str).str.upper()
+    priced = lots['Ticker'].notna() & (lots['Quantity'] > 0) & (lots['Current Price'] > 0)
+    lots = lots[priced & lots['Type'].isin(TRADABLE_TYPES + ["cash"])].copy()
+
+    lots['Price'] = lots['Current Price']
+    lots['Unit Cost'] = (lots['Value'] - lots['Gain/Loss']) / lots['Quantity']
+    lots['Gain'] = lots['Value'] - lots['Unit Cost'] * lots['Quantity']
+    purchase_date = pd.to_datetime(lots['Purchase Date'], format="%Y-%m-%d", errors="coerce").to_numpy(dtype="datetime64[D]")
+    lots['Long-Term'] = is_long_term(purchase_date, as_of)
+    return lots[['Account', 'Ticker', 'Type', 'Liquidity', 'Quantity', 'Price', 'Value', 'Unit Cost', 'Gain', 'Long-Term']]
+
+def assign_targets(holdings, targets):
+    """
+    Attach each account's grouping and bucket key to its lots.
+
+    Args:
+        holdings (pd.DataFrame): Output of `build_holdings`.
+        targets (pd.DataFrame): Output of `load_targets`.
+
+    Returns:
+        tuple: (holdings with a Bucket column, per-account targets with Account, Bucket and Weight)
+    """
+    accounts = holdings['Account'].unique()
+    own = targets[targets['Account'].isin(accounts)]
+    shared = targets[targets['Account'] == ""]
+    defaulted = [account for account in accounts if account not in set(own['Account'])]
+    account_targets = pd.concat(
+        [own] + [shared.assign(Account=account) for account in defaulted], ignore_index=True
+    )
+
+    # One grouping level per account
+    levels = account_targets[account_targets['Key'] != CASH_BUCKET].groupby('Account')['Group'].agg(lambda groups: set(groups))
+    mixed = levels[levels.apply(len) > 1].index
+    for account in mixed:
+        print(f"Targets for {account} mix groups {sorted(levels[account])}. Skipping account.")
+    untargeted = [account for account in accounts if account not in set(account_targets['Account'])]
+    for account in untargeted:
+        print(f"No targets for {account}. Skipping account.")
+    account_targets = account_targets[~account_targets['Account'].isin(mixed)]
+    group = levels.drop(mixed).apply(lambda groups: next(iter(groups)))
+
+    holdings = holdings[holdings['Account'].isin(group.index)].copy()
+    account_group = holdings['Account'].map(group)
+    bucket = np.select(
+        [account_group == key for key in GROUPS], [holdings[column] for column in GROUPS.values()], ""
+    )
+    holdings['Bucket'] = np.where(holdings['Type'] == "cash", CASH_BUCKET, bucket)
+
+    account_targets = account_targets.groupby(['Account', 'Key'], as_index=False)['Weight'].sum()
+    totals = account_targets.groupby('Account')['Weight'].sum()
+    for account, total in totals[(totals - 1).abs() > 1e-6].items():
+        print(f"Targets for {account} add up to {total:.2%}. Scaling them to 100%.")
+    account_targets['Weight'] /= account_targets['Account'].map(totals)
+    return holdings, account_targets.rename(columns={'Key': 'Bucket'})
+
+def plan_trades(holdings, targets, min_trade=None, min_cash=None, sell_short_term_gains=None):
+    """
+    Compute the trades that move every account to its target weights.
+
+    All accounts are solved together with group-wise operations:
+
+    1. Each bucket's target value is its weight times the account's tradable value
+       (securities plus cash). Without a cash target, cash keeps its current balance and
+       the weights are rescaled over the rest.
+    2. Buckets off target by less than `min_trade` are left alone.
+    3. Overweight buckets sell lots in tax order: losses first (largest loss per dollar),
+       then long-term gains and finally short-term gains (smallest gain per dollar first).
+    4. Underweight buckets buy into their existing positions in proportion to value. Buys are
+       scaled down per account so cash never falls below `min_cash`.
+
+    Args:
+        holdings (pd.DataFrame): Lots with a Bucket column (see `assign_targets`).
+        targets (pd.DataFrame): Account, Bucket and Weight.
+        min_trade (float, optional): Smallest bucket drift worth trading, in dollars.
+        min_cash (float, optional): Cash to keep in every account, in dollars.
+        sell_short_term_gains (bool, optional): Allow selling lots with short-term gains.
+
+    Returns:
+        tuple: (trades DataFrame, buckets DataFrame with current, target and resulting values)
+    """
+    min_trade = REBALANCE_CONSTANTS['MIN_TRADE'] if min_trade is None else min_trade
+    min_cash = REBALANCE_CONSTANTS['MIN_CASH'] if min_cash is None else min_cash
+    if sell_short_term_gains is None:
+        sell_short_term_gains = REBALANCE_CONSTANTS['SELL_SHORT_TERM_GAINS']
+
+    # Current and target value per bucket
+    buckets = holdings.groupby(['Account', 'Bucket'], as_index=False)['Value'].sum().rename(columns={'Value': 'Current'})
+    buckets = buckets.merge(targets, on=['Account', 'Bucket'], how='outer').fillna({'Current': 0.0, 'Weight': 0.0})
+    account_value = buckets.groupby('Account')['Current'].transform('sum')
+    is_cash = buckets['Bucket'] == CASH_BUCKET
+    keeps_cash = ~buckets['Account'].isin(targets.loc[targets['Bucket'] == CASH_BUCKET, 'Account'])
+    current_cash = buckets['Current'].where(is_cash, 0.0).groupby(buckets['Account']).transform('sum')
+    security_weight = buckets['Weight'].where(~is_cash, 0.0).groupby(buckets['Account']).transform('sum')
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rescaled = np.where(security_weight > 0, buckets['Weight'] / security_weight * (account_value - current_cash), 0.0)
+    buckets['Target'] = np.where(
+        keeps_cash, np.where(is_cash, buckets['Current'], rescaled), buckets['Weight'] * account_value
+    )
+    drift = buckets['Target'] - buckets['Current']
+    drift = drift.where(drift.abs() >= min_trade, 0.0)
+
+    # Sells: consume each overweight bucket's lots in tax order
+    securities = holdings[holdings['Type'] != "cash"].copy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gain_ratio = np.where(securities['Value'] > 0, securities['Gain'] / securities['Value'], 0.0)
+    is_loss = securities['Gain'] < 0
+    is_short_gain = ~is_loss & ~securities['Long-Term']
+    securities['Priority'] = np.select([is_loss, ~is_short_gain], [0, 1], 2) * 10 + gain_ratio
+    sellable = securities if sell_short_term_gains else securities[~is_short_gain]
+
+    bucket_index = pd.MultiIndex.from_frame(buckets[['Account', 'Bucket']])
+    lot_groups = bucket_index.get_indexer(pd.MultiIndex.from_frame(sellable[['Account', 'Bucket']]))
+    sells = (-drift).clip(lower=0).where(~is_cash, 0.0)
+    lot_index, _, amount = match_lots(
+        lot_groups, sellable['Priority'].to_numpy(), sellable['Value'].to_numpy(dtype=float),
+        np.flatnonzero(sells > 0), sells[sells > 0].to_numpy(dtype=float)
+    )
+    sold = sellable.iloc[lot_index].assign(Amount=amount)
+    sold['Quantity'] = sold['Amount'] / sold['Price']
+    realized = sold['Amount'] * (1 - sold['Unit Cost'] / sold['Price'])
+    sold['Long-Term Gain'] = realized.where(sold['Long-Term'], 0.0)
+    sold['Short-Term Gain'] = realized.where(~sold['Long-Term'], 0.0)
+    proceeds = sold.groupby('Account')['Amount'].sum()
+
+    # Buys: spread each underweight bucket's shortfall over its positions
+    positions = securities.groupby(['Account', 'Bucket', 'Ticker', 'Type'], as_index=False).agg(
+        Value=('Value', 'sum'), Price=('Price', 'last')
+    )
+    buys = drift.clip(lower=0).where(~is_cash, 0.0)
+    bucket_buys = pd.Series(buys.to_numpy(), index=bucket_index)
+    has_position = bucket_index.isin(pd.MultiIndex.from_frame(positions[['Account', 'Bucket']]))
+    for account, bucket in bucket_index[(buys > 0).to_numpy() & ~has_position]:
+        print(f"No {bucket} holding in {account} to buy into. Skipping.")
+
+    positions['Bucket Value'] = positions.groupby(['Account', 'Bucket'])['Value'].transform('sum')
+    positions['Amount'] = (
+        bucket_buys.reindex(pd.MultiIndex.from_frame(positions[['Account', 'Bucket']])).to_numpy()
+        * positions['Value'] / positions['Bucket Value']
+    )
+    positions = positions[positions['Amount'] > 0]
+
+    # Cash constraint: scale each account's buys to what cash and proceeds can fund
+    cash = holdings[holdings['Type'] == "cash"].groupby('Account')['Value'].sum()
+    wanted = positions.groupby('Account')['Amount'].sum()
+    funding = (cash.reindex(wanted.index, fill_value=0) + proceeds.reindex(wanted.index, fill_value=0) - min_cash).clip(lower=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = (funding / wanted).clip(upper=1).fillna(0)
+    for account in scale[scale < 1].index:
+        print(f"Not enough cash in {account}; scaling buys to {scale[account]:.0%}.")
+    positions['Amount'] *= positions['Account'].map(scale)
+    positions['Quantity'] = positions['Amount'] / positions['Price']
+
+    # Trade list, one row per account, ticker and side
+    sell_trades = sold.groupby(['Account', 'Bucket', 'Ticker', 'Type'], as_index=False).agg(
+        Quantity=('Quantity', 'sum'), Price=('Price', 'last'), Amount=('Amount', 'sum'),
+        **{'Long-Term Gain': ('Long-Term Gain', 'sum'), 'Short-Term Gain': ('Short-Term Gain', 'sum')}
+    ).assign(Action="Sell")
+    buy_trades = positions[positions['Amount'] > 0][['Account', 'Bucket', 'Ticker', 'Type', 'Quantity', 'Price', 'Amount']].assign(
+        Action="Buy", **{'Long-Term Gain': 0.0, 'Short-Term Gain': 0.0}
+    )
+    trades = pd.concat([sell_trades, buy_trades], ignore_index=True)
+    trades = trades[['Account', 'Action', 'Ticker', 'Type', 'Bucket', 'Quantity', 'Price', 'Amount', 'Long-Term Gain', 'Short-Term Gain']]
+    trades = trades.sort_values(['Account', 'Action', 'Amount'], ascending=[True, False, False], ignore_index=True)
+
+    # Resulting bucket values
+    traded = trades.assign(Signed=np.where(trades['Action'] == "Buy", trades['Amount'], -trades['Amount']))
+    net = traded.groupby(['Account', 'Bucket'])['Signed'].sum().reindex(bucket_index, fill_value=0).to_numpy()
+    cash_change = -traded.groupby('Account')['Signed'].sum()
+    buckets['After'] = buckets['Current'] + net + np.where(is_cash, buckets['Account'].map(cash_change).fillna(0), 0.0)
+    for column in ['Current', 'Target', 'After']:
+        buckets[f"{column} (%)"] = buckets[column] / account_value * 100
+    return trades, buckets
+
+def calculate_rebalance(portfolio_source, targets_file, output_file, **options):
+    """
+    Plan rebalancing trades for one or many calculated portfolios and save the trade list.
+
+    Args:
+        portfolio_source (str): A calculated portfolio file, a glob of them, or a directory
+                                (e.g. a batch output directory) whose *_output files are used.
+        targets_file (str): Path to the targets CSV (see `load_targets`).
+        output_file (str): Path to save the trade list. The extension selects the format.
+        **options: Passed to `plan_trades`.
+
+    Returns:
+        pd.DataFrame: The trade list.
+    """
+    if os.path.isfile(portfolio_source):
+        paths = [portfolio_source]
+    else:
+        # Batch directories also hold positions files and the batch summary
+        paths = find_portfolios(portfolio_source)
+        if os.path.isdir(portfolio_source):
+            paths = [path for path in paths if os.path.splitext(path)[0].endswith("_output")]
+    if not paths:
+        print(f"No portfolio files found in {portfolio_source}")
+        return pd.DataFrame()
+    if not os.path.exists(targets_file):
+        print(f"Targets file {targets_file} not found. See input/TEMPLATE_targets.csv.")
+        return pd.DataFrame()
+
+    portfolios = {get_account_name(path): read_table(path) for path in paths}
+    holdings, targets = assign_targets(build_holdings(portfolios), load_targets(targets_file))
+    trades, buckets = plan_trades(holdings, targets, **options)
+    write_table(trades, output_file, schema=None)
+
+    with pd.option_context("display.max_rows", None, "display.width", 160, "display.float_format", "{:,.2f}".format):
+        print(buckets[['Account', 'Bucket', 'Current (%)', 'Target (%)', 'After (%)']].to_string(index=False))
+        print(trades.to_string(index=False) if not trades.empty else "No trades needed.")
+    print(f"Planned {len(trades)} trades across {len(portfolios)} accounts; saved to {output_file}")
+    return trades
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan trades that rebalance portfolios to target weights")
+    parser.add_argument("--portfolios", default=FILE_PATHS['PORTFOLIO_OUTPUT'],
+                        help="Calculated portfolio file, directory or glob (e.g. a batch output directory)")
+    parser.add_argument("--targets", default=FILE_PATHS['REBALANCE_TARGETS'], help="Target weights CSV")
+    parser.add_argument("--min-trade", type=float, default=None, help="Smallest drift worth trading, in dollars")
+    parser.add_argument("--min-cash", type=float, default=None, help="Cash to keep in each account, in dollars")
+    parser.add_argument("--avoid-short-term-gains", action="store_true", help="Never sell lots with short-term gains")
+    args, _ = parser.parse_known_args()
+    calculate_rebalance(
+        args.portfolios, args.targets, FILE_PATHS['REBALANCE_OUTPUT'],
+        min_trade=args.min_trade, min_cash=args.min_cash,
+        sell_short_term_gains=False if args.avoid_short_term_gains else None
+    )
@@ -0,0 +1,223 @@
+import os, sys
+import numpy as np
+import pandas as pd
+from datetime import datetime
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from helpers.utils.constants import FILE_PATHS
+from helpers.utils.history import load_history
+from helpers.utils.schema import as_text
+from helpers.utils.storage import read_table
+
+# Types whose Cost Basis is a total balance rather than a per-unit cost
+FLAT_TYPES = ["cash", "401k", "hsa"]
+DAYS_PER_YEAR = 365
+
+def get_invested_amount(portfolio):
+    """
+    Total amount invested per row.
+
+    Args:
+        portfolio (pd.DataFrame): Portfolio with `Type`, `Quantity` and `Cost Basis` columns.
+
+    Returns:
+        np.ndarray: Cost Basis for cash/401k/hsa rows and Cost Basis * Quantity otherwise.
+    """
+    is_flat = portfolio['Type'].isin(FLAT_TYPES)
+    cost_basis = portfolio['Cost Basis'].fillna(0)
+    return np.where(is_flat, cost_basis, cost_basis * portfolio['Quantity'].fillna(0))
+
+def xirr(amounts, years, tol=1e-10, max_iter=100):
+    """
+    Solve the money-weighted return for many cash-flow series at once.
+
+    Each row of `amounts`/`years` is one series, padded with NaN. The rate r solves
+    sum(amount / (1 + r) ** years) = 0. All rows are solved together with Newton's
+    method on log(1 + r), falling back to bisection whenever a step leaves the
+    bracket, so there is no per-row Python loop.
+
+    Args:
+        amounts (np.ndarray): 2-D array of cash flows (negative = money in).
+        years (np.ndarray): 2-D array of flow times in years, same shape as `amounts`.
+        tol (float): Convergence tolerance on log(1 + r).
+        max_iter (int): Maximum number of iterations.
+
+    Returns:
+        np.ndarray: Annualized rate per row, NaN where no solution exists.
+    """
+    amounts = np.nan_to_num(np.asarray(amounts, dtype=float))
+    years = np.nan_to_num(np.asarray(years, dtype=float))
+
+    def npv(x):
+        with np.errstate(over="ignore", invalid="ignore"):
+            discount = np.exp(-x[:, None] * years)
+            return (amounts * discount).sum(axis=1), -(amounts * years * discount).sum(axis=1)
+
+    # Bracket log(1 + r) between roughly -99% and +14,700% a year
+    lo = np.full(len(amounts), -5.0)
+    hi = np.full(len(amounts), 5.0)
+    f_lo, _ = npv(lo)
+    f_hi, _ = npv(hi)
+    solvable = (np.sign(f_lo) * np.sign(f_hi) < 0) & (years.max(axis=1) > 0)
+
+    x = np.full(len(amounts), np.log1p(0.1))
+    for _ in range(max_iter):
+        f, df = npv(x)
+
+        # Shrink the bracket around the root
+        same_side = np.sign(f) == np.sign(f_lo)
+        lo, f_lo = np.where(same_side, x, lo), np.where(same_side, f, f_lo)
+        hi = np.where(same_side, hi, x)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_new = x - f / df
+        outside = ~np.isfinite(x_new) | (x_new <= np.minimum(lo, hi)) | (x_new >= np.maximum(lo, hi))
+        x_new = np.where(outside, (lo + hi) / 2, x_new)
+
+        converged = np.abs(x_new - x) < tol
+        x = x_new
+        if converged[solvable].all():
+            break
+
+    return np.where(solvable, np.expm1(x), np.nan)
+
+def _pad_flows(groups, amounts, dates, terminal_values, as_of):
+    """
+    Lay out each group's cash flows as one padded row.
+
+    Args:
+        groups (np.ndarray): Group code per flow, 0..n_groups-1.
+        amounts (np.ndarray): Flow amount per flow.
+        dates (pd.Series): Flow date per flow.
+        terminal_values (np.ndarray): Ending value per group, received at `as_of`.
+        as_of (pd.Timestamp): Valuation date.
+
+    Returns:
+        tuple: (amounts, years) 2-D arrays for `xirr`.
+    """
+    n_groups = len(terminal_values)
+    order = np.argsort(groups, kind="stable")
+    groups, amounts = groups[order], amounts[order]
+    days = ((dates - pd.Timestamp(as_of)) / pd.Timedelta(days=1)).to_numpy(dtype=float)[order]
+    positions = np.arange(len(groups)) - np.searchsorted(groups, groups, side="left")
+    width = (np.bincount(groups, minlength=n_groups).max() if len(groups) else 0) + 1
+
+    # Days relative to `as_of`; the terminal value sits in the last column at day 0
+    padded_amounts = np.full((n_groups, width), np.nan)
+    padded_days = np.full((n_groups, width), np.nan)
+    padded_amounts[groups, positions] = amounts
+    padded_days[groups, positions] = days
+    padded_amounts[:, -1] = terminal_values
+    padded_days[:, -1] = 0.0
+
+    start = np.nanmin(padded_days, axis=1)
+    return padded_amounts, (padded_days - start[:, None]) / DAYS_PER_YEAR
+
+def _time_weighted(history, keys):
+    """
+    Chain daily sub-period returns from the snapshot history.
+
+    Each sub-period return holds the previous snapshot's quantities constant, so
+    buys and sells between snapshots are treated as external flows.
+
+    Args:
+        history (pd.DataFrame): Output of `load_history`.
+        keys (list): Columns of `history` to group by (e.g. ["Ticker", "Type"] or ["Type"]).
+
+    Returns:
+        pd.Series: Cumulative time-weighted return in percent, indexed by group. NaN for a
+                   group with no priced period between snapshots.
+    """
+    history = history.assign(Day=history['Date'].dt.normalize(), Type=history['Type'].astype(str).str.lower())
+    daily = history.groupby(['Day', 'Ticker', 'Type'], observed=True).last()
+    prices = daily['Current Price'].unstack(['Ticker', 'Type'])
+    quantities = daily['Quantity'].unstack(['Ticker', 'Type'])
+
+    held = quantities.shift(1)
+    start_value = (held * prices.shift(1)).T
+    end_value = (held * prices).T
+    group_levels = [level for level in ['Ticker', 'Type'] if level in keys]
+    start_value = start_value.groupby(level=group_levels, observed=True).sum(min_count=1)
+    end_value = end_value.groupby(level=group_levels, observed=True).sum(min_count=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = (end_value / start_value).where(start_value > 0)
+    # Groups with no growth period yet (e.g. first seen in the latest snapshot) stay NaN
+    return (growth.prod(axis=1, min_count=1) - 1) * 100
+
+def compute_returns(portfolio, history=None, as_of=None):
+    """
+    Compute time-weighted and money-weighted (XIRR) returns per holding, per Type and for the portfolio.
+
+    Cash flows are the invested amount at each row's Purchase Date and the current
+    Value at `as_of`. Unpriced rows are ignored and rows without a valid Purchase
+    Date are left out of XIRR.
+    Every TWR in the result covers the same horizon, named in the TWR Window column.
+    When at least two snapshot days exist it chains the daily snapshot returns over the
+    history window, and rows the history does not cover are NaN. Otherwise it is
+    Value / Invested - 1 since purchase for every row.
+
+    Args:
+        portfolio (pd.DataFrame): A calculated portfolio.
+        history (pd.DataFrame, optional): Snapshot history from `load_history`.
+        as_of (datetime, optional): Valuation date. Defaults to now.
+
+    Returns:
+        pd.DataFrame: Columns Level, Name, Type, Invested, Value, TWR (%), TWR Window and XIRR (%).
+    """
+    as_of = pd.Timestamp(as_of or datetime.now())
+    # Skipped and unsupported rows were never priced
+    holdings = portfolio[portfolio['Ticker'].notna() & (portfolio['Current Price'] > 0)].copy()
+    holdings['Type'] = as_text(holdings['Type'])
+    holdings['Invested'] = get_invested_amount(holdings)
+    holdings['Value'] = holdings['Value'].fillna(0)
+    holdings['Date'] = pd.to_datetime(holdings['Purchase Date'], format="%Y-%m-%d", errors="coerce")
+    holdings['Portfolio'] = "Portfolio"
+
+    levels = [
+        ("Holding", ['Ticker', 'Type']),
+        ("Type", ['Type']),
+        ("Portfolio", ['Portfolio']),
+    ]
+    has_history = history is not None and history['Date'].dt.normalize().nunique() > 1
+    if has_history:
+        window = f"{history['Date'].min():%Y-%m-%d} to {history['Date'].max():%Y-%m-%d}"
+    else:
+        window = "Since purchase"
+
+    results = []
+    for level, keys in levels:
+        summary = holdings.groupby(keys, sort=False).agg({'Invested': 'sum', 'Value': 'sum'})
+
+        # XIRR over the dated rows of each group
+        dated = holdings[holdings['Date'].notna() & (holdings['Date'] <= as_of)]
+        dated_summary = dated.groupby(keys, sort=False)['Value'].sum().reindex(summary.index)
+        codes = summary.index.get_indexer(pd.MultiIndex.from_frame(dated[keys]) if len(keys) > 1 else dated[keys[0]])
+        amounts, years = _pad_flows(
+            codes, -dated['Invested'].to_numpy(dtype=float), dated['Date'],
+            dated_summary.fillna(0).to_numpy(dtype=float), as_of
+        )
+        summary['XIRR (%)'] = np.where(dated_summary.notna(), xirr(amounts, years) * 100, np.nan)
+
+        # TWR over the history window for every row, or a holding-period return for every row
+        if has_history and level != "Portfolio":
+            summary['TWR (%)'] = _time_weighted(history, keys).reindex(summary.index)
+        elif has_history:
+            chained = _time_weighted(history.assign(Type="portfolio"), ['Type'])
+            summary['TWR (%)'] = chained.iloc[0] if len(chained) else np.nan
+        else:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                summary['TWR (%)'] = np.where(summary['Invested'] > 0, (summary['Value'] / summary['Invested'] - 1) * 100, np.nan)
+        summary['TWR Window'] = window
+
+        summary = summary.reset_index()
+        summary['Level'] = level
+        summary['Name'] = summary[keys[0]]
+        summary['Type'] = summary['Type'] if 'Type' in summary else ""
+        results.append(summary[['Level', 'Name', 'Type', 'Invested', 'Value', 'TWR (%)', 'TWR Window', 'XIRR (%)']])
+
+    return pd.concat(results, ignore_index=True)
+
+if __name__ == "__main__":
+    returns = compute_returns(read_table(FILE_PATHS['PORTFOLIO_OUTPUT']), history=load_history())
+    with pd.option_context("display.max_rows", None, "display.width", 120, "display.float_format", "{:,.2f}".format):
+        print(returns.to_string(index=False))
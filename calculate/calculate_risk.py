@@ -0,0 +1,237 @@
+import os, sys
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from calculate.calculate_lots import build_lots, summarize_positions
+from helpers.utils.api import get_price_histories
+from helpers.utils.constants import FILE_PATHS, RISK_CONSTANTS
+from helpers.utils.storage import read_table, write_table
+
+# Types with a market price history; everything else is treated as riskless
+MARKET_TYPES = ["stock", "etf", "crypto"]
+
+def get_log_returns(closes, lookback=None, min_observations=None, calendar=None):
+    """
+    Turn aligned daily closes into daily log returns.
+
+    Args:
+        closes (pd.DataFrame): Closing prices, one column per asset, indexed by date.
+        lookback (int, optional): Keep only the most recent returns. Defaults to RISK_CONSTANTS['LOOKBACK_DAYS'].
+        min_observations (int, optional): Drop assets with fewer returns than this.
+                                          Defaults to RISK_CONSTANTS['MIN_OBSERVATIONS'].
+        calendar (pd.Index, optional): Dates to sample on (e.g. the benchmark's trading days),
+                                       so weekend crypto closes do not add extra periods.
+
+    Returns:
+        pd.DataFrame: Log returns for the assets priced on every day of the window.
+    """
+    lookback = lookback or RISK_CONSTANTS['LOOKBACK_DAYS']
+    min_observations = min_observations or RISK_CONSTANTS['MIN_OBSERVATIONS']
+
+    closes = closes.where(closes > 0).ffill()
+    if calendar is not None:
+        closes = closes.reindex(calendar.intersection(closes.index))
+    returns = np.log(closes).diff().iloc[1:].tail(lookback)
+
+    # A missing return is not a flat day, so assets that do not cover the whole window are left out
+    sparse = returns.columns[(returns.notna().sum() < min_observations) | returns.isna().any()]
+    if len(sparse):
+        print(f"Not enough price history for {', '.join(str(column[0]) for column in sparse)}. Excluding from risk.")
+    return returns.drop(columns=sparse)
+
+def _simulate_chunk(job):
+    """
+    Simulate one chunk of portfolio profit and loss paths.
+
+    Args:
+        job (tuple): (factor, mean, values, paths, seed) where `factor @ factor.T` is the
+                     horizon covariance of log returns.
+
+    Returns:
+        np.ndarray: Simulated profit and loss per path.
+    """
+    factor, mean, values, paths, seed = job
+    rng = np.random.default_rng(seed)
+    log_returns = rng.standard_normal((paths, factor.shape[1])) @ factor.T + mean
+    return np.expm1(log_returns) @ values
+
+def simulate_pnl(mean, covariance, values, simulations=None, horizon=None, seed=None, chunk_size=None, max_workers=None):
+    """
+    Monte Carlo profit and loss from jointly normal log returns.
+
+    Paths are split into chunks with independent seeds, so results do not depend on
+    how many processes run them. More than one chunk is spread over a process pool.
+
+    Args:
+        mean (np.ndarray): Daily mean log return per asset.
+        covariance (np.ndarray): Daily covariance of log returns.
+        values (np.ndarray): Dollar value held per asset.
+        simulations (int, optional): Number of paths. Defaults to RISK_CONSTANTS['SIMULATIONS'].
+        horizon (int, optional): Horizon in trading days. Defaults to RISK_CONSTANTS['HORIZON_DAYS'].
+        seed (int, optional): Random seed. Defaults to RISK_CONSTANTS['SEED'].
+        chunk_size (int, optional): Paths per chunk. Defaults to RISK_CONSTANTS['CHUNK_SIZE'].
+        max_workers (int, optional): Process pool size. Defaults to RISK_CONSTANTS['MAX_WORKERS'].
+
+    Returns:
+        np.ndarray: Simulated profit and loss per path.
+    """
+    simulations = simulations or RISK_CONSTANTS['SIMULATIONS']
+    horizon = horizon or RISK_CONSTANTS['HORIZON_DAYS']
+    seed = RISK_CONSTANTS['SEED'] if seed is None else seed
+    chunk_size = chunk_size or RISK_CONSTANTS['CHUNK_SIZE']
+    max_workers = max_workers or RISK_CONSTANTS['MAX_WORKERS']
+
+    # Eigen factor rather than Cholesky: with more assets than observations the covariance is singular
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance * horizon)
+    factor = eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
+
+    sizes = [chunk_size] * (simulations // chunk_size) + ([simulations % chunk_size] if simulations % chunk_size else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(factor, mean * horizon, values, size, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+
+    if len(jobs) == 1 or max_workers == 1:
+        return np.concatenate([_simulate_chunk(job) for job in jobs])
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return np.concatenate(list(executor.map(_simulate_chunk, jobs)))
+
+def value_at_risk(pnl, confidence=None):
+    """
+    Value-at-Risk and expected shortfall of a profit and loss sample.
+
+    Args:
+        pnl (np.ndarray): Profit and loss per scenario. A 2-D array is treated column by column.
+        confidence (float, optional): Defaults to RISK_CONSTANTS['CONFIDENCE'].
+
+    Returns:
+        tuple: (VaR, expected shortfall) as positive loss amounts.
+    """
+    confidence = confidence or RISK_CONSTANTS['CONFIDENCE']
+    threshold = np.quantile(pnl, 1 - confidence, axis=0)
+    tail = np.where(pnl <= threshold, pnl, np.nan)
+    return -threshold, -np.nanmean(tail, axis=0)
+
+def compute_risk(positions, closes, benchmark=None, confidence=None, horizon=None, simulations=None, max_workers=None):
+    """
+    Compute volatility, beta, risk contribution and VaR for a set of positions.
+
+    Args:
+        positions (pd.DataFrame): Ticker, Type and Value per position (see `summarize_positions`).
+        closes (pd.DataFrame): Daily closes with (Ticker, Type) columns, including the benchmark.
+        benchmark (tuple, optional): (ticker, type) market proxy. Defaults to RISK_CONSTANTS['BENCHMARK'].
+        confidence (float, optional): VaR confidence. Defaults to RISK_CONSTANTS['CONFIDENCE'].
+        horizon (int, optional): VaR horizon in trading days. Defaults to RISK_CONSTANTS['HORIZON_DAYS'].
+        simulations (int, optional): Monte Carlo paths. Defaults to RISK_CONSTANTS['SIMULATIONS'].
+        max_workers (int, optional): Process pool size for the simulation.
+
+    Returns:
+        pd.DataFrame: One row per position and a final Portfolio row with Value, Weight (%),
+                      Volatility (%), Beta, Risk Contribution (%), Historical VaR,
+                      Monte Carlo VaR and Expected Shortfall (dollars). Market holdings
+                      without enough price history are NaN and left out of the Portfolio row.
+    """
+    benchmark = tuple(benchmark or RISK_CONSTANTS['BENCHMARK'])
+    horizon = horizon or RISK_CONSTANTS['HORIZON_DAYS']
+    trading_days = RISK_CONSTANTS['TRADING_DAYS']
+
+    calendar = closes[benchmark].dropna().index if benchmark in closes else None
+    returns = get_log_returns(closes, calendar=calendar)
+
+    positions = positions.reset_index(drop=True)
+    keys = list(zip(positions['Ticker'], positions['Type']))
+    covered = [key in returns.columns for key in keys]
+    held = returns[[key for key, has_history in zip(keys, covered) if has_history]]
+    values = positions.loc[covered, 'Value'].to_numpy(dtype=float)
+    total_value = positions['Value'].sum()
+
+    # Covariance, volatility and marginal risk
+    data = held.to_numpy()
+    mean = data.mean(axis=0)
+    covariance = np.atleast_2d(np.cov(data, rowvar=False)) if len(data) > 1 else np.zeros((len(values), len(values)))
+    dollar_variance = values @ covariance @ values
+    with np.errstate(divide="ignore", invalid="ignore"):
+        contribution = np.where(dollar_variance > 0, values * (covariance @ values) / dollar_variance * 100, 0.0)
+
+    # Beta against the benchmark
+    if benchmark in returns:
+        market = returns[benchmark].to_numpy()
+        market_variance = market.var(ddof=1)
+        beta = (data - mean).T @ (market - market.mean()) / (len(market) - 1) / market_variance
+    else:
+        print(f"No price history for benchmark {benchmark[0]}. Beta is unavailable.")
+        beta = np.full(len(values), np.nan)
+
+    # Historical VaR from overlapping horizon-day returns, per holding and for the portfolio
+    horizon_returns = held.rolling(horizon).sum().dropna().to_numpy()
+    holding_pnl = np.expm1(horizon_returns) * values
+    holding_var, _ = value_at_risk(holding_pnl, confidence) if len(holding_pnl) else (np.full(len(values), np.nan), None)
+    historical_var, expected_shortfall = value_at_risk(holding_pnl.sum(axis=1), confidence) if len(holding_pnl) else (np.nan, np.nan)
+
+    # Monte Carlo VaR
+    if len(values) and len(data) > 1:
+        simulated = simulate_pnl(mean, covariance, values, simulations=simulations, horizon=horizon, max_workers=max_workers)
+        monte_carlo_var, _ = value_at_risk(simulated, confidence)
+    else:
+        monte_carlo_var = np.nan
+
+    # Riskless types have no market risk; market holdings without price history are unknown
+    risk = positions[['Ticker', 'Type', 'Value']].copy()
+    risk['Weight (%)'] = risk['Value'] / total_value * 100
+    unmeasured = np.where(risk['Type'].isin(MARKET_TYPES), np.nan, 0.0)
+    for column in ['Volatility (%)', 'Beta', 'Risk Contribution (%)', 'Historical VaR']:
+        risk[column] = unmeasured
+    risk.loc[covered, 'Volatility (%)'] = np.sqrt(np.diag(covariance) * trading_days) * 100
+    risk.loc[covered, 'Beta'] = beta
+    risk.loc[covered, 'Risk Contribution (%)'] = contribution
+    risk.loc[covered, 'Historical VaR'] = holding_var
+    measured_value = risk.loc[risk['Volatility (%)'].notna(), 'Value'].sum()
+    risk['Monte Carlo VaR'] = np.nan
+    risk['Expected Shortfall'] = np.nan
+
+    portfolio = {
+        'Ticker': "Portfolio",
+        'Type': "",
+        'Value': total_value,
+        'Weight (%)': 100.0,
+        'Volatility (%)': np.sqrt(dollar_variance * trading_days) / measured_value * 100 if measured_value else np.nan,
+        'Beta': np.nansum(beta * values) / measured_value if measured_value else np.nan,
+        'Risk Contribution (%)': 100.0,
+        'Historical VaR': historical_var,
+        'Monte Carlo VaR': monte_carlo_var,
+        'Expected Shortfall': expected_shortfall,
+    }
+    return pd.concat([risk, pd.DataFrame([portfolio])], ignore_index=True)
+
+def calculate_risk(portfolio_file, output_file):
+    """
+    Fetch price histories for a calculated portfolio and save its risk analytics.
+
+    Args:
+        portfolio_file (str): Path to the calculated portfolio.
+        output_file (str): Path to save the risk table. The extension selects the format.
+    """
+    portfolio = read_table(portfolio_file)
+    positions = summarize_positions(*build_lots(portfolio))
+    positions = positions[positions['Value'] > 0]
+
+    if positions.empty:
+        print("Portfolio is empty. Check your CSV file.")
+        return
+
+    market = positions[positions['Type'].isin(MARKET_TYPES)]
+    assets = list(zip(market['Ticker'], market['Type'])) + [tuple(RISK_CONSTANTS['BENCHMARK'])]
+    closes = get_price_histories(assets)
+    print(f"Loaded price history for {closes.shape[1]} assets over {len(closes)} days")
+
+    risk = compute_risk(positions, closes)
+    write_table(risk, output_file, schema=None)
+
+    summary = risk.iloc[-1]
+    confidence = int(RISK_CONSTANTS['CONFIDENCE'] * 100)
+    print(f"Annualized volatility: {summary['Volatility (%)']:.2f}% | Beta: {summary['Beta']:.2f}")
+    print(f"{confidence}% {RISK_CONSTANTS['HORIZON_DAYS']}-day VaR: historical ${summary['Historical VaR']:,.2f}, "
+          f"Monte Carlo ${summary['Monte Carlo VaR']:,.2f}, expected shortfall ${summary['Expected Shortfall']:,.2f}")
+    print(f"Risk analytics saved to {output_file}")
+
+if __name__ == "__main__":
+    calculate_risk(FILE_PATHS['PORTFOLIO_OUTPUT'], FILE_PATHS['RISK_OUTPUT'])
@@ -1,61 +1,134 @@
-import os, sys
+import argparse, os, sys
+import numpy as np
 import pandas as pd
+from datetime import datetime, timedelta
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from helpers.utils.api import get_price
-from helpers.utils.constants import FILE_PATHS
+from helpers.utils.api import get_portfolio_prices
+from helpers.utils.cache import report_cache_stats
+from helpers.utils.history import append_snapshot
+from helpers.utils.constants import FILE_PATHS, PRICE_AS_OF_FORMAT, UPDATE_CONSTANTS
+from helpers.utils.storage import read_table, write_table
 
-def update_portfolio_prices(input_file):
+def select_rows_to_update(portfolio, stale_after=None, tickers=None, now=None):
+    """
+    Pick the rows an update should reprice.
+
+    Args:
+        portfolio (pd.DataFrame): The portfolio being updated.
+        stale_after (float, optional): Only rows priced more than this many minutes ago
+                                       (or never) are selected. None selects every row.
+        tickers (list, optional): Only rows for these tickers are selected.
+        now (datetime, optional): Reference time for staleness. Defaults to now.
+
+    Returns:
+        pd.Series: Boolean mask of the selected rows.
+    """
+    selected = pd.Series(True, index=portfolio.index)
+
+    if tickers:
+        selected &= portfolio['Ticker'].astype(str).str.upper().isin([ticker.upper() for ticker in tickers])
+
+    if stale_after is not None:
+        now = now or datetime.now()
+        price_as_of = pd.to_datetime(portfolio['Price As Of'], format=PRICE_AS_OF_FORMAT, errors="coerce")
+        selected &= price_as_of.isna() | (now - price_as_of > timedelta(minutes=stale_after))
+
+    return selected
+
+def update_portfolio_prices(input_file, stale_after=None, tickers=None):
     """
     Updates the current prices of assets in the portfolio file without changing its structure.
 
     Args:
-        input_file (str): Path to the portfolio CSV file to be updated.
+        input_file (str): Path to the portfolio file (CSV, Parquet or Feather) to be updated.
+        stale_after (float, optional): Incremental mode. Only reprice rows whose `Price As Of`
+                                       is older than this many minutes.
+        tickers (list, optional): Only reprice rows for these tickers.
     """
-    portfolio = pd.read_csv(input_file)
+    portfolio = read_table(input_file)
 
     if portfolio.empty:
         print("Portfolio is empty. Check your CSV file.")
         return
 
-    total_value = 0
-
-    for index, row in portfolio.iterrows():
-        ticker = row['Ticker']
-        asset_type = row['Type']
-        quantity = row['Quantity']
-        cost_basis = row.get('Cost Basis', 0)
-
-        # Fetch updated price
-        if asset_type == "cash":
-            price, value, gain_loss, percentage_gain_loss = 1, quantity, 0, 0
-        elif asset_type in ["401k", "hsa"]:
-            price = 1
-            value = price * quantity
-            gain_loss = value - cost_basis
-            percentage_gain_loss = (gain_loss / cost_basis) * 100 if cost_basis > 0 else 100
-        else:
-            # For dynamic assets
-            price = get_price(ticker, asset_type)
-            if price is None:
-                print(f"Could not fetch price for {ticker} ({asset_type}). Retaining existing price.")
-                price = row.get('Current Price', 0)  # Retain existing price if fetch fails
-
-            value = price * quantity
-            gain_loss = value - (cost_basis * quantity) if cost_basis > 0 else value
-            percentage_gain_loss = (gain_loss / (cost_basis * quantity)) * 100 if cost_basis > 0 else 0
-
-        # Update the portfolio row
-        portfolio.at[index, 'Current Price'] = price
-        portfolio.at[index, 'Value'] = value
-        portfolio.at[index, 'Gain/Loss'] = gain_loss
-        portfolio.at[index, '% Gain/Loss'] = percentage_gain_loss
-
-        total_value += value
+    now = datetime.now()
+    if 'Price As Of' not in portfolio:
+        portfolio['Price As Of'] = pd.NaT
+
+    derived_columns = ['Current Price', 'Value', 'Gain/Loss', '% Gain/Loss']
+    portfolio[derived_columns] = portfolio[derived_columns].astype(float)
+
+    touched = select_rows_to_update(portfolio, stale_after=stale_after, tickers=tickers, now=now)
+    is_cash = touched & (portfolio['Type'] == "cash")
+    is_flat = touched & portfolio['Type'].isin(["401k", "hsa"])
+    is_dynamic = touched & ~is_cash & ~is_flat
+
+    # Fetch each unique quote once, concurrently, and fan it out to every touched row
+    prices = get_portfolio_prices(portfolio, mask=is_dynamic & portfolio['Ticker'].notna())
+
+    # Retain the existing price where no quote is available; a non-positive quote is never valid
+    missing = is_dynamic & (prices.isna() | (prices <= 0))
+    for _, row in portfolio.loc[missing, ['Ticker', 'Type']].drop_duplicates().iterrows():
+        print(f"Could not fetch price for {row['Ticker']} ({row['Type']}). Retaining existing price.")
+
+    quantity = portfolio['Quantity']
+    cost_basis = portfolio['Cost Basis'] if 'Cost Basis' in portfolio else pd.Series(0, index=portfolio.index)
+    has_cost = cost_basis > 0
+
+    # Recompute derived columns for the touched rows only; rows without a quote keep their prior values
+    is_quoted = is_dynamic & ~missing
+    price = np.select([is_cash | is_flat, is_quoted], [1.0, prices], portfolio['Current Price'])
+    value = np.select([is_cash, is_flat | is_quoted], [quantity, price * quantity], portfolio['Value'])
+    gain_loss = np.select(
+        [is_cash, is_flat, is_quoted],
+        [0.0, value - cost_basis, np.where(has_cost, value - cost_basis * quantity, value)],
+        portfolio['Gain/Loss']
+    )
+    percentage_gain_loss = np.select(
+        [is_cash, is_flat, is_quoted],
+        [
+            0.0,
+            np.where(has_cost, (gain_loss / cost_basis) * 100, 100.0),
+            np.where(has_cost, (gain_loss / (cost_basis * quantity)) * 100, 0.0),
+        ],
+        portfolio['% Gain/Loss']
+    )
+
+    portfolio['Current Price'] = price
+    portfolio['Value'] = value
+    portfolio['Gain/Loss'] = gain_loss
+    portfolio['% Gain/Loss'] = percentage_gain_loss
+
+    # Stamp rows that received a fresh quote so incremental runs can skip them
+    refreshed = is_cash | is_flat | is_quoted
+    portfolio.loc[refreshed, 'Price As Of'] = pd.Timestamp(now).floor("s")
 
     # Save the updated portfolio back to the same file
-    portfolio.to_csv(input_file, index=False)
+    write_table(portfolio, input_file)
+    append_snapshot(portfolio)
+    print(f"Repriced {int(touched.sum())} of {len(portfolio)} rows")
     print(f"Updated portfolio saved to {input_file}")
-    print(f"Total portfolio value: ${total_value:,.2f}")
+    print(f"Total portfolio value: ${portfolio['Value'].sum():,.2f}")
+    report_cache_stats()
+
+def parse_update_args():
+    """
+    Parse command-line arguments for the update script.
+
+    Returns:
+        argparse.Namespace: Parsed arguments with `stale_after` and `tickers`.
+    """
+    parser = argparse.ArgumentParser(description="Update Portfolio Prices")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"Only reprice rows older than {UPDATE_CONSTANTS['STALE_AFTER_MINUTES']} minutes")
+    parser.add_argument("--stale-after", type=float, default=None, help="Only reprice rows older than this many minutes")
+    parser.add_argument("--tickers", type=lambda x: [ticker.strip() for ticker in x.split(",") if ticker.strip()],
+                        default=None, help="Comma-separated tickers to reprice")
+    args, _ = parser.parse_known_args()
+    if args.incremental and args.stale_after is None:
+        args.stale_after = UPDATE_CONSTANTS['STALE_AFTER_MINUTES']
+    return args
 
 if __name__ == "__main__":
-    update_portfolio_prices(FILE_PATHS['PORTFOLIO_OUTPUT'])
+    args = parse_update_args()
+    update_portfolio_prices(FILE_PATHS['PORTFOLIO_OUTPUT'], stale_after=args.stale_after, tickers=args.tickers)
\ No newline at end of file
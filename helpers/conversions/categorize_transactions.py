@@ -0,0 +1,334 @@
+import argparse, json, re, string, time
+import os, sys
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from helpers.conversions.convert_fidelity import read_chunks
+from helpers.utils.constants import CATEGORIZE_CONSTANTS, FILE_PATHS
+from helpers.utils.schema import LEDGER_SCHEMA
+from helpers.utils.storage import apply_schema, check_issues, write_table, write_table_chunks
+
+RULE_KEYS = ["source", "category", "merchant", "keywords", "regex", "min_amount", "max_amount"]
+
+# Reference numbers, store numbers and card masks that make one merchant look like many
+MERCHANT_NOISE = [
+    (re.compile(r"^(?:SQ|TST|SP|PP|PAYPAL|POS|ACH|DEBIT|PURCHASE)\s*\*\s*", re.IGNORECASE), ""),
+    (re.compile(r"(?:#|\bX{2,}|\*)\s*\w*\d\w*"), " "),
+    (re.compile(r"(?<!\S)\d+(?:[/\-.:]\d+)*(?!\S)"), " "),
+    (re.compile(r"\s+"), " "),
+]
+
+def load_rules(rules_file):
+    """
+    Load categorisation rules.
+
+    Args:
+        rules_file (str): Path to a JSON list of rules, highest priority first. Each rule has
+            a `source` and optionally:
+              category: "income" or "expenses"; by default the sign of the amount decides
+              merchant: name to record instead of the cleaned description
+              keywords: words matched anywhere in the description, ignoring case
+              regex: a regular expression searched in the description, ignoring case
+              min_amount, max_amount: bounds on the absolute amount
+            A rule matches when its keywords or regex match (if it has any) and the
+            amount is within its bounds (if it has any).
+
+    Returns:
+        list: The rules, or an empty list if the file does not exist.
+
+    Raises:
+        ValueError: If a rule has no source, unknown keys, nothing to match on, or an invalid regex.
+    """
+    if not rules_file or not os.path.exists(rules_file):
+        return []
+    with open(rules_file, "r") as infile:
+        rules = json.load(infile)
+
+    for number, rule in enumerate(rules, start=1):
+        problems = [f"unknown keys {', '.join(key for key in rule if key not in RULE_KEYS)}"] if set(rule) - set(RULE_KEYS) else []
+        if not rule.get('source'):
+            problems.append("no source")
+        if rule.get('category') not in (None, "income", "expenses"):
+            problems.append(f"category '{rule['category']}' is not income or expenses")
+        if not any(key in rule for key in ["keywords", "regex", "min_amount", "max_amount"]):
+            problems.append("nothing to match on")
+        try:
+            re.compile(rule.get('regex', ""))
+        except re.error as error:
+            problems.append(f"invalid regex ({error})")
+        if problems:
+            raise ValueError(f"Rule {number} in {rules_file}: {'; '.join(problems)}")
+    return rules
+
+def _text_pattern(rule):
+    """The rule's keywords and regex as one pattern, or None for amount-only rules."""
+    parts = [re.escape(keyword) for keyword in rule.get('keywords', [])]
+    if rule.get('regex'):
+        parts.append(f"(?:{rule['regex']})")
+    return "|".join(parts) or None
+
+def _trie_pattern(keywords):
+    """
+    A regex matching any of the keywords, shaped as a trie.
+
+    Keywords sharing a prefix share its branch, so each position of a description costs
+    one step per character rather than one attempt per keyword. Optional branches are
+    greedy, so the longest keyword starting at a position is the one matched.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+def compile_rules(rules):
+    """
+    Compile rules into one matcher.
+
+    The keywords of every description-only rule go into a single trie-shaped regex,
+    scanned once per description with a lookahead that reports the longest keyword
+    starting at each position, the same result as an Aho-Corasick pass. Each keyword
+    maps to the highest-priority rule among it and the keywords it starts with, so the
+    best rule over all positions is the first rule in priority order that matches.
+    Regex rules are compiled separately, and rules with amount bounds are kept apart
+    and checked column-wise.
+
+    Args:
+        rules (list): Rules from `load_rules`.
+
+    Returns:
+        dict: The rules, the `keywords` finder (None without keyword rules), `keyword_rules`
+              mapping each lower-cased keyword to its rule index, `regex` rules as
+              (rule index, regex) tuples and `amount` rules as (rule index, regex or None,
+              min, max) tuples.
+    """
+    keyword_rules, regex_rules, amount_rules = {}, [], []
+    for index, rule in enumerate(rules):
+        if "min_amount" in rule or "max_amount" in rule:
+            pattern = _text_pattern(rule)
+            amount_rules.append((
+                index,
+                re.compile(pattern, re.IGNORECASE) if pattern else None,
+                rule.get('min_amount', -np.inf),
+                rule.get('max_amount', np.inf),
+            ))
+            continue
+        for keyword in rule.get('keywords', []):
+            keyword_rules.setdefault(keyword.lower(), index)
+        if rule.get('regex'):
+            regex_rules.append((index, re.compile(rule['regex'], re.IGNORECASE)))
+
+    # A keyword found in a description also means every keyword it starts with was found
+    keyword_rules = {
+        keyword: min(rule for other, rule in keyword_rules.items() if keyword.startswith(other))
+        for keyword in keyword_rules
+    }
+    return {
+        "rules": rules,
+        "keywords": re.compile(f"(?=({_trie_pattern(keyword_rules)}))", re.DOTALL) if keyword_rules else None,
+        "keyword_rules": keyword_rules,
+        "regex": regex_rules,
+        "amount": amount_rules,
+    }
+
+def clean_merchants(descriptions):
+    """
+    Merchant names from raw descriptions: processor prefixes, reference and store
+    numbers and extra spaces removed, with each word capitalized.
+
+    Args:
+        descriptions (pd.Series): Distinct descriptions.
+
+    Returns:
+        pd.Series: Cleaned names.
+    """
+    merchants = descriptions.fillna("").astype(str)
+    for pattern, replacement in MERCHANT_NOISE:
+        merchants = merchants.str.replace(pattern, replacement, regex=True)
+    merchants = merchants.str.strip(" -*").map(string.capwords)
+    return merchants.where(merchants != "", descriptions.fillna("").astype(str).str.strip())
+
+def match_descriptions(matcher, descriptions, cache):
+    """
+    The first description-only rule matching each description.
+
+    Args:
+        matcher (dict): Output of `compile_rules`.
+        descriptions (pd.Series): Distinct descriptions.
+        cache (dict): Description -> (rule index, merchant), filled in as descriptions are
+            seen so each one is matched and cleaned once per run.
+
+    Returns:
+        tuple: (rule index array with len(rules) for no match, merchant name array)
+    """
+    new = pd.Series([description for description in descriptions if description not in cache], dtype=object)
+    if len(new):
+        unmatched, finder, keyword_rules = len(matcher['rules']), matcher['keywords'], matcher['keyword_rules']
+        indexes = np.array([
+            min((keyword_rules[keyword] for keyword in finder.findall(description.lower())), default=unmatched)
+            for description in new
+        ] if finder else [unmatched] * len(new), dtype=np.int64)
+        for index, pattern in matcher['regex']:
+            matches = np.fromiter((pattern.search(description) is not None for description in new), dtype=bool, count=len(new))
+            indexes = np.where(matches & (index < indexes), index, indexes)
+        cache.update(zip(new, zip(indexes.tolist(), clean_merchants(new).tolist())))
+
+    found = [cache[description] for description in descriptions]
+    return (
+        np.fromiter((index for index, _ in found), dtype=np.int64, count=len(found)),
+        np.array([merchant for _, merchant in found], dtype=object),
+    )
+
+def categorize(transactions, matcher, cache=None, expenses_negative=None):
+    """
+    Categorise transactions into ledger rows.
+
+    Descriptions are factorized, so each distinct description is matched once however
+    often it repeats; amount rules are then applied to whole columns.
+
+    Args:
+        transactions (pd.DataFrame): Date, Description and signed Amount columns.
+        matcher (dict): Output of `compile_rules`.
+        cache (dict, optional): Matches carried between calls (see `match_descriptions`).
+        expenses_negative (bool, optional): Whether spending has negative amounts.
+            Defaults to CATEGORIZE_CONSTANTS['EXPENSES_NEGATIVE'].
+
+    Returns:
+        tuple: (ledger rows with Date, Source, Merchant, Category and Amount columns,
+                boolean array of rows no rule matched)
+    """
+    rules, cache = matcher['rules'], {} if cache is None else cache
+    expenses_negative = CATEGORIZE_CONSTANTS['EXPENSES_NEGATIVE'] if expenses_negative is None else expenses_negative
+    codes, uniques = pd.factorize(transactions['Description'].fillna(""))
+    unique_rules, unique_merchants = match_descriptions(matcher, pd.Series(uniques, dtype=object), cache)
+    rule = unique_rules[codes]
+    amount = transactions['Amount'].to_numpy(dtype=float)
+
+    # Amount rules win over later text rules: keep the lowest matching rule index
+    for index, pattern, low, high in matcher['amount']:
+        matches = (np.abs(amount) >= low) & (np.abs(amount) <= high)
+        if pattern is not None:
+            matches &= np.array([bool(pattern.search(description)) for description in uniques], dtype=bool)[codes]
+        rule = np.where(matches & (index < rule), index, rule)
+
+    unmatched = rule == len(rules)
+    sources = np.array([entry['source'] for entry in rules] + [CATEGORIZE_CONSTANTS['DEFAULT_SOURCE']], dtype=object)
+    categories = np.array([entry.get('category') for entry in rules] + [None], dtype=object)
+    merchants = np.array([entry.get('merchant') for entry in rules] + [None], dtype=object)
+
+    # Income is money in; a rule's category can override the sign, e.g. for refunds
+    inflow = amount if expenses_negative else -amount
+    category = pd.Series(categories[rule]).fillna(pd.Series(np.where(inflow > 0, "income", "expenses")))
+    merchant = pd.Series(merchants[rule]).fillna(pd.Series(unique_merchants[codes]))
+    ledger = pd.DataFrame({
+        "Date": transactions['Date'].to_numpy(),
+        "Source": sources[rule],
+        "Merchant": merchant.to_numpy(),
+        "Category": category.to_numpy(),
+        "Amount": np.where(category == "income", inflow, -inflow),
+    })
+    return ledger, unmatched
+
+def categorize_transactions(input_file, output_file, rules_file=None, unmatched_file=None, columns=None,
+                            date_format=None, chunk_size=None):
+    """
+    Categorise a bank or card export into a transaction ledger for `calculate_budget.py`.
+
+    The export is streamed in chunks. Matches are cached across chunks, and
+    descriptions no rule matched are reported by merchant with their count and total.
+
+    Args:
+        input_file (str): Path to the CSV export.
+        output_file (str): Path to save the ledger.
+        rules_file (str, optional): Rules JSON. Defaults to FILE_PATHS['CATEGORY_RULES'].
+        unmatched_file (str, optional): Path to save the unmatched merchant report.
+            Defaults to FILE_PATHS['UNCATEGORIZED_OUTPUT'].
+        columns (dict, optional): Export column names for Date, Description and Amount.
+            Defaults to CATEGORIZE_CONSTANTS['COLUMNS'].
+        date_format (str, optional): Date format of the export. Defaults to CATEGORIZE_CONSTANTS['DATE_FORMAT'].
+        chunk_size (int, optional): Rows per chunk. Defaults to CONVERSION_CONSTANTS['CHUNK_SIZE'].
+
+    Returns:
+        pd.DataFrame: The unmatched report with Merchant, Transactions and Amount columns.
+    """
+    start = time.perf_counter()
+    matcher = compile_rules(load_rules(rules_file or FILE_PATHS['CATEGORY_RULES']))
+    columns = {**CATEGORIZE_CONSTANTS['COLUMNS'], **(columns or {})}
+    schema = {
+        "Date": {"dtype": "date", "format": date_format or CATEGORIZE_CONSTANTS['DATE_FORMAT'], "required": True},
+        "Amount": {"dtype": "float64", "required": True},
+    }
+    totals, cache, issues, unmatched_parts = {"rows": 0, "unmatched": 0}, {}, [], []
+
+    def ledger_chunks():
+        first_row = 2
+        chunks = read_chunks(input_file, [columns['Date'], columns['Description'], columns['Amount']], chunk_size)
+        for chunk in chunks:
+            chunk = chunk.rename(columns={name: column for column, name in columns.items()})
+            chunk = apply_schema(chunk, schema, issues, first_row)
+            first_row += len(chunk)
+            chunk = chunk.dropna(subset=['Date', 'Amount'])
+            ledger, unmatched = categorize(chunk, matcher, cache)
+            totals["rows"] += len(ledger)
+            totals["unmatched"] += int(unmatched.sum())
+            unmatched_parts.append(
+                ledger[unmatched].groupby('Merchant', sort=False)['Amount'].agg(Transactions="size", Amount="sum")
+            )
+            yield ledger
+
+    write_table_chunks(ledger_chunks(), output_file, LEDGER_SCHEMA)
+    check_issues(issues, input_file)
+
+    report = (
+        pd.concat(unmatched_parts).groupby(level=0).sum() if unmatched_parts
+        else pd.DataFrame(columns=["Transactions", "Amount"])
+    )
+    report = report.sort_values(['Transactions', 'Amount'], ascending=False).rename_axis("Merchant").reset_index()
+    write_table(report, unmatched_file or FILE_PATHS['UNCATEGORIZED_OUTPUT'], schema=None)
+
+    matched = totals["rows"] - totals["unmatched"]
+    print(
+        f"Categorized {matched} of {totals['rows']} transactions ({len(cache)} distinct descriptions, "
+        f"{len(matcher['rules'])} rules) in {time.perf_counter() - start:.2f}s"
+    )
+    if len(report):
+        print(f"{len(report)} merchants matched no rule; the most frequent:")
+        for row in report.head(CATEGORIZE_CONSTANTS['UNMATCHED_REPORT']).itertuples(index=False):
+            print(f"  {row.Merchant}: {row.Transactions} transactions, ${row.Amount:,.2f}")
+        print(f"Full list saved to {unmatched_file or FILE_PATHS['UNCATEGORIZED_OUTPUT']}")
+    print(f"Ledger saved to {output_file}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Categorise a bank or card export into a transaction ledger")
+    parser.add_argument("--input", default=FILE_PATHS['TRANSACTIONS_INPUT'], help="Bank or card CSV export")
+    parser.add_argument("--output", default=FILE_PATHS['LEDGER'], help="Ledger file")
+    parser.add_argument("--rules", default=FILE_PATHS['CATEGORY_RULES'], help="Categorisation rules JSON")
+    parser.add_argument("--unmatched", default=FILE_PATHS['UNCATEGORIZED_OUTPUT'], help="Unmatched merchant report")
+    parser.add_argument("--date-column", default=None, help="Export column with the transaction date")
+    parser.add_argument("--description-column", default=None, help="Export column with the description")
+    parser.add_argument("--amount-column", default=None, help="Export column with the signed amount")
+    parser.add_argument("--date-format", default=None, help="Date format of the export, e.g. %%Y-%%m-%%d")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Rows read and categorised at a time")
+    args, _ = parser.parse_known_args()
+    if not os.path.exists(args.input):
+        print(f"Transactions file {args.input} not found.")
+        sys.exit(1)
+
+    columns = {
+        column: name for column, name in
+        [("Date", args.date_column), ("Description", args.description_column), ("Amount", args.amount_column)] if name
+    }
+    categorize_transactions(
+        args.input, args.output, args.rules, args.unmatched, columns, args.date_format, args.chunk_size
+    )
@@ -1,110 +1,214 @@
-import csv
+import argparse, csv, itertools, re
 import os, sys
+import numpy as np
+import pandas as pd
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 from helpers.utils.constants import CONVERSION_CONSTANTS, FILE_PATHS
-from helpers.utils.helpers import clean_numeric
+from helpers.utils.storage import apply_schema, write_table_chunks
 
-def convert_fidelity(input_file, output_file):
+NUMERIC_COLUMNS = ["Quantity", "Last Price", "Current Value", "Total Gain/Loss Dollar", "Cost Basis Total"]
+
+def normalize_header(name):
+    """Header key that ignores case, spacing and a leading byte-order mark."""
+    return " ".join(str(name).replace("\ufeff", "").split()).lower()
+
+def resolve_columns(header, columns, optional=()):
+    """
+    Match the expected column names against a file's header row.
+
+    Args:
+        header (list): Column names as they appear in the file.
+        columns (list): Expected column names.
+        optional (list): Column names to use when present.
+
+    Returns:
+        dict: File column name to expected column name.
+
+    Raises:
+        ValueError: If an expected column is missing from the header.
+    """
+    found = {normalize_header(name): name for name in header}
+    missing = [column for column in columns if normalize_header(column) not in found]
+    if missing:
+        raise ValueError(f"Missing columns in export: {', '.join(missing)}")
+    wanted = [column for column in [*columns, *optional] if normalize_header(column) in found]
+    return {found[normalize_header(column)]: column for column in wanted}
+
+def read_header(input_file, skip_rows=0):
+    """
+    Read the column names of a CSV export: its first non-blank line.
+
+    Args:
+        input_file (str): Path to the CSV export.
+        skip_rows (int): Lines to skip first, such as a title line above the header.
+
+    Returns:
+        list: Column names, or an empty list for an empty file.
+    """
+    with open(input_file, "r", encoding="utf-8-sig", newline="") as infile:
+        rows = itertools.islice(csv.reader(infile), skip_rows, None)
+        return next((row for row in rows if any(field.strip() for field in row)), [])
+
+def read_chunks(input_file, columns, chunk_size=None, optional=(), skip_rows=0):
+    """
+    Stream a CSV export as DataFrames of string columns, renamed to the expected names.
+
+    The header is the first non-blank line and is resolved once; rows with too many fields
+    are skipped and short rows (such as the disclaimer lines at the end of Fidelity exports)
+    come through as missing values.
+
+    Args:
+        input_file (str): Path to the CSV export.
+        columns (list): Expected column names (see `resolve_columns`).
+        chunk_size (int, optional): Rows per chunk. Defaults to CONVERSION_CONSTANTS['CHUNK_SIZE'].
+        optional (list): Column names to include when present; missing ones are filled with NaN.
+        skip_rows (int): Lines before the header row, such as a title line.
+
+    Yields:
+        pd.DataFrame: The next chunk with the expected and optional columns.
+    """
+    chunk_size = chunk_size or CONVERSION_CONSTANTS['CHUNK_SIZE']
+    mapping = resolve_columns(read_header(input_file, skip_rows), columns, optional)
+
+    reader = pd.read_csv(
+        input_file, encoding="utf-8-sig", usecols=list(mapping), dtype=str, chunksize=chunk_size,
+        index_col=False, on_bad_lines="skip", skip_blank_lines=True, skiprows=skip_rows
+    )
+    for chunk in reader:
+        yield chunk.rename(columns=mapping).reindex(columns=[*columns, *optional])
+
+def clean_text(values, lower=False):
+    """Strip (and optionally lower-case) text, transforming each distinct value once."""
+    codes, uniques = pd.factorize(values.fillna(""))
+    cleaned = pd.Series(uniques, dtype=object).str.strip()
+    cleaned = cleaned.str.lower() if lower else cleaned
+    return pd.Series(cleaned.to_numpy()[codes], index=values.index)
+
+def contains_any(values, keywords):
+    """Rows whose text contains any of the keywords."""
+    pattern = "|".join(re.escape(keyword) for keyword in keywords)
+    return values.str.contains(pattern, regex=True, na=False)
+
+def convert_chunk(chunk):
+    """
+    Convert one chunk of a Fidelity positions export with column operations.
+
+    Args:
+        chunk (pd.DataFrame): Raw string columns from `read_chunks`.
+
+    Returns:
+        tuple: (holdings in the portfolio format, cash rows with Account Number, Ticker and Value,
+                pending activity rows with Account Number and Value)
+    """
+    # Disclaimer lines only fill the first column
+    chunk = chunk[chunk['Account Name'].notna()]
+    numbers = apply_schema(chunk[NUMERIC_COLUMNS], {column: "float64" for column in NUMERIC_COLUMNS}).fillna(0.0)
+    account_id = clean_text(chunk['Account Number'])
+    account_name = clean_text(chunk['Account Name'], lower=True)
+    ticker = clean_text(chunk['Symbol'])
+    description = clean_text(chunk['Description'])
+
+    # Determine Type and Liquidity
+    is_401k = account_name.str.contains("401k", regex=False)
+    is_hsa = ~is_401k & account_name.str.contains("hsa", regex=False)
+    is_flat = is_401k | is_hsa
+    is_pending = ~is_flat & contains_any(ticker, CONVERSION_CONSTANTS['KEYWORDS']['PENDING_ACTIVITY'])
+    is_cash = ~is_flat & ~is_pending & contains_any(description, CONVERSION_CONSTANTS['KEYWORDS']['MONEY_MARKET'])
+    is_holding = ~is_pending & ~is_cash
+    asset_type = np.select([is_401k, is_hsa], ["401k", "hsa"], "stock")
+    liquidity = np.where(is_flat, "low", "medium")
+
+    # 401k/hsa balances are flat dollar amounts; stock cost basis is per share
+    quantity, value, cost_total = numbers['Quantity'], numbers['Current Value'], numbers['Cost Basis Total']
+    with np.errstate(divide="ignore", invalid="ignore"):
+        unit_cost = np.where(quantity != 0, cost_total / quantity, 0.0)
+        percent_gain_loss = np.where(cost_total > 0, numbers['Total Gain/Loss Dollar'] / cost_total * 100, 0.0)
+
+    holdings = pd.DataFrame({
+        "Ticker": ticker.where(~is_401k, description),
+        "Type": asset_type,
+        "Quantity": np.where(is_flat, value, quantity),
+        "Cost Basis": np.where(is_flat, cost_total, unit_cost),
+        "Purchase Date": None,
+        "Liquidity": liquidity,
+        "Current Price": np.where(is_flat, 1.0, numbers['Last Price']),
+        "Value": value,
+        "Gain/Loss": numbers['Total Gain/Loss Dollar'],
+        "% Gain/Loss": percent_gain_loss,
+        "Long-Term Hold": "No Date",
+        "Price As Of": None,
+    })[is_holding.to_numpy()]
+
+    cash = pd.DataFrame({"Account Number": account_id, "Ticker": ticker, "Value": value})[is_cash]
+    pending = pd.DataFrame({"Account Number": account_id, "Value": value})[is_pending]
+    return holdings[CONVERSION_CONSTANTS['OUTPUT_HEADERS']], cash, pending
+
+def convert_positions(chunks, totals):
+    """
+    Convert a stream of export chunks, yielding holdings as they are converted.
+
+    Cash and pending activity are small per-account totals, so they are accumulated
+    while streaming and yielded as one final chunk of merged cash rows.
+
+    Args:
+        chunks (iterable): Raw chunks from `read_chunks`.
+        totals (dict): Updated with the number of rows read.
+
+    Yields:
+        pd.DataFrame: Portfolio rows.
+    """
+    cash_parts, pending_parts = [], []
+    for chunk in chunks:
+        totals["rows"] += len(chunk)
+        holdings, cash, pending = convert_chunk(chunk)
+        cash_parts.append(cash)
+        pending_parts.append(pending)
+        yield holdings
+
+    # Merge multiple cash rows per account and adjust them for pending activity
+    cash = pd.concat(cash_parts, ignore_index=True) if cash_parts else pd.DataFrame(columns=["Account Number", "Ticker", "Value"])
+    pending = pd.concat(pending_parts, ignore_index=True) if pending_parts else pd.DataFrame(columns=["Account Number", "Value"])
+    balances = cash.groupby("Account Number", sort=False).agg(Ticker=("Ticker", "first"), Value=("Value", "sum"))
+    balances["Value"] += pending.groupby("Account Number")["Value"].sum().reindex(balances.index, fill_value=0.0)
+
+    yield pd.DataFrame({
+        "Ticker": balances["Ticker"].to_numpy(),
+        "Type": "cash",
+        "Quantity": balances["Value"].to_numpy(),
+        "Cost Basis": balances["Value"].to_numpy(),
+        "Purchase Date": None,
+        "Liquidity": "high",
+        "Current Price": 1.0,
+        "Value": balances["Value"].to_numpy(),
+        "Gain/Loss": 0.0,
+        "% Gain/Loss": 0.0,
+        "Long-Term Hold": "No Date",
+        "Price As Of": None,
+    }, columns=CONVERSION_CONSTANTS['OUTPUT_HEADERS'])
+
+def convert_fidelity(input_file, output_file, chunk_size=None):
     """
     Converts Fidelity CSV data to the required portfolio format.
 
+    The export is streamed in chunks and written as it is converted, so memory use does
+    not grow with the size of the export.
+
     Args:
         input_file (str): Path to the input Fidelity CSV file.
-        output_file (str): Path to save the converted portfolio CSV.
+        output_file (str): Path to save the converted portfolio. The extension selects the format.
+        chunk_size (int, optional): Rows per chunk. Defaults to CONVERSION_CONSTANTS['CHUNK_SIZE'].
     """
-    # Store cash adjustments for pending activity
-    pending_activity_adjustments = {}
-    cash_balances = {}  # To merge multiple cash rows
-    portfolio_rows = []
-
-    with open(input_file, "r") as infile:
-        reader = csv.reader(infile)
-        next(reader)  # Skip the header
-
-        for row in reader:
-            if len(row) < 15:  # Ensure there are enough columns
-                continue
-
-            ticker = row[2].strip()  # Column C: Symbol (Ticker)
-            description = row[3].strip()  # Column D: Description
-            quantity = clean_numeric(row[4])  # Column E: Quantity
-            last_price = clean_numeric(row[5])  # Column F: Last Price
-            current_value = clean_numeric(row[7])  # Column H: Current Value
-            gain_loss = clean_numeric(row[10])  # Column K: Total Gain/Loss Dollar
-            percent_gain_loss = row[11] or "0%"  # Column L: Total Gain/Loss Percent
-            cost_basis = clean_numeric(row[13])  # Column N: Cost Basis Total
-            account_name = row[1].strip().lower()  # Column B: Account Name
-            account_id = row[0].strip()  # Column A: Account Number
-
-            # Determine Type, Ticker, and Liquidity
-            if "401k" in account_name:
-                asset_type = "401k"
-                ticker = description  # Use Description as the ticker for 401K
-                liquidity = "low"
-            elif "hsa" in account_name:
-                asset_type = "hsa"
-                ticker = ticker  # Use Symbol as the ticker for HSA
-                liquidity = "low"
-            elif any(keyword in ticker for keyword in CONVERSION_CONSTANTS['KEYWORDS']['PENDING_ACTIVITY']):
-                # Store pending activity adjustments for cash
-                pending_activity_adjustments[account_id] = pending_activity_adjustments.get(account_id, 0) + current_value
-                continue  # Skip this row for now
-            elif any(keyword in description for keyword in CONVERSION_CONSTANTS['KEYWORDS']['MONEY_MARKET']):
-                asset_type = "cash"
-                liquidity = "high"
-            else:
-                asset_type = "stock"
-                liquidity = "medium"
-
-            # Calculate Long-Term Hold (default to "No Date")
-            long_term_hold = "No Date"
-
-            # Aggregate cash balances if it's a cash row
-            if asset_type == "cash":
-                if account_id not in cash_balances:
-                    cash_balances[account_id] = {
-                        "ticker": ticker,
-                        "asset_type": asset_type,
-                        "quantity": 0,
-                        "cost_basis": 0,
-                        "liquidity": liquidity,
-                        "current_value": 0,
-                        "gain_loss": 0,
-                        "percent_gain_loss": "0%",
-                        "long_term_hold": long_term_hold
-                    }
-                cash_balances[account_id]["current_value"] += current_value
-                continue
-
-            # Add the processed row
-            portfolio_rows.append([
-                ticker, asset_type, quantity, cost_basis, None, liquidity,
-                last_price, current_value, gain_loss, percent_gain_loss, long_term_hold
-            ])
-
-    # Adjust cash balances for pending activity
-    for account_id, adjustment in pending_activity_adjustments.items():
-        if account_id in cash_balances:
-            cash_balances[account_id]["current_value"] += adjustment
-
-    # Merge cash rows into portfolio_rows
-    for cash_row in cash_balances.values():
-        portfolio_rows.append([
-            cash_row["ticker"], cash_row["asset_type"], cash_row["quantity"],
-            cash_row["cost_basis"], None, cash_row["liquidity"],
-            1, cash_row["current_value"], cash_row["gain_loss"],
-            cash_row["percent_gain_loss"], cash_row["long_term_hold"]
-        ])
-
-    # Write the output
-    with open(output_file, "w", newline="") as outfile:
-        writer = csv.writer(outfile)
-        writer.writerow(CONVERSION_CONSTANTS['OUTPUT_HEADERS'])
-        writer.writerows(portfolio_rows)
+    totals = {"rows": 0}
+    chunks = read_chunks(input_file, CONVERSION_CONSTANTS['FIDELITY_COLUMNS'], chunk_size)
+    written = write_table_chunks(convert_positions(chunks, totals), output_file)
 
+    print(f"Converted {totals['rows']} rows into {written} portfolio rows")
     print(f"Converted data saved to {output_file}")
 
 if __name__ == "__main__":
-    input_file = FILE_PATHS['FIDELITY_INPUT']
-    output_file = FILE_PATHS['FIDELITY_OUTPUT']
-    convert_fidelity(input_file, output_file)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Convert a Fidelity positions export to the portfolio format")
+    parser.add_argument("--input", default=FILE_PATHS['FIDELITY_INPUT'], help="Fidelity positions CSV")
+    parser.add_argument("--output", default=FILE_PATHS['FIDELITY_OUTPUT'], help="Converted portfolio file")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Rows read and converted at a time")
+    args, _ = parser.parse_known_args()
+    convert_fidelity(args.input, args.output, args.chunk_size)
@@ -0,0 +1,194 @@
+import argparse, os, sys
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from calculate.calculate_lots import is_long_term, match_lots
+from helpers.conversions.convert_fidelity import clean_text, contains_any, read_chunks
+from helpers.utils.constants import CONVERSION_CONSTANTS, FILE_PATHS
+from helpers.utils.storage import apply_schema, write_table
+
+NUMERIC_COLUMNS = ["Quantity", "Amount ($)", "Price ($)"]
+# Transactions that add shares; everything else removes them
+ACQUISITIONS = ["buy", "reinvest", "transfer_in"]
+
+def classify_chunk(chunk):
+    """
+    Turn one chunk of an activity export into share events.
+
+    Args:
+        chunk (pd.DataFrame): Raw string columns from `read_chunks`.
+
+    Returns:
+        tuple: (events with Account, Ticker, Date, Kind, Quantity and Amount,
+                count of skipped rows that moved shares)
+    """
+    numbers = apply_schema(chunk[NUMERIC_COLUMNS], {column: "float64" for column in NUMERIC_COLUMNS})
+    date = pd.to_datetime(chunk['Run Date'].str.strip(), format="%m/%d/%Y", errors="coerce")
+    action = clean_text(chunk['Action']).str.upper()
+    description = clean_text(chunk['Description']).str.upper()
+    account = clean_text(chunk['Account Number'].fillna(chunk['Account']))
+
+    # Symbols missing from the Symbol column usually appear in the action, e.g. "YOU BOUGHT APPLE INC (AAPL)"
+    ticker = clean_text(chunk['Symbol']).str.upper()
+    ticker = ticker.where(ticker != "", action.str.extract(r"\(([A-Z0-9.\-]+)\)", expand=False).fillna(""))
+
+    # The first matching keyword list decides the kind
+    actions = CONVERSION_CONSTANTS['ACTIVITY_ACTIONS']
+    kind = np.select([contains_any(action, keywords) for keywords in actions.values()], list(actions), "")
+    quantity = numbers['Quantity'].fillna(0.0)
+    kind = np.where(kind == "transfer", np.where(quantity > 0, "transfer_in", "transfer_out"), kind)
+
+    money_market = CONVERSION_CONSTANTS['KEYWORDS']['MONEY_MARKET_FUNDS']
+    is_cash = contains_any(action, money_market) | contains_any(description, money_market)
+    moves_shares = date.notna() & (ticker != "") & (quantity != 0) & ~is_cash
+    replayed = moves_shares & (kind != "")
+
+    # Cost of acquisitions and proceeds of sales; transfers carry no amount, so fall back to price
+    amount = numbers['Amount ($)'].abs().fillna(0.0)
+    amount = amount.where(amount > 0, (numbers['Price ($)'] * quantity).abs().fillna(0.0))
+
+    events = pd.DataFrame({
+        "Account": account,
+        "Ticker": ticker,
+        "Date": date,
+        "Kind": kind,
+        "Quantity": quantity.abs(),
+        "Amount": amount,
+    })[replayed.to_numpy()]
+    return events, int((moves_shares & (kind == "")).sum())
+
+def replay_lots(events, method="fifo"):
+    """
+    Replay share events per account and ticker into open lots and realized gains.
+
+    Events are sorted by date (acquisitions before disposals on the same day). Lots are
+    consumed first in, first out, which Fidelity uses unless another method is chosen per
+    trade. Because FIFO consumes lots in purchase order, matching every disposal against
+    every lot of its group at once gives the same result as a day-by-day replay, as long as
+    no disposal exceeds the shares held at that time. Shares sold before any recorded
+    acquisition (history that starts mid-position) are dropped first with a running floor.
+
+    Args:
+        events (pd.DataFrame): Output of `classify_chunk`, possibly concatenated across chunks.
+        method (str): Only "fifo" can be replayed from an activity history.
+
+    Returns:
+        tuple: (open lots with Account, Ticker, Quantity, Cost Basis per share and Purchase Date,
+                realized sales with Account, Ticker, Date, Quantity, Proceeds, Cost and Gain,
+                shares disposed of without a matching acquisition per account and ticker)
+    """
+    if method != "fifo":
+        raise ValueError("Activity histories can only be replayed first in, first out.")
+
+    is_acquisition = events['Kind'].isin(ACQUISITIONS)
+    events = events.assign(Disposal=~is_acquisition).sort_values(
+        ['Account', 'Ticker', 'Date', 'Disposal'], kind="stable", ignore_index=True
+    )
+    is_disposal = events['Disposal'].to_numpy()
+    quantity = events['Quantity'].to_numpy(dtype=float)
+    group = events.groupby(['Account', 'Ticker'], sort=False).ngroup().to_numpy()
+
+    # Running position with a floor at zero: x = S - min(0, running min of S)
+    position = pd.Series(np.where(is_disposal, -quantity, quantity)).groupby(group).cumsum()
+    floor = position.groupby(group).cummin().clip(upper=0)
+    unmatched = (floor.groupby(group).shift(fill_value=0.0) - floor).to_numpy()
+    matched_quantity = np.where(is_disposal, quantity - unmatched, 0.0)
+
+    lots = events[~is_disposal].reset_index(drop=True)
+    lot_quantity = lots['Quantity'].to_numpy(dtype=float)
+    sales = events[is_disposal].assign(Matched=matched_quantity[is_disposal]).reset_index(drop=True)
+    sale_price = (sales['Amount'] / sales['Quantity']).to_numpy()
+
+    lot_index, sale_index, shares = match_lots(
+        group[~is_disposal], np.arange(len(lots)), lot_quantity,
+        group[is_disposal], sales['Matched'].to_numpy(dtype=float)
+    )
+    remaining = lot_quantity - np.bincount(lot_index, weights=shares, minlength=len(lots))
+
+    unit_cost = np.where(lot_quantity > 0, lots['Amount'] / lot_quantity, 0.0)
+    open_lots = lots.assign(**{'Cost Basis': unit_cost, 'Quantity': remaining})
+    open_lots = open_lots[open_lots['Quantity'] > 1e-9]
+
+    # Realized gains only for sales; transfers out move lots without a taxable event
+    sold = sales['Kind'].to_numpy()[sale_index] == "sell"
+    lot_dates = lots['Date'].to_numpy(dtype="datetime64[D]")[lot_index]
+    sale_dates = sales['Date'].to_numpy(dtype="datetime64[D]")[sale_index]
+    realized = pd.DataFrame({
+        "Account": sales['Account'].to_numpy()[sale_index],
+        "Ticker": sales['Ticker'].to_numpy()[sale_index],
+        "Date": sale_dates,
+        "Purchase Date": lot_dates,
+        "Quantity": shares,
+        "Proceeds": shares * sale_price[sale_index],
+        "Cost": shares * unit_cost[lot_index],
+        "Long-Term": is_long_term(lot_dates, sale_dates),
+    })[sold]
+    realized['Gain'] = realized['Proceeds'] - realized['Cost']
+
+    shortfall = pd.Series(unmatched, index=pd.MultiIndex.from_frame(events[['Account', 'Ticker']]))
+    shortfall = shortfall[shortfall > 1e-9].groupby(level=[0, 1]).sum()
+    return open_lots, realized.reset_index(drop=True), shortfall
+
+def convert_fidelity_activity(input_file, output_file, chunk_size=None):
+    """
+    Rebuild tax lots with purchase dates from a Fidelity "Activity & Orders" export.
+
+    The export is streamed in chunks, and only the share events are kept. Buys,
+    reinvestments and transfers in open lots; sales and transfers out close them FIFO.
+    Open lots are saved in the portfolio format with an extra Account column.
+
+    Args:
+        input_file (str): Path to the activity CSV. Several years or accounts can be concatenated.
+        output_file (str): Path to save the lots. The extension selects the format.
+        chunk_size (int, optional): Rows per chunk. Defaults to CONVERSION_CONSTANTS['CHUNK_SIZE'].
+    """
+    chunks = read_chunks(
+        input_file, CONVERSION_CONSTANTS['FIDELITY_ACTIVITY_COLUMNS'], chunk_size,
+        optional=CONVERSION_CONSTANTS['FIDELITY_ACTIVITY_OPTIONAL_COLUMNS']
+    )
+    parts, rows, skipped = [], 0, 0
+    for chunk in chunks:
+        events, ignored = classify_chunk(chunk)
+        parts.append(events)
+        rows += len(chunk)
+        skipped += ignored
+
+    events = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame({
+        "Account": [], "Ticker": [], "Date": pd.to_datetime([]), "Kind": [], "Quantity": [], "Amount": []
+    })
+    if skipped:
+        print(f"Ignored {skipped} rows that moved shares with an unrecognized action (e.g. splits or spin-offs).")
+    unknown_cost = events['Kind'].eq("transfer_in") & events['Amount'].eq(0)
+    if unknown_cost.any():
+        print(f"{int(unknown_cost.sum())} transfers in have no price; their lots have a cost basis of 0.")
+
+    open_lots, realized, shortfall = replay_lots(events)
+    if not shortfall.empty:
+        print(f"{len(shortfall)} positions sold more shares than the history acquired; it may start mid-position.")
+        for (account, ticker), shares in shortfall.head(10).items():
+            print(f"  {account} {ticker}: {shares:,.4f} shares without a recorded acquisition")
+
+    lots = pd.DataFrame({
+        "Ticker": open_lots['Ticker'],
+        "Type": "stock",
+        "Quantity": open_lots['Quantity'],
+        "Cost Basis": open_lots['Cost Basis'],
+        "Purchase Date": open_lots['Date'].dt.strftime("%Y-%m-%d"),
+        "Liquidity": "medium",
+        "Account": open_lots['Account'],
+    })
+    write_table(lots, output_file)
+
+    long_term = realized.loc[realized['Long-Term'], 'Gain'].sum()
+    print(f"Replayed {len(events)} of {rows} rows into {len(lots)} open lots across {lots['Account'].nunique()} accounts")
+    print(f"Realized gains: ${realized['Gain'].sum():,.2f} "
+          f"(long-term ${long_term:,.2f}, short-term ${realized['Gain'].sum() - long_term:,.2f})")
+    print(f"Lots saved to {output_file}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild tax lots from a Fidelity activity export")
+    parser.add_argument("--input", default=FILE_PATHS['FIDELITY_ACTIVITY_INPUT'], help="Fidelity activity CSV")
+    parser.add_argument("--output", default=FILE_PATHS['FIDELITY_ACTIVITY_OUTPUT'], help="Lots file in the portfolio format")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Rows read and converted at a time")
+    args, _ = parser.parse_known_args()
+    convert_fidelity_activity(args.input, args.output, args.chunk_size)
@@ -1,28 +1,145 @@
-import os, sys
+import argparse, os, sys
+import numpy as np
 import pandas as pd
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 from helpers.utils.constants import FILE_PATHS
+from helpers.utils.schema import as_text, get_schema
+from helpers.utils.storage import iter_table_chunks, read_table, write_table
 
-def merge_portfolios(file1, file2, output_file):
+# Cash and 401k/hsa rows carry a total cost basis; every other type is per unit
+FLAT_TYPES = ["cash", "401k", "hsa"]
+# Per-group totals that combine across chunks by summing
+SUMMED = ["Quantity", "Cost Total", "Value", "Gain/Loss", "Unvalued"]
+# Text columns, kept as empty strings while aggregating so they stay comparable across chunks
+TEXT_COLUMNS = ["Liquidity", "Long-Term Hold"]
+# Dates are aggregated as datetimes; max skips missing dates
+DATE_COLUMNS = ["Purchase Date", "Price As Of"]
+
+def _partial_aggregate(portfolio, source, keys):
+    """
+    Aggregate one portfolio (or a chunk of one) by `keys`.
+
+    Args:
+        portfolio (pd.DataFrame): Rows in the portfolio format.
+        source (str): Name recorded in the Accounts column when the rows have no Account.
+        keys (list): Columns to group by.
+
+    Returns:
+        tuple: (partial totals per group, distinct (keys, Account) pairs)
     """
-    Merges two portfolio files into a single portfolio file.
+    portfolio = portfolio[portfolio['Ticker'].notna()].copy()
+    portfolio['Ticker'] = portfolio['Ticker'].astype(str).str.strip().str.upper()
+    portfolio['Type'] = as_text(portfolio['Type'])
+    for column in ['Purchase Date', 'Liquidity', 'Current Price', 'Value', 'Gain/Loss', 'Long-Term Hold', 'Price As Of']:
+        if column not in portfolio:
+            portfolio[column] = np.nan
+    for column in TEXT_COLUMNS:
+        portfolio[column] = as_text(portfolio[column])
+    for column in DATE_COLUMNS:
+        portfolio[column] = pd.to_datetime(portfolio[column])
+    portfolio['Unvalued'] = portfolio['Value'].isna().astype(int)
+    account = portfolio['Account'].astype(str) if 'Account' in portfolio else pd.Series(source, index=portfolio.index)
+    portfolio['Account'] = account.where(account.str.len() > 0, source)
+
+    is_flat = portfolio['Type'].isin(FLAT_TYPES)
+    cost_basis = portfolio['Cost Basis'].fillna(0.0)
+    portfolio['Cost Total'] = np.where(is_flat, cost_basis, cost_basis * portfolio['Quantity'])
+
+    grouped = portfolio.groupby(keys, sort=False, dropna=False)
+    totals = grouped[SUMMED].sum(min_count=1).join(grouped.agg(**{
+        'Latest Purchase Date': ('Purchase Date', 'max'),
+        'Liquidity': ('Liquidity', 'max'),
+        'Current Price': ('Current Price', 'max'),
+        'Hold Min': ('Long-Term Hold', 'min'),
+        'Hold Max': ('Long-Term Hold', 'max'),
+        'Price As Of': ('Price As Of', 'max'),
+    }))
+    accounts = portfolio[keys + ['Account']].drop_duplicates()
+    return totals, accounts
+
+def _combine(partials, keys):
+    """Combine partial totals into one row per group with the portfolio columns."""
+    totals = pd.concat([totals for totals, _ in partials])
+    grouped = totals.groupby(level=list(range(len(keys))), sort=False, dropna=False)
+    merged = grouped[SUMMED].sum(min_count=1).join(grouped.agg(**{
+        'Latest Purchase Date': ('Latest Purchase Date', 'max'),
+        'Liquidity': ('Liquidity', 'max'),
+        'Current Price': ('Current Price', 'max'),
+        'Hold Min': ('Hold Min', 'min'),
+        'Hold Max': ('Hold Max', 'max'),
+        'Price As Of': ('Price As Of', 'max'),
+    })).reset_index()
+
+    accounts = pd.concat([accounts for _, accounts in partials]).drop_duplicates()
+    accounts = accounts.sort_values('Account').groupby(keys, sort=False, dropna=False)['Account'].agg("; ".join)
+    merged['Accounts'] = accounts.reindex(pd.MultiIndex.from_frame(merged[keys])).to_numpy()
+
+    # Per-unit cost is the quantity-weighted average; flat types keep the total
+    is_flat = merged['Type'].isin(FLAT_TYPES)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        unit_cost = np.where(merged['Quantity'] > 0, merged['Cost Total'] / merged['Quantity'], 0.0)
+        cost = merged['Value'] - merged['Gain/Loss']
+        percent = np.where(cost > 0, merged['Gain/Loss'] / cost * 100, np.nan)
+    merged['Cost Basis'] = np.where(is_flat, merged['Cost Total'], unit_cost)
+    merged['% Gain/Loss'] = percent
+    merged['Purchase Date'] = merged['Latest Purchase Date']
+    merged['Long-Term Hold'] = merged['Hold Min'].where(merged['Hold Min'] == merged['Hold Max'], "Mixed")
+
+    # Totals are only meaningful when every merged row was already calculated
+    unvalued = merged['Unvalued'] > 0
+    merged.loc[unvalued, ['Value', 'Gain/Loss', '% Gain/Loss']] = np.nan
+    merged.loc[unvalued, 'Long-Term Hold'] = ''
+    merged.loc[unvalued, 'Price As Of'] = pd.NaT
+    for column in TEXT_COLUMNS:
+        merged[column] = merged[column].mask(merged[column] == '')
+
+    columns = [
+        "Ticker", "Type", "Quantity", "Cost Basis", "Purchase Date", "Liquidity", "Current Price",
+        "Value", "Gain/Loss", "% Gain/Loss", "Long-Term Hold", "Price As Of", "Accounts"
+    ]
+    return merged[columns]
+
+def merge_portfolios(input_files, output_file, keep_lots=False, chunk_size=None):
+    """
+    Merges any number of portfolio files into one de-duplicated portfolio.
+
+    Rows are aggregated by (Ticker, Type): quantities, values and gains are summed, cost basis
+    is quantity-weighted for per-unit types and summed for cash and 401k/hsa, and the latest
+    purchase date is kept so a position is only long-term if all of its lots are. An Accounts
+    column lists the accounts (or source files) each row came from. Value and gain columns are
+    left empty for rows that merge uncalculated input; run calculate_portfolio.py on the result.
 
     Args:
-        file1 (str): Path to the first portfolio CSV file.
-        file2 (str): Path to the second portfolio CSV file.
-        output_file (str): Path to save the merged portfolio CSV file.
+        input_files (list): Paths to the portfolio files (CSV, Parquet or Feather).
+        output_file (str): Path to save the merged portfolio file. The extension selects the format.
+        keep_lots (bool): Also group by Purchase Date, so lots bought on different days stay separate.
+        chunk_size (int, optional): Read inputs this many rows at a time and combine partial totals,
+                                    for inputs larger than memory. Reads whole files when None.
     """
-    # Load the two portfolios
-    portfolio1 = pd.read_csv(file1)
-    portfolio2 = pd.read_csv(file2)
+    keys = ['Ticker', 'Type', 'Purchase Date'] if keep_lots else ['Ticker', 'Type']
+    partials, rows = [], 0
+    for input_file in input_files:
+        source = os.path.splitext(os.path.basename(input_file))[0]
+        schema = get_schema(input_file)
+        chunks = iter_table_chunks(input_file, chunk_size, schema) if chunk_size else [read_table(input_file, schema)]
+        for chunk in chunks:
+            rows += len(chunk)
+            partials.append(_partial_aggregate(chunk, source, keys))
 
-    # Merge the portfolios
-    merged_portfolio = pd.concat([portfolio1, portfolio2], ignore_index=True)
+    merged = _combine(partials, keys)
 
     # Save the merged portfolio to the output file
-    merged_portfolio.to_csv(output_file, index=False)
+    write_table(merged, output_file)
+    print(f"Merged {rows} rows from {len(input_files)} files into {len(merged)} rows")
     print(f"Merged portfolio saved to {output_file}")
 
 
 if __name__ == "__main__":
-    merge_portfolios(FILE_PATHS['FIDELITY_OUTPUT'], FILE_PATHS['CRYPTO'], FILE_PATHS['PORTFOLIO_OUTPUT'])
+    parser = argparse.ArgumentParser(description="Merge portfolio files into one de-duplicated portfolio")
+    parser.add_argument("--inputs", nargs="+", default=[FILE_PATHS['FIDELITY_OUTPUT'], FILE_PATHS['CRYPTO']],
+                        help="Portfolio files to merge")
+    parser.add_argument("--output", default=FILE_PATHS['PORTFOLIO_OUTPUT'], help="Merged portfolio file")
+    parser.add_argument("--keep-lots", action="store_true", help="Keep lots with different purchase dates separate")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Stream inputs in chunks of this many rows")
+    args, _ = parser.parse_known_args()
+    merge_portfolios(args.inputs, args.output, keep_lots=args.keep_lots, chunk_size=args.chunk_size)
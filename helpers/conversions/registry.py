@@ -0,0 +1,409 @@
+import argparse, io, json, os, sys, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from functools import partial
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from helpers.conversions.convert_fidelity import clean_text, convert_fidelity, normalize_header, read_chunks, read_header
+from helpers.conversions.convert_fidelity_activity import convert_fidelity_activity
+from helpers.conversions.merge_portfolios import FLAT_TYPES
+from helpers.utils.constants import CONVERSION_CONSTANTS, FILE_PATHS, INGEST_CONSTANTS, STORAGE_FORMAT
+from helpers.utils.storage import FORMATS, PORTFOLIO_SCHEMA, apply_schema, get_format, iter_table_chunks, write_table_chunks
+
+# Columns a mapping can fill besides the portfolio columns
+MAPPED_COLUMNS = [*CONVERSION_CONSTANTS['OUTPUT_HEADERS'], "Account"]
+NUMERIC_COLUMNS = ["Quantity", "Cost Basis", "Current Price", "Value", "Gain/Loss"]
+# Ingested rows keep the account (or file) and the export they came from
+INGEST_SCHEMA = {**PORTFOLIO_SCHEMA, "Account": "text", "Source": "text"}
+
+CONVERTERS = {}
+
+def register_converter(name, signature, convert, skip_rows=0, description=""):
+    """
+    Add a converter to the registry.
+
+    Args:
+        name (str): Format name shown in ingestion summaries.
+        signature (list): Column names that identify the format; all must be in the header.
+        convert (callable): Called as convert(input_file, output_file, chunk_size).
+        skip_rows (int): Lines before the header row, such as a title line.
+        description (str): Short description of the format.
+    """
+    CONVERTERS[name] = {
+        "signature": list(signature),
+        "convert": convert,
+        "skip_rows": skip_rows,
+        "description": description,
+    }
+
+def read_columns(path, skip_rows=0):
+    """
+    Read the column names of a CSV, Parquet or Feather file without loading its rows.
+
+    Args:
+        path (str): Path to the file.
+        skip_rows (int): Lines before the header row (CSV only).
+
+    Returns:
+        list: Column names.
+    """
+    file_format = get_format(path)
+    if file_format == "csv":
+        return read_header(path, skip_rows)
+
+    import pyarrow as pa, pyarrow.parquet as pq
+    if file_format == "parquet":
+        return pq.read_schema(path).names
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema.names
+
+def detect_converter(path, converters=None):
+    """
+    Find the converter for a file from its header.
+
+    Every converter whose signature columns all appear in the header matches (case and
+    spacing are ignored); the one with the longest signature is the most specific and wins.
+
+    Args:
+        path (str): Path to the export.
+        converters (dict, optional): Registry to search. Defaults to `load_converters()`.
+
+    Returns:
+        str: The converter name, or None if no signature matches.
+    """
+    converters = converters if converters is not None else load_converters()
+    headers, best, best_length = {}, None, 0
+    for name, converter in converters.items():
+        skip_rows = converter['skip_rows'] if get_format(path) == "csv" else 0
+        if skip_rows not in headers:
+            try:
+                headers[skip_rows] = {normalize_header(column) for column in read_columns(path, skip_rows)}
+            except (OSError, ValueError, UnicodeDecodeError):
+                headers[skip_rows] = set()
+        signature = {normalize_header(column) for column in converter['signature']}
+        if signature <= headers[skip_rows] and len(signature) > best_length:
+            best, best_length = name, len(signature)
+    return best
+
+def convert_portfolio(input_file, output_file, chunk_size=None):
+    """
+    Copy a file that is already in the portfolio format, keeping only the portfolio columns.
+
+    Args:
+        input_file (str): Path to the portfolio (CSV, Parquet or Feather).
+        output_file (str): Path to save the copy. The extension selects the format.
+        chunk_size (int, optional): Rows per chunk. Defaults to CONVERSION_CONSTANTS['CHUNK_SIZE'].
+    """
+    chunk_size = chunk_size or CONVERSION_CONSTANTS['CHUNK_SIZE']
+    chunks = (
+        chunk.reindex(columns=MAPPED_COLUMNS if "Account" in chunk else CONVERSION_CONSTANTS['OUTPUT_HEADERS'])
+        for chunk in iter_table_chunks(input_file, chunk_size)
+    )
+    written = write_table_chunks(chunks, output_file)
+    print(f"Copied {written} portfolio rows to {output_file}")
+
+def convert_mapped_chunk(chunk, mapping):
+    """
+    Convert one chunk of a broker export described by a column mapping.
+
+    Args:
+        chunk (pd.DataFrame): Raw string columns from `read_chunks`, named as in the export.
+        mapping (dict): The converter definition (see `convert_mapped`).
+
+    Returns:
+        pd.DataFrame: Rows in the portfolio format, plus Account when it is mapped.
+    """
+    columns, defaults = mapping['columns'], mapping.get('defaults', {})
+    raw = pd.DataFrame({target: chunk[source] for target, source in columns.items()}, index=chunk.index)
+    numbers = apply_schema(
+        raw.reindex(columns=NUMERIC_COLUMNS), {column: "float64" for column in NUMERIC_COLUMNS}
+    )
+
+    ticker = clean_text(raw['Ticker'])
+    asset_type = clean_text(raw['Type']) if 'Type' in raw else pd.Series("", index=raw.index)
+    types = {key.strip().lower(): value for key, value in mapping.get('types', {}).items()}
+    asset_type = asset_type.str.lower().map(types).fillna(asset_type.str.lower() if not types else "")
+    asset_type = asset_type.where(asset_type != "", defaults.get('Type', "stock"))
+    is_flat = asset_type.isin(FLAT_TYPES).to_numpy()
+
+    # Flat types hold a dollar balance: quantity is the value and the cost basis is a total
+    quantity, value = numbers['Quantity'], numbers['Value']
+    quantity = quantity.where(~is_flat | value.isna(), value)
+    cost = numbers['Cost Basis']
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cost_total = cost if mapping.get('cost_basis', "unit") == "total" else cost * quantity
+        cost_total = cost_total.where(~is_flat | cost_total.notna(), quantity)
+        unit_cost = np.where(quantity != 0, cost_total / quantity, 0.0)
+        gain_loss = numbers['Gain/Loss'].fillna(value - cost_total)
+        percent_gain_loss = np.where(cost_total > 0, gain_loss / cost_total * 100, np.nan)
+    cost_basis = np.where(is_flat, cost_total, unit_cost)
+    cost_basis = np.where(cost.isna() & ~is_flat, np.nan, cost_basis)
+
+    purchase_date = None
+    if 'Purchase Date' in raw:
+        dates = pd.to_datetime(clean_text(raw['Purchase Date']), format=mapping.get('date_format'), errors="coerce")
+        purchase_date = dates.dt.strftime("%Y-%m-%d")
+    liquidity = (
+        clean_text(raw['Liquidity'], lower=True) if 'Liquidity' in raw
+        else asset_type.map(CONVERSION_CONSTANTS['LIQUIDITY']).fillna("medium")
+    )
+
+    portfolio = pd.DataFrame({
+        "Ticker": ticker,
+        "Type": asset_type,
+        "Quantity": quantity,
+        "Cost Basis": cost_basis,
+        "Purchase Date": purchase_date,
+        "Liquidity": liquidity.where(liquidity != "", "medium"),
+        "Current Price": np.where(is_flat, 1.0, numbers['Current Price']),
+        "Value": value,
+        "Gain/Loss": gain_loss,
+        "% Gain/Loss": percent_gain_loss,
+        "Long-Term Hold": None,
+        "Price As Of": None,
+    }, index=raw.index)
+    if 'Account' in raw:
+        portfolio['Account'] = clean_text(raw['Account'])
+    for column, default in defaults.items():
+        if column in portfolio and column != "Type":
+            portfolio[column] = portfolio[column].fillna(default)
+
+    # Totals, disclaimers and other rows without a position
+    skipped = {value.strip().upper() for value in mapping.get('skip_tickers', [])}
+    keep = (ticker != "") & ~ticker.str.upper().isin(skipped) & portfolio['Quantity'].notna()
+    return portfolio[keep.to_numpy()]
+
+def convert_mapped(mapping, input_file, output_file, chunk_size=None):
+    """
+    Convert a broker export with a column mapping instead of a dedicated converter.
+
+    A mapping is a dict (one entry of the converters JSON file) with:
+        columns: portfolio column -> export column. Ticker and Quantity are required; Type,
+                 Cost Basis, Purchase Date, Liquidity, Current Price, Value, Gain/Loss and
+                 Account are optional.
+        cost_basis: "unit" (default) or "total" when the export reports the total cost.
+        types: export type value -> portfolio type, e.g. {"Equity": "stock"}.
+        defaults: values for missing cells, e.g. {"Type": "etf", "Liquidity": "medium"}.
+        date_format: strftime format of the purchase dates, e.g. "%m/%d/%Y".
+        skip_rows: lines before the header row.
+        skip_tickers: ticker values of rows that are not positions, e.g. "Account Total".
+
+    Args:
+        mapping (dict): The converter definition.
+        input_file (str): Path to the export CSV.
+        output_file (str): Path to save the converted portfolio. The extension selects the format.
+        chunk_size (int, optional): Rows per chunk. Defaults to CONVERSION_CONSTANTS['CHUNK_SIZE'].
+    """
+    sources = list(dict.fromkeys(mapping['columns'].values()))
+    totals = {"rows": 0}
+
+    def convert_chunks():
+        for chunk in read_chunks(input_file, sources, chunk_size, skip_rows=mapping.get('skip_rows', 0)):
+            totals["rows"] += len(chunk)
+            yield convert_mapped_chunk(chunk, mapping)
+
+    written = write_table_chunks(convert_chunks(), output_file)
+    print(f"Converted {totals['rows']} rows into {written} portfolio rows")
+    print(f"Converted data saved to {output_file}")
+
+def load_mappings(mapping_file):
+    """
+    Load the column-mapping converter definitions.
+
+    Args:
+        mapping_file (str): Path to a JSON object of format name -> mapping (see `convert_mapped`).
+
+    Returns:
+        dict: The mappings, or an empty dict if the file does not exist.
+
+    Raises:
+        ValueError: If a mapping does not map Ticker and Quantity.
+    """
+    if not mapping_file or not os.path.exists(mapping_file):
+        return {}
+    with open(mapping_file, "r") as infile:
+        mappings = json.load(infile)
+
+    for name, mapping in mappings.items():
+        unknown = [column for column in mapping.get('columns', {}) if column not in MAPPED_COLUMNS]
+        missing = [column for column in ["Ticker", "Quantity"] if column not in mapping.get('columns', {})]
+        if unknown or missing:
+            raise ValueError(
+                f"Converter '{name}' in {mapping_file}: "
+                + "; ".join(filter(None, [
+                    f"unknown columns {', '.join(unknown)}" if unknown else "",
+                    f"missing columns {', '.join(missing)}" if missing else "",
+                ]))
+            )
+    return mappings
+
+def load_converters(mapping_file=None):
+    """
+    The built-in converters plus the column-mapping converters defined in `mapping_file`.
+
+    Args:
+        mapping_file (str, optional): Converters JSON file. Defaults to FILE_PATHS['CONVERTER_MAPPINGS'].
+
+    Returns:
+        dict: Converter name -> definition with signature, convert, skip_rows and description.
+    """
+    converters = dict(CONVERTERS)
+    for name, mapping in load_mappings(mapping_file or FILE_PATHS['CONVERTER_MAPPINGS']).items():
+        converters[name] = {
+            "signature": mapping.get('signature', list(mapping['columns'].values())),
+            "convert": partial(convert_mapped, mapping),
+            "skip_rows": mapping.get('skip_rows', 0),
+            "description": mapping.get('description', "Column mapping"),
+        }
+    return converters
+
+register_converter(
+    "fidelity_positions", CONVERSION_CONSTANTS['FIDELITY_COLUMNS'], convert_fidelity,
+    description="Fidelity positions export"
+)
+register_converter(
+    "fidelity_activity", CONVERSION_CONSTANTS['FIDELITY_ACTIVITY_COLUMNS'], convert_fidelity_activity,
+    description="Fidelity activity export, replayed into lots"
+)
+register_converter(
+    "portfolio", ["Ticker", "Type", "Quantity", "Cost Basis"], convert_portfolio,
+    description="Already in the portfolio format"
+)
+
+def find_exports(source):
+    """List the CSV, Parquet and Feather files in a drop folder, skipping hidden files."""
+    paths = [os.path.join(source, name) for name in sorted(os.listdir(source)) if not name.startswith(".")]
+    return [path for path in paths if os.path.isfile(path) and os.path.splitext(path)[1].lower() in FORMATS]
+
+def _ingest_one(job):
+    """
+    Convert one export in a worker process.
+
+    Args:
+        job (tuple): (input_file, converter name, staged output path, mapping_file, chunk_size)
+
+    Returns:
+        dict: Summary row for the ingestion report, including the captured log.
+    """
+    input_file, name, staged_file, mapping_file, chunk_size = job
+    start = time.perf_counter()
+    log = io.StringIO()
+    summary = {"File": os.path.basename(input_file), "Format": name}
+    try:
+        with redirect_stdout(log):
+            load_converters(mapping_file)[name]['convert'](input_file, staged_file, chunk_size)
+    except Exception as error:
+        summary["Status"] = f"Error: {type(error).__name__}: {error}"
+    else:
+        summary["Status"] = "OK"
+    summary["Seconds"] = time.perf_counter() - start
+    summary["Log"] = log.getvalue()
+    return summary
+
+def _ingested_chunks(results, staged_files, chunk_size):
+    """Stream every staged conversion with its Account and Source columns."""
+    for result, (input_file, staged_file) in zip(results, staged_files):
+        if result['Status'] != "OK":
+            continue
+        account = os.path.splitext(os.path.basename(input_file))[0]
+        for chunk in iter_table_chunks(staged_file, chunk_size, schema=INGEST_SCHEMA):
+            result['Rows'] += len(chunk)
+            accounts = chunk['Account'] if 'Account' in chunk else pd.Series(np.nan, index=chunk.index, dtype=object)
+            chunk['Account'] = accounts.where(accounts.notna() & (accounts != ""), account)
+            chunk['Source'] = result['File']
+            yield chunk.reindex(columns=[*CONVERSION_CONSTANTS['OUTPUT_HEADERS'], "Account", "Source"])
+
+def ingest_exports(source=None, output_file=None, mapping_file=None, max_workers=None, chunk_size=None):
+    """
+    Detect, convert and combine every broker export in a drop folder.
+
+    Each file is routed to a converter by its header signature, the files are converted
+    in parallel across a process pool, and the results are streamed into one file of
+    portfolio rows with an Account column (the file name when the export has none) and a
+    Source column naming the export. Unrecognized files are reported and skipped. Run
+    merge_portfolios.py on the result to de-duplicate positions held in several accounts.
+
+    Args:
+        source (str, optional): Drop folder. Defaults to FILE_PATHS['INGEST_INPUT'].
+        output_file (str, optional): Combined output. Defaults to FILE_PATHS['INGEST_OUTPUT'].
+        mapping_file (str, optional): Converters JSON file. Defaults to FILE_PATHS['CONVERTER_MAPPINGS'].
+        max_workers (int, optional): Process pool size. Defaults to INGEST_CONSTANTS['MAX_WORKERS'].
+        chunk_size (int, optional): Rows per chunk. Defaults to CONVERSION_CONSTANTS['CHUNK_SIZE'].
+
+    Returns:
+        pd.DataFrame: One summary row per file.
+    """
+    source = source or FILE_PATHS['INGEST_INPUT']
+    output_file = output_file or FILE_PATHS['INGEST_OUTPUT']
+    mapping_file = mapping_file or FILE_PATHS['CONVERTER_MAPPINGS']
+    max_workers = max_workers or INGEST_CONSTANTS['MAX_WORKERS']
+    chunk_size = chunk_size or CONVERSION_CONSTANTS['CHUNK_SIZE']
+    if not os.path.isdir(source):
+        print(f"Drop folder {source} does not exist")
+        return pd.DataFrame()
+    start = time.perf_counter()
+
+    converters = load_converters(mapping_file)
+    input_files = [path for path in find_exports(source) if os.path.abspath(path) != os.path.abspath(output_file)]
+    detected = {input_file: detect_converter(input_file, converters) for input_file in input_files}
+    unrecognized = [input_file for input_file, name in detected.items() if name is None]
+    for input_file in unrecognized:
+        print(f"{os.path.basename(input_file)}: no converter matches its header; skipped")
+    recognized = [input_file for input_file in input_files if detected[input_file]]
+    if not recognized:
+        print(f"No recognized exports found in {source}")
+        return pd.DataFrame()
+
+    output_dir = os.path.dirname(output_file) or "."
+    os.makedirs(output_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=output_dir, prefix=".ingest.") as staging:
+        staged_files = [
+            (input_file, os.path.join(staging, f"{index}.{STORAGE_FORMAT}"))
+            for index, input_file in enumerate(recognized)
+        ]
+        jobs = [
+            (input_file, detected[input_file], staged_file, mapping_file, chunk_size)
+            for input_file, staged_file in staged_files
+        ]
+        if max_workers == 1 or len(jobs) == 1:
+            results = [_ingest_one(job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(_ingest_one, jobs))
+
+        for result in results:
+            result['Rows'] = 0
+        written = write_table_chunks(_ingested_chunks(results, staged_files, chunk_size), output_file, INGEST_SCHEMA)
+
+    for result in results:
+        print(f"{result['File']} ({result['Format']}): {result['Status']}, {result['Rows']} rows in {result['Seconds']:.2f}s")
+        if result['Status'] != "OK" and result['Log'].strip():
+            print(result['Log'].rstrip())
+
+    summary = pd.DataFrame([
+        *(
+            {key: value for key, value in result.items() if key != "Log"} for result in results
+        ),
+        *({"File": os.path.basename(input_file), "Format": None, "Status": "Unrecognized", "Rows": 0}
+          for input_file in unrecognized),
+    ])
+    print(f"Ingested {written} portfolio rows from {sum(summary['Status'] == 'OK')} of {len(input_files)} files "
+          f"in {time.perf_counter() - start:.2f}s")
+    print(f"Ingested portfolio saved to {output_file}")
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert every broker export in a drop folder to the portfolio format")
+    parser.add_argument("--source", default=FILE_PATHS['INGEST_INPUT'], help="Drop folder of broker exports")
+    parser.add_argument("--output", default=FILE_PATHS['INGEST_OUTPUT'], help="Combined portfolio file")
+    parser.add_argument("--mappings", default=FILE_PATHS['CONVERTER_MAPPINGS'], help="Column-mapping converters JSON")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Rows read and converted at a time")
+    parser.add_argument("--list", action="store_true", help="List the registered formats and exit")
+    args, _ = parser.parse_known_args()
+    if args.list:
+        for name, converter in load_converters(args.mappings).items():
+            print(f"{name}: {converter['description']} ({', '.join(converter['signature'])})")
+    else:
+        ingest_exports(args.source, args.output, args.mappings, args.workers, args.chunk_size)
@@ -1,53 +1,194 @@
+from concurrent.futures import Future, ThreadPoolExecutor
 from dotenv import dotenv_values
-import requests
+import threading
+import numpy as np
+import pandas as pd
+from helpers.utils.cache import get_cached_history, get_cached_price, store_history, store_price
+from helpers.utils.constants import API_CONSTANTS, FILE_PATHS
+from helpers.utils.providers import AlphaVantageProvider, RecordReplayProvider, SyntheticProvider
 
 # Load API keys from environment file
 API_KEYS = dotenv_values("input/api_key.md")
 ALPHA_VANTAGE_API_KEY = API_KEYS.get("ALPHA_VANTAGE_API_KEY")
 
+_provider = None
+
+# Quotes currently being fetched, so concurrent callers share one request per key
+_inflight = {}
+_inflight_lock = threading.Lock()
+
 # Function Definitions
 def get_price(ticker, asset_type):
     """
-    Fetch the current price for a given asset type using Alpha Vantage API.
+    Fetch the current price for a given asset type, reading through the quote cache.
+
+    Concurrent calls for the same (ticker, asset_type) are coalesced into a single
+    provider request whose result is shared by every caller.
 
     Args:
         ticker (str): The asset ticker symbol.
         asset_type (str): The type of asset (e.g., stock, etf, crypto, etc.).
 
     Returns:
-        float: The current price of the asset, or 0 if there's an error.
+        float: The current price of the asset, or None if no quote is available.
     """
     if asset_type in ["cash", "401k", "hsa", "espp"]:
         return 1
 
-    url, params = None, None
-    if asset_type in ["stock", "etf"]:
-        url = "https://www.alphavantage.co/query"
-        params = {
-            "function": "GLOBAL_QUOTE",
-            "symbol": ticker,
-            "apikey": ALPHA_VANTAGE_API_KEY,
-        }
-    elif asset_type == "crypto":
-        url = "https://www.alphavantage.co/query"
-        params = {
-            "function": "CURRENCY_EXCHANGE_RATE",
-            "from_currency": ticker.upper(),
-            "to_currency": "USD",
-            "apikey": ALPHA_VANTAGE_API_KEY,
-        }
-    else:
+    if asset_type not in ["stock", "etf", "crypto"]:
         print(f"Unsupported asset type: {asset_type}")
         return None
 
-    response = requests.get(url, params=params)
-    data = response.json()
+    price = get_cached_price(ticker, asset_type)
+    if price is not None:
+        return price
+
+    key = (ticker, asset_type)
+    with _inflight_lock:
+        future = _inflight.get(key)
+        is_owner = future is None
+        if is_owner:
+            future = Future()
+            _inflight[key] = future
+
+    if not is_owner:
+        return future.result()
 
     try:
-        if asset_type in ["stock", "etf"]:
-            return float(data["Global Quote"]["05. price"])
-        elif asset_type == "crypto":
-            return float(data["Realtime Currency Exchange Rate"]["5. Exchange Rate"])
-    except KeyError:
-        print(f"Error fetching price for {ticker} ({asset_type}). Response: {data}")
-        return 0
\ No newline at end of file
+        price = get_provider().fetch(ticker, asset_type)
+        if price:
+            store_price(ticker, asset_type, price)
+        future.set_result(price)
+        return price
+    except BaseException as error:
+        future.set_exception(error)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+def get_prices(assets):
+    """
+    Fetch prices for many assets concurrently, within the API rate limits.
+
+    Args:
+        assets (iterable): (ticker, asset_type) pairs to price.
+
+    Returns:
+        dict: Prices keyed by (ticker, asset_type), with the same values `get_price` returns.
+    """
+    keys = list(dict.fromkeys(assets))
+    if not keys:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=API_CONSTANTS['MAX_WORKERS']) as executor:
+        prices = executor.map(lambda key: get_price(*key), keys)
+        return dict(zip(keys, prices))
+
+def get_price_history(ticker, asset_type):
+    """
+    Fetch daily closing prices for an asset, reading through the history cache.
+
+    Args:
+        ticker (str): The asset ticker symbol.
+        asset_type (str): The type of asset (stock, etf or crypto).
+
+    Returns:
+        pd.Series: Closing prices indexed by date, empty if unavailable.
+    """
+    if asset_type not in ["stock", "etf", "crypto"]:
+        return pd.Series(dtype=float)
+
+    closes = get_cached_history(ticker, asset_type)
+    if closes is not None:
+        return closes
+
+    closes = get_provider().fetch_history(ticker, asset_type)
+    store_history(ticker, asset_type, closes)
+    # Re-read so the result includes dates stored by earlier fetches
+    cached = get_cached_history(ticker, asset_type)
+    return closes if cached is None else cached
+
+def get_price_histories(assets):
+    """
+    Fetch daily closes for many assets concurrently and align them by date.
+
+    Args:
+        assets (iterable): (ticker, asset_type) pairs.
+
+    Returns:
+        pd.DataFrame: One column per (ticker, asset_type) pair, indexed by date, oldest first.
+    """
+    keys = list(dict.fromkeys(assets))
+    if not keys:
+        return pd.DataFrame()
+
+    with ThreadPoolExecutor(max_workers=API_CONSTANTS['MAX_WORKERS']) as executor:
+        histories = list(executor.map(lambda key: get_price_history(*key), keys))
+
+    closes = pd.concat(histories, axis=1, keys=pd.MultiIndex.from_tuples(keys, names=["Ticker", "Type"]))
+    closes.index = pd.to_datetime(closes.index)
+    return closes.sort_index()
+
+def get_portfolio_prices(portfolio, mask=None, prices=None):
+    """
+    Price a portfolio with one lookup per unique (Ticker, Type) and fan the results out to every row.
+
+    Args:
+        portfolio (pd.DataFrame): Portfolio with `Ticker` and `Type` columns.
+        mask (pd.Series, optional): Boolean mask of the rows to price. Defaults to every row.
+        prices (dict, optional): Prices already fetched, keyed by (ticker, asset_type) as returned
+                                 by `get_prices`. Only keys missing from it are fetched.
+
+    Returns:
+        pd.Series: Prices aligned to `portfolio.index`. Rows outside the mask,
+                   unsupported asset types and failed lookups are NaN.
+    """
+    rows = portfolio if mask is None else portfolio[mask]
+    rows = rows[['Ticker', 'Type']]
+    unique_rows = rows.drop_duplicates()
+
+    keys = list(unique_rows.itertuples(index=False, name=None))
+    known = prices or {}
+    missing = [key for key in keys if key not in known]
+    prices = {**known, **get_prices(missing)}
+    print(f"Fetched {len(missing)} unique quotes for {len(rows)} rows")
+
+    unique_rows = unique_rows.assign(
+        Price=[np.nan if prices[key] is None else prices[key] for key in keys]
+    )
+    row_prices = rows.merge(unique_rows, on=['Ticker', 'Type'], how='left')['Price']
+    row_prices.index = rows.index
+    return row_prices.reindex(portfolio.index)
+
+def get_provider():
+    """
+    Return the active price provider, building it from API_CONSTANTS['PROVIDER'] on first use.
+
+    Returns:
+        PriceProvider: The provider used by `get_price`.
+    """
+    global _provider
+    if _provider is None:
+        name = API_CONSTANTS['PROVIDER']
+        if name == "alpha_vantage":
+            _provider = AlphaVantageProvider(ALPHA_VANTAGE_API_KEY)
+        elif name in ["record", "replay"]:
+            _provider = RecordReplayProvider(
+                AlphaVantageProvider(ALPHA_VANTAGE_API_KEY), FILE_PATHS['QUOTE_RECORDINGS'], mode=name
+            )
+        elif name == "synthetic":
+            _provider = SyntheticProvider()
+        else:
+            raise ValueError(f"Unknown price provider: {name}")
+    return _provider
+
+def set_provider(provider):
+    """
+    Replace the active price provider.
+
+    Args:
+        provider (PriceProvider): The provider `get_price` should use from now on.
+    """
+    global _provider
+    _provider = provider
\ No newline at end of file
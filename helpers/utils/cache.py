@@ -0,0 +1,263 @@
+import os, sqlite3, threading, time
+import pandas as pd
+from helpers.utils.constants import CACHE_CONSTANTS, FILE_PATHS
+
+_connection = None
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+# Function Definitions
+def _get_connection():
+    """
+    Open the quote cache database, creating it on first use.
+
+    Returns:
+        sqlite3.Connection: A connection shared by every thread in the process.
+    """
+    global _connection
+    if _connection is None:
+        path = FILE_PATHS['QUOTE_CACHE']
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        _connection = sqlite3.connect(path, check_same_thread=False)
+        _connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS quotes (
+                ticker TEXT NOT NULL,
+                asset_type TEXT NOT NULL,
+                price REAL NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (ticker, asset_type)
+            )
+            """
+        )
+        _connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS price_history (
+                ticker TEXT NOT NULL,
+                asset_type TEXT NOT NULL,
+                date TEXT NOT NULL,
+                close REAL NOT NULL,
+                PRIMARY KEY (ticker, asset_type, date)
+            )
+            """
+        )
+        _connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS history_fetches (
+                ticker TEXT NOT NULL,
+                asset_type TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (ticker, asset_type)
+            )
+            """
+        )
+        _connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS api_requests (
+                day TEXT PRIMARY KEY,
+                requests INTEGER NOT NULL
+            )
+            """
+        )
+        _connection.commit()
+    return _connection
+
+def get_ttl(asset_type):
+    """
+    Look up how long a quote for the given asset type stays fresh.
+
+    Args:
+        asset_type (str): The type of asset (e.g., stock, etf, crypto, etc.).
+
+    Returns:
+        float: The time-to-live in seconds.
+    """
+    return CACHE_CONSTANTS['TTL_SECONDS'].get(asset_type, CACHE_CONSTANTS['DEFAULT_TTL_SECONDS'])
+
+def get_cached_price(ticker, asset_type):
+    """
+    Return a cached quote if it is still within its TTL.
+
+    Args:
+        ticker (str): The asset ticker symbol.
+        asset_type (str): The type of asset (e.g., stock, etf, crypto, etc.).
+
+    Returns:
+        float: The cached price, or None on a miss or an expired entry.
+    """
+    if not CACHE_CONSTANTS['ENABLED']:
+        return None
+
+    now = time.time()
+    with _lock:
+        connection = _get_connection()
+        row = connection.execute(
+            "SELECT price, fetched_at FROM quotes WHERE ticker = ? AND asset_type = ?",
+            (ticker, asset_type),
+        ).fetchone()
+
+        if row is None or now - row[1] > get_ttl(asset_type):
+            _stats["misses"] += 1
+            return None
+
+        connection.execute(
+            "UPDATE quotes SET accessed_at = ? WHERE ticker = ? AND asset_type = ?",
+            (now, ticker, asset_type),
+        )
+        connection.commit()
+        _stats["hits"] += 1
+        return row[0]
+
+def store_price(ticker, asset_type, price):
+    """
+    Write a freshly fetched quote to the cache and evict old entries.
+
+    Args:
+        ticker (str): The asset ticker symbol.
+        asset_type (str): The type of asset (e.g., stock, etf, crypto, etc.).
+        price (float): The price returned by the API.
+    """
+    if not CACHE_CONSTANTS['ENABLED']:
+        return
+
+    now = time.time()
+    with _lock:
+        connection = _get_connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO quotes (ticker, asset_type, price, fetched_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (ticker, asset_type, price, now, now),
+        )
+        _evict(connection, now)
+        connection.commit()
+
+def _evict(connection, now):
+    """
+    Drop expired quotes, then the least recently used ones above MAX_ENTRIES.
+
+    Args:
+        connection (sqlite3.Connection): An open cache connection.
+        now (float): The current timestamp.
+    """
+    ttl_cases = " ".join(
+        f"WHEN '{asset_type}' THEN {ttl}" for asset_type, ttl in CACHE_CONSTANTS['TTL_SECONDS'].items()
+    )
+    connection.execute(
+        f"DELETE FROM quotes WHERE ? - fetched_at > CASE asset_type {ttl_cases} ELSE ? END",
+        (now, CACHE_CONSTANTS['DEFAULT_TTL_SECONDS']),
+    )
+    connection.execute(
+        """
+        DELETE FROM quotes WHERE rowid IN (
+            SELECT rowid FROM quotes ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+        )
+        """,
+        (CACHE_CONSTANTS['MAX_ENTRIES'],),
+    )
+
+def get_cached_history(ticker, asset_type):
+    """
+    Return the stored daily closes for a ticker if they were refreshed within HISTORY_TTL_SECONDS.
+
+    Args:
+        ticker (str): The asset ticker symbol.
+        asset_type (str): The type of asset (e.g., stock, etf, crypto, etc.).
+
+    Returns:
+        pd.Series: Closing prices indexed by date (YYYY-MM-DD), or None if missing or stale.
+    """
+    if not CACHE_CONSTANTS['ENABLED']:
+        return None
+
+    with _lock:
+        connection = _get_connection()
+        fetched = connection.execute(
+            "SELECT fetched_at FROM history_fetches WHERE ticker = ? AND asset_type = ?",
+            (ticker, asset_type),
+        ).fetchone()
+        if fetched is None or time.time() - fetched[0] > CACHE_CONSTANTS['HISTORY_TTL_SECONDS']:
+            return None
+
+        rows = connection.execute(
+            "SELECT date, close FROM price_history WHERE ticker = ? AND asset_type = ? ORDER BY date",
+            (ticker, asset_type),
+        ).fetchall()
+    return pd.Series(dict(rows), dtype=float).rename_axis("Date")
+
+def store_history(ticker, asset_type, closes):
+    """
+    Merge freshly fetched daily closes into the stored history.
+
+    Older dates already in the store are kept, so the history grows beyond what a
+    single response returns.
+
+    Args:
+        ticker (str): The asset ticker symbol.
+        asset_type (str): The type of asset (e.g., stock, etf, crypto, etc.).
+        closes (pd.Series): Closing prices indexed by date (YYYY-MM-DD).
+    """
+    if not CACHE_CONSTANTS['ENABLED'] or closes.empty:
+        return
+
+    with _lock:
+        connection = _get_connection()
+        connection.executemany(
+            "INSERT OR REPLACE INTO price_history (ticker, asset_type, date, close) VALUES (?, ?, ?, ?)",
+            [(ticker, asset_type, str(date), float(close)) for date, close in closes.items()],
+        )
+        connection.execute(
+            "INSERT OR REPLACE INTO history_fetches (ticker, asset_type, fetched_at) VALUES (?, ?, ?)",
+            (ticker, asset_type, time.time()),
+        )
+        connection.commit()
+
+def try_consume_daily_request(limit):
+    """
+    Count one API request against today's quota if it is not yet used up.
+
+    The count lives in the cache database, so the quota holds across runs and
+    across processes. Days are UTC dates, matching the Alpha Vantage reset.
+
+    Args:
+        limit (int): Maximum number of requests per day.
+
+    Returns:
+        bool: True if the request was counted, False if the quota is used up.
+    """
+    day = time.strftime("%Y-%m-%d", time.gmtime())
+    with _lock:
+        connection = _get_connection()
+        cursor = connection.execute(
+            """
+            INSERT INTO api_requests (day, requests) VALUES (?, 1)
+            ON CONFLICT (day) DO UPDATE SET requests = requests + 1 WHERE requests < ?
+            """,
+            (day, limit),
+        )
+        connection.execute("DELETE FROM api_requests WHERE day < ?", (day,))
+        connection.commit()
+        return cursor.rowcount > 0
+
+def clear_cache():
+    """Remove every cached quote and price history."""
+    with _lock:
+        connection = _get_connection()
+        connection.execute("DELETE FROM quotes")
+        connection.execute("DELETE FROM price_history")
+        connection.execute("DELETE FROM history_fetches")
+        connection.commit()
+
+def get_cache_stats():
+    """
+    Return the hit/miss counters for this process.
+
+    Returns:
+        dict: A dictionary with `hits` and `misses` counts.
+    """
+    with _lock:
+        return dict(_stats)
+
+def report_cache_stats():
+    """Print the hit/miss counters for this process."""
+    stats = get_cache_stats()
+    print(f"Quote cache: {stats['hits']} hits, {stats['misses']} misses")
@@ -1,5 +1,8 @@
 SHOW_DOLLAR = True
 LTH_YEARS = 2
+PRICE_AS_OF_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Format for generated portfolio files: csv, parquet or feather (parquet/feather need pyarrow)
+STORAGE_FORMAT = "csv"
 
 PORTS = {
     'PORT_MAIN': 8050,
@@ -12,28 +15,208 @@ PORTS = {
 FUNCTIONS = {
     "calculate_portfolio_new": ("calculate/calculate_portfolio.py", PORTS['PORT_API']),
     "calculate_portfolio_update": ("calculate/update.py", PORTS['PORT_API']),
-    "visualize_portfolio": ("visualize/visualize_portfolio.py", PORTS['PORT_PORTFOLIO']),
-    "visualize_budget": ("visualize/visualize_budget.py", PORTS['PORT_BUDGET']),
+    "calculate_portfolio_refresh": ("calculate/update.py --incremental", PORTS['PORT_API']),
+    "calculate_portfolio_batch": ("calculate/calculate_batch.py", PORTS['PORT_API']),
+    "calculate_risk": ("calculate/calculate_risk.py", PORTS['PORT_API']),
+    "calculate_rebalance": ("calculate/calculate_rebalance.py", PORTS['PORT_API']),
+    "calculate_budget": ("calculate/calculate_budget.py", PORTS['PORT_API']),
+    "calculate_forecast": ("calculate/calculate_forecast.py", PORTS['PORT_API']),
     "convert_fidelity": ("helpers/conversions/convert_fidelity.py", PORTS['PORT_ALT']),
-    "merge_portfolios": ("helpers/conversions/merge_portfolios.py", PORTS['PORT_ALT'])
+    "convert_fidelity_activity": ("helpers/conversions/convert_fidelity_activity.py", PORTS['PORT_ALT']),
+    "merge_portfolios": ("helpers/conversions/merge_portfolios.py", PORTS['PORT_ALT']),
+    "ingest_exports": ("helpers/conversions/registry.py", PORTS['PORT_ALT']),
+    "categorize_transactions": ("helpers/conversions/categorize_transactions.py", PORTS['PORT_ALT'])
+}
+
+# Dashboards served as pages of the main app: button id -> URL path
+PAGES = {
+    "visualize_portfolio": "/portfolio",
+    "visualize_budget": "/budget"
 }
 
 FILE_PATHS = {
     "PORTFOLIO_INPUT": "input/portfolio_input.csv",
-    "PORTFOLIO_OUTPUT": "helpers/conversions/data/portfolio_output.csv",
+    "PORTFOLIO_OUTPUT": f"helpers/conversions/data/portfolio_output.{STORAGE_FORMAT}",
+    "POSITIONS_OUTPUT": f"helpers/conversions/data/positions_output.{STORAGE_FORMAT}",
+    "RISK_OUTPUT": f"helpers/conversions/data/risk_output.{STORAGE_FORMAT}",
+    "BATCH_INPUT": "input/portfolios",
+    "BATCH_OUTPUT": "helpers/conversions/data/batch",
+    "REBALANCE_TARGETS": "input/targets.csv",
+    "REBALANCE_OUTPUT": f"helpers/conversions/data/rebalance_output.{STORAGE_FORMAT}",
     "CASH_FLOW": "input/income_expenses.csv",
+    "LEDGER": "input/ledger.csv",
+    "TRANSACTIONS_INPUT": "input/transactions.csv",
+    "CATEGORY_RULES": "input/categories.json",
+    "UNCATEGORIZED_OUTPUT": f"helpers/conversions/data/uncategorized_output.{STORAGE_FORMAT}",
+    "BUDGET_OUTPUT": f"helpers/conversions/data/budget_output.{STORAGE_FORMAT}",
+    "BUDGET_SUMMARY": f"helpers/conversions/data/budget_summary.{STORAGE_FORMAT}",
+    "FORECAST_STATE": f"helpers/conversions/data/forecast_state.{STORAGE_FORMAT}",
+    "FORECAST_OUTPUT": f"helpers/conversions/data/forecast_output.{STORAGE_FORMAT}",
+    "FORECAST_TREND": f"helpers/conversions/data/forecast_trend.{STORAGE_FORMAT}",
     "FIDELITY_INPUT": "helpers/conversions/data/fidelity_input.csv",
-    "FIDELITY_OUTPUT": "helpers/conversions/data/fidelity_output.csv",
+    "FIDELITY_OUTPUT": f"helpers/conversions/data/fidelity_output.{STORAGE_FORMAT}",
+    "FIDELITY_ACTIVITY_INPUT": "helpers/conversions/data/fidelity_activity.csv",
+    "FIDELITY_ACTIVITY_OUTPUT": f"helpers/conversions/data/fidelity_lots.{STORAGE_FORMAT}",
     "CRYPTO": "input/crypto.csv",
+    "INGEST_INPUT": "input/drop",
+    "INGEST_OUTPUT": f"helpers/conversions/data/ingested_output.{STORAGE_FORMAT}",
+    "CONVERTER_MAPPINGS": "input/converters.json",
+    "QUOTE_CACHE": "helpers/conversions/data/quote_cache.db",
+    "QUOTE_RECORDINGS": "helpers/conversions/data/quote_recordings.json",
+    "HISTORY": "helpers/conversions/data/history",
+    "PIPELINE_MERGED": f"helpers/conversions/data/merged_output.{STORAGE_FORMAT}",
+    "PIPELINE_MANIFEST": "helpers/conversions/data/pipeline/manifest.json",
+    "PIPELINE_CACHE": "helpers/conversions/data/pipeline/cache",
 }
 
 CONVERSION_CONSTANTS = {
     "OUTPUT_HEADERS": [
         "Ticker", "Type", "Quantity", "Cost Basis", "Purchase Date", "Liquidity",
-        "Current Price", "Value", "Gain/Loss", "% Gain/Loss", "Long-Term Hold"
+        "Current Price", "Value", "Gain/Loss", "% Gain/Loss", "Long-Term Hold", "Price As Of"
     ],
     "KEYWORDS": {
         "MONEY_MARKET": ["HELD IN MONEY MARKET"],
+        "MONEY_MARKET_FUNDS": ["MONEY MARKET"],
         "PENDING_ACTIVITY": ["Pending Activity"]
-    }
+    },
+    # Fidelity positions export columns, matched by header name (case and spacing are ignored)
+    "FIDELITY_COLUMNS": [
+        "Account Number", "Account Name", "Symbol", "Description", "Quantity",
+        "Last Price", "Current Value", "Total Gain/Loss Dollar", "Cost Basis Total"
+    ],
+    # Fidelity "Activity & Orders" export columns; optional ones are used when present
+    "FIDELITY_ACTIVITY_COLUMNS": ["Run Date", "Action", "Symbol", "Quantity", "Amount ($)"],
+    "FIDELITY_ACTIVITY_OPTIONAL_COLUMNS": ["Account Number", "Account", "Description", "Price ($)"],
+    # Action text that marks each replayed transaction kind; the first match wins
+    "ACTIVITY_ACTIONS": {
+        "buy": ["YOU BOUGHT"],
+        "reinvest": ["REINVESTMENT"],
+        "sell": ["YOU SOLD"],
+        "transfer": ["TRANSFER", "JOURNALED"]
+    },
+    # Liquidity of mapped rows by type when the export has none; other types are "medium"
+    "LIQUIDITY": {"cash": "high", "401k": "low", "hsa": "low"},
+    # Rows read and converted at a time
+    "CHUNK_SIZE": 50_000
+}
+
+CACHE_CONSTANTS = {
+    "ENABLED": True,
+    # Seconds a cached quote stays fresh, per asset type
+    "TTL_SECONDS": {
+        "stock": 15 * 60,
+        "etf": 15 * 60,
+        "crypto": 2 * 60,
+    },
+    "DEFAULT_TTL_SECONDS": 15 * 60,
+    # Least recently used quotes are evicted once the cache grows past this
+    "MAX_ENTRIES": 5000,
+    # Seconds before a ticker's daily price history is fetched again
+    "HISTORY_TTL_SECONDS": 12 * 60 * 60
+}
+
+API_CONSTANTS = {
+    # One of: alpha_vantage, record, replay, synthetic
+    "PROVIDER": "alpha_vantage",
+    # Alpha Vantage free tier quota
+    "REQUESTS_PER_MINUTE": 5,
+    "REQUESTS_PER_DAY": 25,
+    "MAX_WORKERS": 4,
+    # HTTP session settings
+    "POOL_SIZE": 4,
+    "CONNECT_TIMEOUT": 5,
+    "READ_TIMEOUT": 15,
+    "MAX_RETRIES": 3,
+    "BACKOFF_BASE_SECONDS": 2,
+    "BACKOFF_MAX_SECONDS": 60,
+    # Payload keys Alpha Vantage uses to report throttling instead of data
+    "THROTTLE_KEYS": ["Note", "Information"]
+}
+
+
+UPDATE_CONSTANTS = {
+    # Incremental updates only reprice rows quoted longer ago than this
+    "STALE_AFTER_MINUTES": 60
+}
+
+RISK_CONSTANTS = {
+    # Market proxy for beta
+    "BENCHMARK": ("SPY", "etf"),
+    # Daily returns used for covariance and historical VaR
+    "LOOKBACK_DAYS": 252,
+    "MIN_OBSERVATIONS": 20,
+    "TRADING_DAYS": 252,
+    "CONFIDENCE": 0.95,
+    "HORIZON_DAYS": 1,
+    # Monte Carlo paths are simulated in chunks across a process pool
+    "SIMULATIONS": 100_000,
+    "CHUNK_SIZE": 10_000,
+    # None uses one process per CPU
+    "MAX_WORKERS": None,
+    "SEED": 0
+}
+
+BATCH_CONSTANTS = {
+    # Worker processes for batch runs; None uses one process per CPU
+    "MAX_WORKERS": None
+}
+
+REBALANCE_CONSTANTS = {
+    # Buckets closer to target than this many dollars are not traded
+    "MIN_TRADE": 100.0,
+    # Cash left in every account after buys
+    "MIN_CASH": 0.0,
+    # Short-term gains are always sold last; False never sells them
+    "SELL_SHORT_TERM_GAINS": True
+}
+
+BUDGET_CONSTANTS = {
+    # Rollup frequencies and their pandas period codes
+    "PERIODS": {"Monthly": "M", "Quarterly": "Q", "Yearly": "Y"},
+    # Rollup the budget dashboard shows; its latest period feeds the cash flow charts
+    "DASHBOARD_PERIOD": "Monthly",
+    # Largest income sources, expense sources and merchants shown in the Sankey diagram and pie; the rest are bucketed as "Other"
+    "SANKEY_TOP_N": 10,
+    # Split expense sources into their merchants when the data has a Merchant column
+    "SANKEY_MERCHANTS": True
+}
+
+FORECAST_CONSTANTS = {
+    # Closed months kept in the rolling state; older months drop out as new ones are added
+    "HISTORY_MONTHS": 36,
+    # Rolling average windows in months
+    "WINDOWS": [3, 6, 12],
+    # Months forecast past the last closed month
+    "HORIZON": 6,
+    # Share of the last 12 months a source must appear in, and how much it may vary, to count as recurring
+    "RECURRING_SHARE": 0.75,
+    "RECURRING_CV": 0.25,
+    # Sources seen in this share of months or fewer are one-off and not forecast
+    "ONE_OFF_SHARE": 0.25,
+    # Ledger rows read at a time
+    "CHUNK_SIZE": 200_000
+}
+
+CATEGORIZE_CONSTANTS = {
+    # Bank and card export columns; override per export with --date-column and friends
+    "COLUMNS": {"Date": "Date", "Description": "Description", "Amount": "Amount"},
+    "DATE_FORMAT": "%m/%d/%Y",
+    # Most exports show spending as negative amounts; set False for exports that show it as positive
+    "EXPENSES_NEGATIVE": True,
+    # Source recorded for transactions no rule matches
+    "DEFAULT_SOURCE": "Uncategorized",
+    # Unmatched merchants printed after a run; the full list is saved to UNCATEGORIZED_OUTPUT
+    "UNMATCHED_REPORT": 10
+}
+
+PIPELINE_CONSTANTS = {
+    # Earlier outputs kept per stage, restored when their inputs come back; 0 disables the cache
+    "CACHE_ENTRIES": 3,
+    # Portfolio the pipeline calculates: "merged" (Fidelity + crypto) or "manual" (input/portfolio_input.csv)
+    "SOURCE": "merged"
+}
+
+INGEST_CONSTANTS = {
+    # Worker processes converting drop folder exports; None uses one process per CPU
+    "MAX_WORKERS": None
 }
\ No newline at end of file
@@ -0,0 +1,218 @@
+import json, os
+import numpy as np
+import pandas as pd
+from helpers.utils.constants import FILE_PATHS
+from helpers.utils.schema import as_text
+from helpers.utils.storage import atomic_write
+
+# One flat binary file per column; rows are appended in snapshot order
+HISTORY_COLUMNS = {
+    "Timestamp": np.int64,
+    "Ticker": np.int32,
+    "Type": np.int32,
+    "Quantity": np.float64,
+    "Current Price": np.float64,
+    "Value": np.float64,
+}
+DICTIONARY_FILE = "dictionary.json"
+
+# Function Definitions
+def _column_path(history_dir, column):
+    return os.path.join(history_dir, f"{column.lower().replace(' ', '_')}.bin")
+
+def _load_dictionary(history_dir):
+    path = os.path.join(history_dir, DICTIONARY_FILE)
+    if not os.path.exists(path):
+        return {"Ticker": [], "Type": []}
+    with open(path, "r") as infile:
+        return json.load(infile)
+
+def _save_dictionary(history_dir, dictionary):
+    path = os.path.join(history_dir, DICTIONARY_FILE)
+    with atomic_write(path) as temp_path:
+        with open(temp_path, "w") as outfile:
+            json.dump(dictionary, outfile)
+
+def _encode(values, labels):
+    """
+    Map strings to integer codes, extending `labels` with any new values.
+
+    Args:
+        values (pd.Series): Strings to encode.
+        labels (list): Known labels; new labels are appended in place.
+
+    Returns:
+        np.ndarray: int32 codes into `labels`.
+    """
+    lookup = {label: code for code, label in enumerate(labels)}
+    uniques = pd.unique(values)
+    for value in uniques:
+        if value not in lookup:
+            lookup[value] = len(labels)
+            labels.append(value)
+    return values.map(lookup).to_numpy(dtype=np.int32)
+
+def _count_rows(history_dir):
+    """
+    Returns:
+        int: Rows present in every column file, i.e. the length of the shortest column.
+    """
+    sizes = []
+    for column, dtype in HISTORY_COLUMNS.items():
+        path = _column_path(history_dir, column)
+        sizes.append(os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0)
+    return min(sizes)
+
+def _align_columns(history_dir):
+    """
+    Truncate every column file to the shortest column, dropping a partially written append.
+
+    Returns:
+        int: The number of rows left in each column.
+    """
+    rows = _count_rows(history_dir)
+    for column, dtype in HISTORY_COLUMNS.items():
+        path = _column_path(history_dir, column)
+        length = rows * np.dtype(dtype).itemsize
+        if os.path.exists(path) and os.path.getsize(path) > length:
+            os.truncate(path, length)
+    return rows
+
+def _open_columns(history_dir):
+    """
+    Memory-map every column file.
+
+    Returns:
+        dict: Column name to read-only array. Arrays are trimmed to the shortest
+              column so a partially written append is never read.
+    """
+    rows = _count_rows(history_dir)
+
+    if rows == 0:
+        return {column: np.empty(0, dtype=dtype) for column, dtype in HISTORY_COLUMNS.items()}
+    return {
+        column: np.memmap(_column_path(history_dir, column), dtype=dtype, mode="r", shape=(rows,))
+        for column, dtype in HISTORY_COLUMNS.items()
+    }
+
+def append_snapshot(portfolio, timestamp=None, history_dir=None):
+    """
+    Append a snapshot of per-ticker quantity, price and value to the history store.
+
+    Args:
+        portfolio (pd.DataFrame): A calculated portfolio.
+        timestamp (float, optional): Snapshot wall-clock time as seconds since the epoch. Defaults to now.
+        history_dir (str, optional): Directory of the store. Defaults to FILE_PATHS['HISTORY'].
+
+    Raises:
+        ValueError: If `timestamp` is older than the latest stored snapshot.
+    """
+    history_dir = history_dir or FILE_PATHS['HISTORY']
+    os.makedirs(history_dir, exist_ok=True)
+    # An interrupted append leaves columns of different lengths; realign before writing more
+    _align_columns(history_dir)
+    stored_timestamps = _open_columns(history_dir)["Timestamp"]
+    latest = int(stored_timestamps[-1]) if len(stored_timestamps) else None
+
+    if timestamp is None:
+        # Wall-clock time can step back (e.g. daylight saving); keep the store ordered
+        timestamp = int(pd.Timestamp.now().timestamp())
+        if latest is not None:
+            timestamp = max(timestamp, latest)
+    elif latest is not None and timestamp < latest:
+        raise ValueError("Snapshots must be appended in chronological order.")
+    timestamp = int(timestamp)
+
+    snapshot = (
+        portfolio.dropna(subset=['Ticker'])
+        .assign(Ticker=lambda df: df['Ticker'].astype(str), Type=lambda df: as_text(df['Type']))
+        .groupby(['Ticker', 'Type'], sort=False)
+        .agg({'Quantity': 'sum', 'Current Price': 'last', 'Value': 'sum'})
+        .reset_index()
+    )
+    if snapshot.empty:
+        return
+
+    # Extend the dictionary before writing codes that refer to it
+    dictionary = _load_dictionary(history_dir)
+    columns = {
+        "Timestamp": np.full(len(snapshot), timestamp, dtype=np.int64),
+        "Ticker": _encode(snapshot['Ticker'], dictionary['Ticker']),
+        "Type": _encode(snapshot['Type'], dictionary['Type']),
+        "Quantity": snapshot['Quantity'].to_numpy(dtype=np.float64),
+        "Current Price": snapshot['Current Price'].to_numpy(dtype=np.float64),
+        "Value": snapshot['Value'].to_numpy(dtype=np.float64),
+    }
+    _save_dictionary(history_dir, dictionary)
+
+    for column, dtype in HISTORY_COLUMNS.items():
+        with open(_column_path(history_dir, column), "ab") as outfile:
+            columns[column].astype(dtype).tofile(outfile)
+
+def load_history(start=None, end=None, tickers=None, history_dir=None):
+    """
+    Read snapshot rows in a date range, optionally for specific tickers.
+
+    Only the requested slice is copied out of the memory-mapped columns.
+
+    Args:
+        start (str or datetime, optional): Inclusive start of the range.
+        end (str or datetime, optional): Inclusive end of the range.
+        tickers (list, optional): Tickers to include. Defaults to all.
+        history_dir (str, optional): Directory of the store. Defaults to FILE_PATHS['HISTORY'].
+
+    Returns:
+        pd.DataFrame: Columns Date, Ticker, Type, Quantity, Current Price and Value.
+    """
+    history_dir = history_dir or FILE_PATHS['HISTORY']
+    columns = _open_columns(history_dir)
+    timestamps = columns["Timestamp"]
+
+    # Snapshots are appended in time order, so a date range is a contiguous slice
+    lower = 0 if start is None else np.searchsorted(timestamps, pd.Timestamp(start).timestamp(), side="left")
+    if end is None:
+        upper = len(timestamps)
+    else:
+        end = pd.Timestamp(end)
+        if end == end.normalize():
+            end += pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+        upper = np.searchsorted(timestamps, end.timestamp(), side="right")
+
+    selected = {column: np.asarray(values[lower:upper]) for column, values in columns.items()}
+    dictionary = _load_dictionary(history_dir)
+
+    if tickers:
+        tickers = set(tickers)
+        wanted = [code for code, ticker in enumerate(dictionary['Ticker']) if ticker in tickers]
+        mask = np.isin(selected["Ticker"], wanted)
+        selected = {column: values[mask] for column, values in selected.items()}
+
+    return pd.DataFrame({
+        "Date": pd.to_datetime(selected["Timestamp"], unit="s"),
+        "Ticker": pd.Categorical.from_codes(selected["Ticker"], categories=dictionary['Ticker'] or ["_"]),
+        "Type": pd.Categorical.from_codes(selected["Type"], categories=dictionary['Type'] or ["_"]),
+        "Quantity": selected["Quantity"],
+        "Current Price": selected["Current Price"],
+        "Value": selected["Value"],
+    })
+
+def get_value_history(start=None, end=None, tickers=None, history_dir=None):
+    """
+    Total portfolio value per day, using the last snapshot taken on each day.
+
+    Args:
+        start (str or datetime, optional): Inclusive start of the range.
+        end (str or datetime, optional): Inclusive end of the range.
+        tickers (list, optional): Tickers to include. Defaults to all.
+        history_dir (str, optional): Directory of the store. Defaults to FILE_PATHS['HISTORY'].
+
+    Returns:
+        pd.DataFrame: Columns Date and Value, one row per day with a snapshot.
+    """
+    history = load_history(start=start, end=end, tickers=tickers, history_dir=history_dir)
+    if history.empty:
+        return pd.DataFrame(columns=["Date", "Value"])
+
+    totals = history.groupby("Date")["Value"].sum()
+    daily = totals.groupby(totals.index.normalize()).last()
+    return daily.rename_axis("Date").reset_index()
@@ -0,0 +1,283 @@
+import json, os, threading, time, zlib
+import numpy as np
+import pandas as pd
+from helpers.utils.session import request_json
+
+ALPHA_VANTAGE_URL = "https://www.alphavantage.co/query"
+
+class PriceProvider:
+    """
+    Base class for quote sources.
+
+    A provider splits a lookup into `request`, which returns the raw payload,
+    and `parse`, which turns that payload into a price. Keeping the two apart
+    lets RecordReplayProvider store real payloads and parse them later.
+    """
+
+    def request(self, ticker, asset_type):
+        """
+        Args:
+            ticker (str): The asset ticker symbol.
+            asset_type (str): The type of asset (stock, etf or crypto).
+
+        Returns:
+            dict: The raw payload, or None if it could not be retrieved.
+        """
+        raise NotImplementedError
+
+    def parse(self, payload, ticker, asset_type):
+        """
+        Args:
+            payload (dict): A payload returned by `request`.
+            ticker (str): The asset ticker symbol.
+            asset_type (str): The type of asset (stock, etf or crypto).
+
+        Returns:
+            float: The price contained in the payload.
+
+        Raises:
+            KeyError, ValueError: If the payload does not contain a price.
+        """
+        raise NotImplementedError
+
+    def fetch(self, ticker, asset_type):
+        """
+        Request and parse a quote.
+
+        Args:
+            ticker (str): The asset ticker symbol.
+            asset_type (str): The type of asset (stock, etf or crypto).
+
+        Returns:
+            float: The current price of the asset, or None if no quote is available.
+        """
+        payload = self.request(ticker, asset_type)
+        if payload is None:
+            return None
+
+        try:
+            return self.parse(payload, ticker, asset_type)
+        except (KeyError, ValueError):
+            print(f"Error fetching price for {ticker} ({asset_type}). Response: {payload}")
+            return None
+
+    def request_history(self, ticker, asset_type):
+        """
+        Args:
+            ticker (str): The asset ticker symbol.
+            asset_type (str): The type of asset (stock, etf or crypto).
+
+        Returns:
+            dict: The raw daily history payload, or None if it could not be retrieved.
+        """
+        raise NotImplementedError
+
+    def parse_history(self, payload, ticker, asset_type):
+        """
+        Args:
+            payload (dict): A payload returned by `request_history`.
+            ticker (str): The asset ticker symbol.
+            asset_type (str): The type of asset (stock, etf or crypto).
+
+        Returns:
+            pd.Series: Daily closing prices indexed by date, oldest first.
+
+        Raises:
+            KeyError, ValueError: If the payload does not contain a price history.
+        """
+        raise NotImplementedError
+
+    def fetch_history(self, ticker, asset_type):
+        """
+        Request and parse a daily price history.
+
+        Args:
+            ticker (str): The asset ticker symbol.
+            asset_type (str): The type of asset (stock, etf or crypto).
+
+        Returns:
+            pd.Series: Daily closing prices indexed by date, or an empty Series if there's an error.
+        """
+        payload = self.request_history(ticker, asset_type)
+        if payload is None:
+            return pd.Series(dtype=float)
+
+        try:
+            return self.parse_history(payload, ticker, asset_type)
+        except (KeyError, ValueError):
+            print(f"Error fetching price history for {ticker} ({asset_type}). Response: {payload}")
+            return pd.Series(dtype=float)
+
+class AlphaVantageProvider(PriceProvider):
+    """Quotes from the Alpha Vantage GLOBAL_QUOTE and CURRENCY_EXCHANGE_RATE endpoints."""
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+    def request(self, ticker, asset_type):
+        if asset_type in ["stock", "etf"]:
+            params = {
+                "function": "GLOBAL_QUOTE",
+                "symbol": ticker,
+                "apikey": self.api_key,
+            }
+        elif asset_type == "crypto":
+            params = {
+                "function": "CURRENCY_EXCHANGE_RATE",
+                "from_currency": ticker.upper(),
+                "to_currency": "USD",
+                "apikey": self.api_key,
+            }
+        else:
+            return None
+
+        return request_json(ALPHA_VANTAGE_URL, params, f"{ticker} ({asset_type})")
+
+    def parse(self, payload, ticker, asset_type):
+        if asset_type in ["stock", "etf"]:
+            return float(payload["Global Quote"]["05. price"])
+        return float(payload["Realtime Currency Exchange Rate"]["5. Exchange Rate"])
+
+    def request_history(self, ticker, asset_type):
+        if asset_type in ["stock", "etf"]:
+            params = {
+                "function": "TIME_SERIES_DAILY",
+                "symbol": ticker,
+                "outputsize": "compact",
+                "apikey": self.api_key,
+            }
+        elif asset_type == "crypto":
+            params = {
+                "function": "DIGITAL_CURRENCY_DAILY",
+                "symbol": ticker.upper(),
+                "market": "USD",
+                "apikey": self.api_key,
+            }
+        else:
+            return None
+
+        return request_json(ALPHA_VANTAGE_URL, params, f"{ticker} ({asset_type}) history")
+
+    def parse_history(self, payload, ticker, asset_type):
+        key = "Time Series (Daily)" if asset_type in ["stock", "etf"] else "Time Series (Digital Currency Daily)"
+        closes = {date: float(values["4. close"]) for date, values in payload[key].items()}
+        if not closes:
+            raise ValueError("Empty price history")
+        return pd.Series(closes, dtype=float).rename_axis("Date").sort_index()
+
+class RecordReplayProvider(PriceProvider):
+    """
+    Records payloads from another provider to a JSON file, or replays them without network access.
+    """
+
+    def __init__(self, provider, path, mode="replay"):
+        """
+        Args:
+            provider (PriceProvider): The provider to record from and parse with.
+            path (str): JSON file holding the recorded payloads.
+            mode (str): "record" to call `provider` and save payloads, "replay" to read them back.
+        """
+        if mode not in ["record", "replay"]:
+            raise ValueError(f"Invalid mode: {mode}")
+
+        self.provider = provider
+        self.path = path
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.recordings = {}
+        if os.path.exists(path):
+            with open(path, "r") as infile:
+                self.recordings = json.load(infile)
+
+    @staticmethod
+    def _key(ticker, asset_type):
+        return f"{asset_type}:{ticker}"
+
+    def request(self, ticker, asset_type):
+        return self._replay_or_record(ticker, asset_type, lambda: self.provider.request(ticker, asset_type))
+
+    def parse(self, payload, ticker, asset_type):
+        return self.provider.parse(payload, ticker, asset_type)
+
+    def request_history(self, ticker, asset_type):
+        return self._replay_or_record(
+            f"history:{ticker}", asset_type, lambda: self.provider.request_history(ticker, asset_type)
+        )
+
+    def parse_history(self, payload, ticker, asset_type):
+        return self.provider.parse_history(payload, ticker, asset_type)
+
+    def _replay_or_record(self, name, asset_type, request):
+        """
+        Replay the payload saved under (name, asset_type), or call `request` and save its payload.
+
+        Args:
+            name (str): Recording name, usually the ticker.
+            asset_type (str): The type of asset.
+            request (callable): Fetches the payload from the wrapped provider.
+
+        Returns:
+            dict: The payload, or None if there is none.
+        """
+        key = self._key(name, asset_type)
+        if self.mode == "replay":
+            payload = self.recordings.get(key)
+            if payload is None:
+                print(f"No recording for {name} ({asset_type}) in {self.path}")
+            return payload
+
+        payload = request()
+        if payload is not None:
+            with self.lock:
+                self.recordings[key] = payload
+                self._save()
+        return payload
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as outfile:
+            json.dump(self.recordings, outfile, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+class SyntheticProvider(PriceProvider):
+    """
+    Deterministic offline quotes for tests and benchmarks.
+
+    Each ticker gets a stable price derived from a hash of (seed, ticker, asset_type),
+    optionally after sleeping `latency` seconds to simulate a network round-trip.
+    """
+
+    def __init__(self, seed=0, latency=0.0, min_price=1.0, max_price=1000.0):
+        self.seed = seed
+        self.latency = latency
+        self.min_price = min_price
+        self.max_price = max_price
+
+    def request(self, ticker, asset_type):
+        if self.latency:
+            time.sleep(self.latency)
+        digest = zlib.crc32(f"{self.seed}:{asset_type}:{ticker}".encode())
+        fraction = digest / 0xFFFFFFFF
+        return {"price": round(self.min_price + fraction * (self.max_price - self.min_price), 2)}
+
+    def parse(self, payload, ticker, asset_type):
+        return float(payload["price"])
+
+    def request_history(self, ticker, asset_type, days=252):
+        """
+        A deterministic geometric random walk ending at the synthetic quote.
+
+        Args:
+            days (int): Number of daily closes, ending today.
+        """
+        digest = zlib.crc32(f"{self.seed}:history:{asset_type}:{ticker}".encode())
+        rng = np.random.default_rng(digest)
+        volatility = 0.03 if asset_type == "crypto" else 0.015
+        returns = rng.normal(0.0003, volatility * (0.5 + digest / 0xFFFFFFFF), size=days)
+        closes = float(self.request(ticker, asset_type)["price"]) * np.exp(returns.cumsum() - returns.sum())
+        dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days).strftime("%Y-%m-%d")
+        return {"history": dict(zip(dates, closes.round(4).tolist()))}
+
+    def parse_history(self, payload, ticker, asset_type):
+        return pd.Series(payload["history"], dtype=float).rename_axis("Date").sort_index()
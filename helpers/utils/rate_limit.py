@@ -0,0 +1,51 @@
+import threading, time
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that refills `capacity` tokens every `period` seconds.
+    """
+
+    def __init__(self, capacity, period):
+        """
+        Args:
+            capacity (int): Maximum number of tokens (burst size).
+            period (float): Seconds needed to refill a full bucket.
+        """
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self):
+        """
+        Take a token if one is available.
+
+        Returns:
+            bool: True if a token was taken, False if the bucket is empty.
+        """
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def wait_time(self):
+        """
+        Returns:
+            float: Seconds until the next token becomes available.
+        """
+        with self.lock:
+            self._refill()
+            return max(0.0, (1 - self.tokens) / self.rate)
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while not self.try_acquire():
+            time.sleep(self.wait_time())
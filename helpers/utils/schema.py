@@ -0,0 +1,212 @@
+import os, sys
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from helpers.utils.constants import FILE_PATHS, PRICE_AS_OF_FORMAT
+
+# Asset types the calculate engine prices or carries at face value
+ASSET_TYPES = ["stock", "etf", "crypto", "cash", "401k", "hsa", "espp"]
+
+# Column specs. Each maps a column to a dtype ("text", "category", "date" or a numeric dtype)
+# or to a dict with the dtype and optional:
+#   case: "lower" or "upper", applied once when loading
+#   values: allowed values; others are reported but kept as they are
+#   format: strptime format of "date" columns
+#   required: report rows where the value is missing
+# Columns missing from a table are ignored.
+PORTFOLIO_SCHEMA = {
+    "Ticker": {"dtype": "text", "required": True},
+    "Type": {"dtype": "category", "case": "lower", "values": ASSET_TYPES, "required": True},
+    "Quantity": {"dtype": "float64", "required": True},
+    "Cost Basis": "float64",
+    "Purchase Date": {"dtype": "date", "format": "%Y-%m-%d"},
+    "Liquidity": {"dtype": "category", "case": "lower", "values": ["high", "medium", "low"]},
+    "Current Price": "float64",
+    "Value": "float64",
+    "Gain/Loss": "float64",
+    # A display ratio; single precision keeps about seven significant digits
+    "% Gain/Loss": "float32",
+    "Long-Term Hold": "category",
+    "Price As Of": {"dtype": "date", "format": PRICE_AS_OF_FORMAT},
+}
+
+CRYPTO_SCHEMA = {
+    **PORTFOLIO_SCHEMA,
+    "Type": {"dtype": "category", "case": "lower", "values": ["crypto"], "required": True},
+}
+
+CASH_FLOW_SCHEMA = {
+    "Source": {"dtype": "text", "required": True},
+    # Optional detail below Source, such as the store behind "Groceries"
+    "Merchant": "text",
+    "Category": {"dtype": "category", "case": "lower", "values": ["income", "expenses"], "required": True},
+    "Amount": {"dtype": "float64", "required": True},
+}
+
+# A transaction ledger: one dated cash-flow row per transaction
+LEDGER_SCHEMA = {
+    "Date": {"dtype": "date", "format": "%Y-%m-%d", "required": True},
+    **CASH_FLOW_SCHEMA,
+}
+
+# Saved budget rollups and summaries
+BUDGET_SCHEMA = {
+    "Frequency": "text",
+    "Period": "text",
+    "Start": {"dtype": "date", "format": "%Y-%m-%d"},
+    "Category": "category",
+    "Source": "text",
+    "Merchant": "text",
+    "Amount": "float64",
+    "Transactions": "int64",
+    "Share (%)": "float32",
+}
+
+BUDGET_SUMMARY_SCHEMA = {
+    "Frequency": "text",
+    "Period": "text",
+    "Start": {"dtype": "date", "format": "%Y-%m-%d"},
+    **{column: "float64" for column in ["Income", "Expenses", "Savings", "Income Change", "Expenses Change", "Savings Change"]},
+    "Savings Rate (%)": "float32",
+    "Savings Rate Change": "float32",
+}
+
+# Characters stripped from numeric text before parsing
+NUMERIC_NOISE = str.maketrans("", "", "$,%+")
+
+class SchemaError(ValueError):
+    """Raised when a table has values that do not fit its schema. `issues` lists them by row."""
+
+    def __init__(self, issues, source="table"):
+        self.issues = issues
+        super().__init__(f"{len(issues)} invalid values in {source}:\n" + "\n".join(format_issues(issues)))
+
+def get_schema(path):
+    """The schema for a file: the crypto, income/expense and ledger inputs have their own, everything else is a portfolio."""
+    schemas = {
+        FILE_PATHS['CRYPTO']: CRYPTO_SCHEMA, FILE_PATHS['CASH_FLOW']: CASH_FLOW_SCHEMA, FILE_PATHS['LEDGER']: LEDGER_SCHEMA
+    }
+    return next(
+        (schema for known, schema in schemas.items() if os.path.abspath(known) == os.path.abspath(path)), PORTFOLIO_SCHEMA
+    )
+
+def _spec(spec):
+    return {"dtype": spec} if isinstance(spec, str) else spec
+
+def _is_blank(values):
+    """Missing values and empty or whitespace-only strings, checking each distinct value once."""
+    if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_datetime64_any_dtype(values):
+        return values.isna()
+    codes, uniques = pd.factorize(values)
+    blank = np.append(pd.Series(uniques, dtype=object).astype(str).str.strip().eq("").to_numpy(), True)
+    return pd.Series(blank[codes], index=values.index)
+
+def _cast_numeric(series, dtype):
+    """Returns (typed values, rows whose text is not a number)."""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(dtype), pd.Series(False, index=series.index)
+
+    # Exports repeat the same strings, so clean and parse each distinct value once
+    codes, uniques = pd.factorize(series)
+    cleaned = pd.Series(uniques, dtype=object).astype(str).str.translate(NUMERIC_NOISE).str.strip()
+    parsed = pd.to_numeric(cleaned, errors="coerce").to_numpy(dtype=float)
+    invalid = np.append(np.isnan(parsed) & (cleaned != "").to_numpy(), False)
+    parsed = np.append(parsed, np.nan)  # code -1 marks a missing value
+    return pd.Series(parsed[codes], index=series.index).astype(dtype), pd.Series(invalid[codes], index=series.index)
+
+def _cast_date(series, date_format):
+    """Returns (datetime64 values, rows whose text is not a date in `date_format`)."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series, pd.Series(False, index=series.index)
+
+    codes, uniques = pd.factorize(series)
+    uniques = pd.Series(uniques, dtype=object)
+    text = uniques.map(lambda value: value.strip() if isinstance(value, str) else value)
+    parsed = pd.to_datetime(text, format=date_format, errors="coerce")
+    invalid = np.append((parsed.isna() & ~_is_blank(text)).to_numpy(), False)
+    parsed = pd.DatetimeIndex(parsed).append(pd.DatetimeIndex([pd.NaT]))  # code -1 marks a missing date
+    return pd.Series(parsed[codes], index=series.index), pd.Series(invalid[codes], index=series.index)
+
+def _cast_category(series, case=None):
+    """Strip (and optionally re-case) each distinct value once and store the column as a categorical."""
+    codes, uniques = pd.factorize(series.astype(object) if isinstance(series.dtype, pd.CategoricalDtype) else series)
+    cleaned = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    if case:
+        cleaned = getattr(cleaned.str, case)()
+    cleaned = cleaned.where(cleaned != "")
+    category_codes, categories = pd.factorize(cleaned)
+    category_codes = np.append(category_codes, -1)
+    return pd.Series(
+        pd.Categorical.from_codes(category_codes[codes], categories=categories), index=series.index
+    )
+
+def apply_schema(data, schema=PORTFOLIO_SCHEMA, issues=None, first_row=1):
+    """
+    Cast the columns named in a schema to their declared types and normalize them.
+
+    Numeric columns are cleaned of "$", "," "%" and "+" before conversion, so values
+    such as "+12.5%" exported by brokers become 12.5. Categorical columns are stripped
+    and re-cased once here, so later code can compare them directly. Columns missing from
+    the data are ignored. Values that cannot be converted become missing and, if `issues`
+    is given, are reported there.
+
+    Args:
+        data (pd.DataFrame): The table to cast.
+        schema (dict): Mapping of column name to a column spec (see PORTFOLIO_SCHEMA).
+        issues (list, optional): Appended with (row number, column, value, problem) tuples.
+        first_row (int): Row number of the first row of `data`, e.g. 2 for a CSV with a header.
+
+    Returns:
+        pd.DataFrame: A copy of `data` with typed columns.
+    """
+    data = data.copy()
+    for column, spec in schema.items():
+        if column not in data:
+            continue
+
+        spec = _spec(spec)
+        series, dtype = data[column], spec['dtype']
+        invalid, problem = None, None
+        if dtype == "text":
+            typed = series.astype(object).where(series.isna(), series.astype(str))
+        elif dtype == "category":
+            typed = _cast_category(series, spec.get('case'))
+            if 'values' in spec:
+                invalid, problem = typed.notna() & ~typed.isin(spec['values']), f"is not one of {', '.join(spec['values'])}"
+        elif dtype == "date":
+            typed, invalid = _cast_date(series, spec.get('format'))
+            problem = f"is not a date in the format {spec.get('format')}"
+        else:
+            typed, invalid = _cast_numeric(series, dtype)
+            problem = "is not a number"
+
+        if issues is not None:
+            positions = np.arange(len(data)) + first_row
+            if invalid is not None and invalid.any():
+                mask = invalid.to_numpy()
+                issues.extend(zip(positions[mask], [column] * int(mask.sum()), series[mask], [problem] * int(mask.sum())))
+            if spec.get('required'):
+                mask = _is_blank(series).to_numpy()
+                issues.extend(zip(positions[mask], [column] * int(mask.sum()), [None] * int(mask.sum()), ["is missing"] * int(mask.sum())))
+        data[column] = typed
+    return data
+
+def format_issues(issues, limit=None):
+    """Describe schema issues in row order, one line each."""
+    issues = sorted(issues, key=lambda issue: (issue[0], issue[1]))
+    lines = [
+        f"Row {row}, {column}: {'value' if value is None else repr(value)} {problem}"
+        for row, column, value, problem in (issues[:limit] if limit else issues)
+    ]
+    if limit and len(issues) > limit:
+        lines.append(f"... and {len(issues) - limit} more")
+    return lines
+
+def as_text(values):
+    """
+    Plain strings with "" for missing values.
+
+    Used for group keys: grouping by a categorical alongside other columns would produce
+    a group for every category, observed or not.
+    """
+    return values.astype(object).where(values.notna(), "").astype(str)
@@ -0,0 +1,114 @@
+import random, threading, time
+import requests
+from requests.adapters import HTTPAdapter
+from helpers.utils.cache import try_consume_daily_request
+from helpers.utils.constants import API_CONSTANTS
+from helpers.utils.rate_limit import TokenBucket
+
+# Shared limiter so concurrent fetches stay within the per-minute quota; the daily
+# quota is counted in the cache database so it also holds across runs
+MINUTE_LIMITER = TokenBucket(API_CONSTANTS['REQUESTS_PER_MINUTE'], 60)
+
+_session = None
+_session_lock = threading.Lock()
+
+# Function Definitions
+def configure_session(pool_size=None, connect_timeout=None, read_timeout=None):
+    """
+    Override the HTTP session settings and rebuild the shared session.
+
+    Args:
+        pool_size (int, optional): Number of keep-alive connections to pool.
+        connect_timeout (float, optional): Seconds to wait for a connection.
+        read_timeout (float, optional): Seconds to wait for a response.
+    """
+    global _session
+    if pool_size is not None:
+        API_CONSTANTS['POOL_SIZE'] = pool_size
+    if connect_timeout is not None:
+        API_CONSTANTS['CONNECT_TIMEOUT'] = connect_timeout
+    if read_timeout is not None:
+        API_CONSTANTS['READ_TIMEOUT'] = read_timeout
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+def get_session():
+    """
+    Return the shared keep-alive session, creating it on first use.
+
+    Returns:
+        requests.Session: A session whose connection pool is reused across quotes.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            adapter = HTTPAdapter(
+                pool_connections=API_CONSTANTS['POOL_SIZE'],
+                pool_maxsize=API_CONSTANTS['POOL_SIZE'],
+            )
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+def get_backoff(attempt):
+    """
+    Compute a jittered exponential backoff delay.
+
+    Args:
+        attempt (int): Zero-based retry attempt.
+
+    Returns:
+        float: Seconds to sleep before the next attempt.
+    """
+    delay = min(API_CONSTANTS['BACKOFF_MAX_SECONDS'], API_CONSTANTS['BACKOFF_BASE_SECONDS'] * 2 ** attempt)
+    return random.uniform(delay / 2, delay)
+
+def request_json(url, params, label):
+    """
+    GET a JSON payload with timeouts, rate limiting and retries.
+
+    Network errors, HTTP errors and Alpha Vantage throttle payloads
+    ("Note"/"Information") are retried with jittered exponential backoff.
+    Requests refused by the daily quota are not sent and report the asset as unavailable.
+
+    Args:
+        url (str): The endpoint to call.
+        params (dict): Query parameters for the request.
+        label (str): Description of the request used in error messages.
+
+    Returns:
+        dict: The decoded payload, or None if every attempt failed.
+    """
+    error = None
+    for attempt in range(API_CONSTANTS['MAX_RETRIES'] + 1):
+        if attempt > 0:
+            time.sleep(get_backoff(attempt - 1))
+
+        if not try_consume_daily_request(API_CONSTANTS['REQUESTS_PER_DAY']):
+            print(f"Daily API quota reached. {label} is unavailable.")
+            return None
+        MINUTE_LIMITER.acquire()
+
+        try:
+            response = get_session().get(
+                url,
+                params=params,
+                timeout=(API_CONSTANTS['CONNECT_TIMEOUT'], API_CONSTANTS['READ_TIMEOUT']),
+            )
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as exc:
+            error = exc
+            continue
+
+        throttle_key = next((key for key in API_CONSTANTS['THROTTLE_KEYS'] if key in data), None)
+        if throttle_key is None:
+            return data
+        error = f"Throttled by Alpha Vantage: {data[throttle_key]}"
+
+    print(f"Error fetching {label} after {API_CONSTANTS['MAX_RETRIES'] + 1} attempts: {error}")
+    return None
\ No newline at end of file
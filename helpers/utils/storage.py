@@ -0,0 +1,275 @@
+import argparse, os, sys, tempfile
+from contextlib import contextmanager
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from helpers.utils.constants import FILE_PATHS
+from helpers.utils.schema import PORTFOLIO_SCHEMA, SchemaError, apply_schema, format_issues
+
+FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".feather": "feather",
+}
+
+# Function Definitions
+def get_format(path):
+    """
+    Determine the storage format from a file extension.
+
+    Args:
+        path (str): Path to the table.
+
+    Returns:
+        str: One of "csv", "parquet" or "feather".
+
+    Raises:
+        ValueError: If the extension is not a supported format.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported file format '{extension}'. Supported formats are: {', '.join(FORMATS)}.")
+    return FORMATS[extension]
+
+def check_issues(issues, source, errors="warn"):
+    """
+    Report schema issues found while loading a table.
+
+    Args:
+        issues (list): (row number, column, value, problem) tuples from `apply_schema`.
+        source (str): Name of the table in messages.
+        errors (str): "warn" prints the first few issues, "raise" raises, "ignore" does nothing.
+
+    Raises:
+        SchemaError: If `errors` is "raise" and there are issues.
+    """
+    if not issues or errors == "ignore":
+        return
+    if errors == "raise":
+        raise SchemaError(issues, source)
+    print(f"{len(issues)} invalid values in {source}; unreadable numbers and dates are loaded as missing, other values are kept:")
+    for line in format_issues(issues, limit=10):
+        print(f"  {line}")
+
+def _require_pyarrow(file_format):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as error:
+        raise ImportError(f"Reading or writing {file_format} files requires pyarrow (pip install pyarrow).") from error
+
+def read_table(path, schema=PORTFOLIO_SCHEMA, errors="warn"):
+    """
+    Load a table from CSV, Parquet or Feather and apply its schema.
+
+    Values that do not fit the schema are reported by row number (the line number for
+    CSV files). Numbers and dates that cannot be parsed are loaded as missing values;
+    values outside a column's allowed set are kept as they are.
+
+    Args:
+        path (str): Path to the table. The extension selects the format.
+        schema (dict, optional): Column types to apply. Pass None to skip casting.
+        errors (str): "warn", "raise" or "ignore" invalid values (see `check_issues`).
+
+    Returns:
+        pd.DataFrame: The loaded table.
+    """
+    file_format = get_format(path)
+    if file_format == "csv":
+        data = pd.read_csv(path, float_precision="round_trip")
+    elif file_format == "parquet":
+        _require_pyarrow(file_format)
+        data = pd.read_parquet(path)
+    else:
+        _require_pyarrow(file_format)
+        data = pd.read_feather(path)
+
+    if not schema:
+        return data
+    issues = []
+    data = apply_schema(data, schema, issues, first_row=2 if file_format == "csv" else 1)
+    check_issues(issues, path, errors)
+    return data
+
+def iter_table_chunks(path, chunk_size, schema=PORTFOLIO_SCHEMA, errors="warn", columns=None):
+    """
+    Read a CSV, Parquet or Feather table a chunk of rows at a time.
+
+    Args:
+        path (str): Path to the table. The extension selects the format.
+        chunk_size (int): Rows per chunk (Parquet and Feather yield at most this many per batch).
+        schema (dict, optional): Column types to apply to every chunk. Pass None to skip casting.
+        errors (str): "warn", "raise" or "ignore" invalid values, reported once at the end.
+        columns (list, optional): Only read these columns; ones missing from the table are ignored.
+
+    Yields:
+        pd.DataFrame: The next chunk.
+    """
+    file_format = get_format(path)
+    if file_format == "csv":
+        usecols = None if columns is None else (lambda column: column in columns)
+        chunks = pd.read_csv(path, float_precision="round_trip", chunksize=chunk_size, usecols=usecols)
+    else:
+        _require_pyarrow(file_format)
+        import pyarrow as pa, pyarrow.parquet as pq
+        if file_format == "parquet":
+            parquet_file = pq.ParquetFile(path)
+            if columns is not None:
+                columns = [column for column in parquet_file.schema_arrow.names if column in columns]
+            batches = parquet_file.iter_batches(batch_size=chunk_size, columns=columns)
+        else:
+            reader = pa.ipc.open_file(path)
+            if columns is not None:
+                columns = [column for column in reader.schema.names if column in columns]
+            batches = (
+                batch.slice(offset, chunk_size)
+                for batch in (reader.get_batch(index) for index in range(reader.num_record_batches))
+                for offset in range(0, max(batch.num_rows, 1), chunk_size)
+            )
+            if columns is not None:
+                batches = (batch.select(columns) for batch in batches)
+        chunks = (batch.to_pandas() for batch in batches)
+
+    issues, first_row = [], 2 if file_format == "csv" else 1
+    for chunk in chunks:
+        if schema:
+            chunk = apply_schema(chunk, schema, issues, first_row)
+            first_row += len(chunk)
+        yield chunk
+    check_issues(issues, path, errors)
+
+@contextmanager
+def atomic_write(path):
+    """
+    Yield a temporary path next to `path` and move it into place once writing succeeds.
+
+    Readers never see a partially written file: the final `os.replace` is atomic,
+    and the temporary file is removed if writing fails.
+
+    Args:
+        path (str): Destination path.
+
+    Yields:
+        str: Temporary path to write to.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(path)}.", suffix=os.path.splitext(path)[1]
+    )
+    os.close(handle)
+    try:
+        yield temp_path
+        # mkstemp creates files readable only by the owner; match a normally created file
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_path, 0o666 & ~umask)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def write_table(data, path, schema=PORTFOLIO_SCHEMA):
+    """
+    Apply a schema and atomically write a table as CSV, Parquet or Feather.
+
+    Args:
+        data (pd.DataFrame): The table to write.
+        path (str): Destination path. The extension selects the format.
+        schema (dict, optional): Column types to apply. Pass None to skip casting.
+    """
+    file_format = get_format(path)
+    if schema:
+        data = apply_schema(data, schema)
+
+    with atomic_write(path) as temp_path:
+        if file_format == "csv":
+            data.to_csv(temp_path, index=False)
+        elif file_format == "parquet":
+            _require_pyarrow(file_format)
+            data.to_parquet(temp_path, index=False)
+        else:
+            _require_pyarrow(file_format)
+            data.reset_index(drop=True).to_feather(temp_path)
+
+def _stream_type(arrow_type, file_format, pa):
+    """
+    The type a column is written with when a table is written in chunks.
+
+    Columns that are empty in the first chunk are stored as strings. Categorical columns
+    can gain categories in later chunks: Parquet stores a dictionary per row group, while
+    a Feather file holds a single dictionary, so there they are stored as plain strings.
+    """
+    if pa.types.is_null(arrow_type):
+        return pa.string()
+    if pa.types.is_dictionary(arrow_type):
+        return pa.dictionary(pa.int32(), pa.string()) if file_format == "parquet" else pa.string()
+    return arrow_type
+
+def write_table_chunks(chunks, path, schema=PORTFOLIO_SCHEMA):
+    """
+    Atomically write a stream of tables to CSV, Parquet or Feather one chunk at a time.
+
+    Only the current chunk is held in memory. CSV chunks are appended under a single
+    header; Parquet row groups and Feather record batches are written as they arrive.
+
+    Args:
+        chunks (iterable): DataFrames with the same columns, e.g. from a generator.
+        path (str): Destination path. The extension selects the format.
+        schema (dict, optional): Column types to apply to every chunk. Pass None to skip casting.
+
+    Returns:
+        int: Number of rows written.
+    """
+    file_format = get_format(path)
+    if file_format != "csv":
+        _require_pyarrow(file_format)
+        import pyarrow as pa, pyarrow.parquet as pq
+
+    rows, writer, arrow_schema = 0, None, None
+    with atomic_write(path) as temp_path:
+        try:
+            for chunk in chunks:
+                if schema:
+                    chunk = apply_schema(chunk, schema)
+                if file_format == "csv":
+                    header = writer is None
+                    writer = writer or open(temp_path, "w", newline="")
+                    chunk.to_csv(writer, header=header, index=False)
+                else:
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    if writer is None:
+                        arrow_schema = pa.schema([
+                            field.with_type(_stream_type(field.type, file_format, pa)) for field in table.schema
+                        ])
+                        writer = (
+                            pq.ParquetWriter(temp_path, arrow_schema) if file_format == "parquet"
+                            else pa.ipc.new_file(temp_path, arrow_schema)
+                        )
+                    writer.write_table(table.cast(arrow_schema))
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+    return rows
+
+def export_csv(path, csv_path=None):
+    """
+    Export a stored table to CSV.
+
+    Args:
+        path (str): Path to the stored table.
+        csv_path (str, optional): Destination CSV. Defaults to `path` with a .csv extension.
+    """
+    csv_path = csv_path or f"{os.path.splitext(path)[0]}.csv"
+    if os.path.abspath(csv_path) == os.path.abspath(path):
+        print(f"{path} is already a CSV file.")
+        return
+
+    write_table(read_table(path, schema=None), csv_path, schema=None)
+    print(f"Exported {path} to {csv_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a stored portfolio table to CSV")
+    parser.add_argument("path", nargs="?", default=FILE_PATHS['PORTFOLIO_OUTPUT'], help="Table to export")
+    parser.add_argument("--output", default=None, help="Destination CSV path")
+    args = parser.parse_args()
+    export_csv(args.path, args.output)
@@ -1,4 +1,5 @@
 from dash import html, dcc
+from helpers.utils.constants import PAGES
 
 # Function Definitions
 def configure_pie_traces(figure, values, show_dollar=True):
@@ -133,7 +134,7 @@ def get_layout():
         ]
     )
 
-def generate_main_content(theme):
+def generate_main_content(theme, show_dollar=True):
     theme_colors = get_colors(theme)
     style = {
         **STYLES['DEFAULT'],
@@ -151,7 +152,8 @@ def generate_main_content(theme):
                     html.Label(id="feature_flag_label", style={"fontSize": "16px", "fontWeight": "bold"}),
                     html.Button(
                         id="feature_flag_button",
-                        n_clicks=0,
+                        # Odd click counts hide the balance, so the menu keeps the current setting when rebuilt
+                        n_clicks=0 if show_dollar else 1,
                         children="Show",
                         style={"margin": "10px"},
                     ),
@@ -167,6 +169,8 @@ def generate_main_content(theme):
                         options=[
                             {"label": "New", "value": "calculate_portfolio_new"},
                             {"label": "Update", "value": "calculate_portfolio_update"},
+                            {"label": "Update (Stale Only)", "value": "calculate_portfolio_refresh"},
+                            {"label": "Batch (input/portfolios)", "value": "calculate_portfolio_batch"},
                         ],
                         placeholder="Select Mode",
                         style={"width": "50%", "margin": "0 auto", "color": DEFAULT_COLORS["bold"]},
@@ -183,21 +187,29 @@ def generate_main_content(theme):
             # Script Buttons for Other Functions
             html.Div(
                 [
+                    dcc.Link(
+                        html.Button("Visualize Portfolio", id="visualize_portfolio", style={"margin": "10px"}),
+                        href=PAGES['visualize_portfolio'],
+                    ),
+                    dcc.Link(
+                        html.Button("Visualize Budget", id="visualize_budget", style={"margin": "10px"}),
+                        href=PAGES['visualize_budget'],
+                    ),
                     html.Button(
-                        "Visualize Portfolio",
-                        id="visualize_portfolio",
+                        "Convert Fidelity",
+                        id="convert_fidelity",
                         n_clicks=0,
                         style={"margin": "10px"},
                     ),
                     html.Button(
-                        "Visualize Budget",
-                        id="visualize_budget",
+                        "Import Fidelity Activity",
+                        id="convert_fidelity_activity",
                         n_clicks=0,
                         style={"margin": "10px"},
                     ),
                     html.Button(
-                        "Convert Fidelity",
-                        id="convert_fidelity",
+                        "Ingest Drop Folder",
+                        id="ingest_exports",
                         n_clicks=0,
                         style={"margin": "10px"},
                     ),
@@ -207,6 +219,36 @@ def generate_main_content(theme):
                         n_clicks=0,
                         style={"margin": "10px"},
                     ),
+                    html.Button(
+                        "Calculate Risk",
+                        id="calculate_risk",
+                        n_clicks=0,
+                        style={"margin": "10px"},
+                    ),
+                    html.Button(
+                        "Rebalance",
+                        id="calculate_rebalance",
+                        n_clicks=0,
+                        style={"margin": "10px"},
+                    ),
+                    html.Button(
+                        "Calculate Budget",
+                        id="calculate_budget",
+                        n_clicks=0,
+                        style={"margin": "10px"},
+                    ),
+                    html.Button(
+                        "Forecast Budget",
+                        id="calculate_forecast",
+                        n_clicks=0,
+                        style={"margin": "10px"},
+                    ),
+                    html.Button(
+                        "Categorize Transactions",
+                        id="categorize_transactions",
+                        n_clicks=0,
+                        style={"margin": "10px"},
+                    ),
                 ],
                 style={"textAlign": "center", "marginBottom": "20px"},
             ),
@@ -1,9 +1,11 @@
 import os, sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from dash import Dash, html, dcc, Input, Output, State, callback_context
-from helpers.utils.constants import PORTS, FUNCTIONS
+from helpers.utils.constants import FILE_PATHS, PAGES, PORTS, FUNCTIONS
 from helpers.utils.helpers import parse_args, kill_port, open_browser, run_function
 from helpers.utils.styling import STYLES, STYLE_CONFIG, THEMES, get_colors, set_current_theme, generate_main_content
+from visualize.visualize_budget import create_budget_layout, load_cash_flow
+from visualize.visualize_portfolio import create_portfolio_layout
 from threading import Timer
 
 def main():
@@ -39,11 +41,38 @@ def main():
                 html.Div(
                     id="main_content",
                     style={"padding": "20px"},
-                    children=generate_main_content(current_theme),
+                    children=generate_main_content(current_theme, SHOW_DOLLAR),
                 ),
             ],
         )
 
+    @app.callback(
+        Output("page_content", "children"),
+        Input("url", "pathname"),
+    )
+    def display_page(pathname):
+        """
+        Build the page for a URL path: a dashboard, or the main menu for any other path.
+
+        Dashboards are built in this process from the current data, theme and balance
+        setting, so switching between them does not start a new server. Pages only read
+        the saved outputs; prices are refreshed with the Update and Refresh actions.
+        """
+        try:
+            if pathname == PAGES['visualize_portfolio']:
+                page = create_portfolio_layout(FILE_PATHS['PORTFOLIO_OUTPUT'], SHOW_DOLLAR)
+            elif pathname == PAGES['visualize_budget']:
+                page = create_budget_layout(*load_cash_flow(), show_dollar=SHOW_DOLLAR)
+            else:
+                return get_layout()
+        # Missing files, unreadable tables and files without an expected column
+        except (OSError, ValueError, KeyError) as error:
+            page = html.H2(f"Could not load the dashboard: {type(error).__name__}: {error}", style=STYLES['H2'])
+        return html.Div(style=STYLES['DEFAULT'], children=[
+            dcc.Link("Main Menu", href="/", style={"color": STYLES['DEFAULT']["color"]}),
+            page,
+        ])
+
     @app.callback(
         [Output("feature_flag_label", "children"), Output("feature_flag_button", "children")],
         Input("feature_flag_button", "n_clicks"),
@@ -58,15 +87,21 @@ def main():
         Output("output", "children"),
         [
             Input("run_calculate_portfolio", "n_clicks"),
-            Input("visualize_portfolio", "n_clicks"),
-            Input("visualize_budget", "n_clicks"),
             Input("convert_fidelity", "n_clicks"),
+            Input("convert_fidelity_activity", "n_clicks"),
+            Input("ingest_exports", "n_clicks"),
             Input("merge_portfolios", "n_clicks"),
+            Input("calculate_risk", "n_clicks"),
+            Input("calculate_rebalance", "n_clicks"),
+            Input("calculate_budget", "n_clicks"),
+            Input("calculate_forecast", "n_clicks"),
+            Input("categorize_transactions", "n_clicks"),
         ],
         [State("calculate_portfolio_dropdown", "value"), State("theme_dropdown", "value")],
     )
     def handle_button_click(
-        calc_port_click, vis_port_click, vis_budget_click, convert_click, merge_click,
+        calc_port_click, convert_click, activity_click, ingest_click, merge_click, risk_click, rebalance_click,
+        budget_click, forecast_click, categorize_click,
         calc_port_mode, selected_theme
     ):
         triggered = callback_context.triggered
@@ -95,7 +130,8 @@ def main():
 
         return f"Running: {os.path.splitext(os.path.basename(script_name))[0].replace('_', ' ').title()}"
     
-    app.layout = get_layout()
+    # Pages are rendered into page_content from the URL; "/" is the main menu
+    app.layout = html.Div([dcc.Location(id="url", refresh=False), html.Div(id="page_content")])
     @app.callback(
         Output("theme_dropdown", "value"),
         Input("theme_dropdown", "value"),
@@ -115,7 +151,7 @@ def main():
         if callback_context.triggered and "theme_dropdown" in callback_context.triggered[0]["prop_id"]:
             current_theme = selected_theme
             set_current_theme(selected_theme)
-        return generate_main_content(selected_theme)
+        return generate_main_content(selected_theme, SHOW_DOLLAR)
 
     Timer(1, open_browser, args=[PORTS['PORT_MAIN']]).start()
     app.run_server(debug=True, use_reloader=False, port=PORTS['PORT_MAIN'])
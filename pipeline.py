@@ -0,0 +1,346 @@
+import argparse, hashlib, json, os, shutil, subprocess, sys, time
+from helpers.utils.constants import FILE_PATHS, PIPELINE_CONSTANTS, UPDATE_CONSTANTS
+from helpers.utils.storage import atomic_write
+
+ROOT = os.path.abspath(os.path.dirname(__file__))
+# Bumped when the manifest layout changes; older manifests are ignored
+MANIFEST_VERSION = 1
+
+# Stage functions import their modules lazily, so a skipped stage costs no imports
+def _convert_fidelity(stage):
+    from helpers.conversions.convert_fidelity import convert_fidelity
+    convert_fidelity(stage['inputs'][0], stage['outputs'][0])
+
+def _merge_portfolios(stage):
+    from helpers.conversions.merge_portfolios import merge_portfolios
+    merge_portfolios(stage['inputs'], stage['outputs'][0], keep_lots=stage['params']['keep_lots'])
+
+def _calculate_portfolio(stage):
+    from calculate.calculate_portfolio import calculate_portfolio
+    calculate_portfolio(stage['inputs'][0], stage['outputs'][0], positions_file=stage['outputs'][1])
+
+def _update_prices(stage):
+    from calculate.update import update_portfolio_prices
+    update_portfolio_prices(stage['outputs'][0], stale_after=stage['params']['stale_after'])
+
+def _visualize_portfolio(stage, extra_args=()):
+    subprocess.call([sys.executable, os.path.join(ROOT, "visualize/visualize_portfolio.py"), *extra_args])
+
+def get_stages(now=None, source=None):
+    """
+    The portfolio workflow as a DAG of stages, in dependency order.
+
+    Each stage declares the files it reads and writes, the parameters that change its
+    result, and the source files of its code. Inputs that do not exist when the stage runs
+    are left out, so the merge stage combines whichever of the Fidelity and crypto
+    portfolios exist; a stage with no existing inputs is skipped.
+
+    The manual `portfolio_input.csv` is an alternative to that merge, not a third input:
+    with `source="manual"` the portfolio is calculated from it alone.
+
+    Args:
+        now (float, optional): Current time in seconds, for the price update window. Defaults to now.
+        source (str, optional): "merged" or "manual". Defaults to PIPELINE_CONSTANTS['SOURCE'].
+
+    Returns:
+        dict: Stage name -> dict with deps, inputs, outputs, params, code, run and
+              `always` (run every time and never recorded, e.g. a dashboard).
+    """
+    now = time.time() if now is None else now
+    stale_after = UPDATE_CONSTANTS['STALE_AFTER_MINUTES']
+    source = source or PIPELINE_CONSTANTS['SOURCE']
+    if source not in ["merged", "manual"]:
+        raise ValueError(f"Unknown portfolio source '{source}'. Use 'merged' or 'manual'.")
+    merged = FILE_PATHS['PIPELINE_MERGED']
+    merge_inputs = [FILE_PATHS['FIDELITY_OUTPUT'], FILE_PATHS['CRYPTO']]
+    common = ["helpers/utils/constants.py", "helpers/utils/schema.py", "helpers/utils/storage.py"]
+    # Quote fetching, caching and the history snapshot, used by every stage that prices
+    pricing = [
+        "helpers/utils/api.py", "helpers/utils/cache.py", "helpers/utils/history.py",
+        "helpers/utils/providers.py", "helpers/utils/rate_limit.py", "helpers/utils/session.py",
+    ]
+    stages = {
+        "convert_fidelity": {
+            "deps": [],
+            "inputs": [FILE_PATHS['FIDELITY_INPUT']],
+            "outputs": [FILE_PATHS['FIDELITY_OUTPUT']],
+            "params": {},
+            "code": [*common, "helpers/conversions/convert_fidelity.py"],
+            "run": _convert_fidelity,
+        },
+        "merge_portfolios": {
+            "deps": ["convert_fidelity"],
+            "inputs": merge_inputs,
+            "outputs": [merged],
+            "params": {"keep_lots": True},
+            "code": [*common, "helpers/conversions/merge_portfolios.py"],
+            "run": _merge_portfolios,
+        },
+        "calculate_portfolio": {
+            "deps": ["merge_portfolios"] if source == "merged" else [],
+            "inputs": [merged] if source == "merged" else [FILE_PATHS['PORTFOLIO_INPUT']],
+            "outputs": [FILE_PATHS['PORTFOLIO_OUTPUT'], FILE_PATHS['POSITIONS_OUTPUT']],
+            "params": {},
+            "code": [*common, *pricing, "calculate/calculate_portfolio.py", "calculate/calculate_lots.py"],
+            "run": _calculate_portfolio,
+        },
+        # Reprices the calculated portfolio in place, at most once per staleness window
+        "update_prices": {
+            "deps": ["calculate_portfolio"],
+            "inputs": [FILE_PATHS['PORTFOLIO_OUTPUT']],
+            "outputs": [FILE_PATHS['PORTFOLIO_OUTPUT']],
+            "params": {"stale_after": stale_after, "window": int(now // (stale_after * 60))},
+            "code": [*common, *pricing, "calculate/update.py"],
+            "run": _update_prices,
+        },
+        "visualize_portfolio": {
+            "deps": ["update_prices"],
+            "inputs": [FILE_PATHS['PORTFOLIO_OUTPUT']],
+            "outputs": [],
+            "params": {},
+            "code": [],
+            "run": _visualize_portfolio,
+            "always": True,
+        },
+    }
+    for stage in stages.values():
+        stage.setdefault("always", False)
+    return stages
+
+def get_plan(stages, target):
+    """
+    The stages needed to build `target`, dependencies first.
+
+    Raises:
+        ValueError: If the target is unknown or the stages form a cycle.
+    """
+    if target not in stages:
+        raise ValueError(f"Unknown stage '{target}'. Available stages are: {', '.join(stages)}.")
+    plan, visiting = [], set()
+
+    def visit(name):
+        if name in plan:
+            return
+        if name in visiting:
+            raise ValueError(f"Pipeline stages form a cycle at '{name}'.")
+        visiting.add(name)
+        for dep in stages[name]['deps']:
+            visit(dep)
+        visiting.discard(name)
+        plan.append(name)
+
+    visit(target)
+    return plan
+
+def load_manifest(path=None):
+    """Load the pipeline manifest, or an empty one if it is missing or from another version."""
+    path = path or FILE_PATHS['PIPELINE_MANIFEST']
+    try:
+        with open(path, "r") as infile:
+            manifest = json.load(infile)
+    except (OSError, ValueError):
+        manifest = {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        manifest = {"version": MANIFEST_VERSION, "files": {}, "outputs": {}, "stages": {}}
+    return manifest
+
+def save_manifest(manifest, path=None):
+    """Atomically write the pipeline manifest."""
+    path = path or FILE_PATHS['PIPELINE_MANIFEST']
+    with atomic_write(path) as temp_path:
+        with open(temp_path, "w") as outfile:
+            json.dump(manifest, outfile, indent=2, sort_keys=True)
+
+def hash_file(path, manifest):
+    """
+    Content hash of a file, or None if it does not exist.
+
+    Hashes are remembered with the file's size and modification time, so an unchanged
+    file is not read again.
+
+    Args:
+        path (str): Path to the file.
+        manifest (dict): Pipeline manifest; its `files` entry is updated.
+
+    Returns:
+        str: The SHA-256 hex digest.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    known = manifest['files'].get(path)
+    if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+        return known['sha256']
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as infile:
+        for block in iter(lambda: infile.read(1 << 20), b""):
+            digest.update(block)
+    manifest['files'][path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+    return digest.hexdigest()
+
+def stage_key(name, stage, manifest, dep_keys):
+    """
+    Hash everything that determines a stage's outputs.
+
+    The key covers the stage's parameters, the contents of its code and of its inputs,
+    and the keys of the stages it depends on. Files the stage rewrites in place are not
+    part of its own key.
+    """
+    inputs = [path for path in stage['inputs'] if path not in stage['outputs']]
+    payload = {
+        "stage": name,
+        "params": stage['params'],
+        "code": {path: hash_file(os.path.join(ROOT, path), manifest) for path in stage['code']},
+        "inputs": {path: hash_file(path, manifest) for path in inputs},
+        "deps": [dep_keys.get(dep) for dep in stage['deps']],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def is_current(stage, manifest, key, name):
+    """A stage is current when its key is unchanged and its outputs are as the pipeline last left them."""
+    return (
+        manifest['stages'].get(name, {}).get('key') == key
+        and all(hash_file(path, manifest) == manifest['outputs'].get(path) for path in stage['outputs'])
+    )
+
+def edited_outputs(stage, manifest):
+    """Outputs that exist but differ from what the pipeline last recorded, i.e. were rewritten outside it."""
+    return [
+        path for path in stage['outputs']
+        if os.path.exists(path) and hash_file(path, manifest) != manifest['outputs'].get(path)
+    ]
+
+def _cache_dir(name, key):
+    return os.path.join(FILE_PATHS['PIPELINE_CACHE'], name, key[:16])
+
+def restore_outputs(stage, name, key):
+    """Copy a stage's outputs back from the cache of an earlier run with the same key, if present."""
+    directory = _cache_dir(name, key)
+    cached = [os.path.join(directory, str(index)) for index in range(len(stage['outputs']))]
+    if not stage['outputs'] or not all(os.path.exists(path) for path in cached):
+        return False
+    for source, path in zip(cached, stage['outputs']):
+        with atomic_write(path) as temp_path:
+            shutil.copyfile(source, temp_path)
+    return True
+
+def store_outputs(stage, name, key):
+    """Keep a copy of a stage's outputs under its key, dropping the oldest copies past CACHE_ENTRIES."""
+    directory = _cache_dir(name, key)
+    os.makedirs(directory, exist_ok=True)
+    for index, path in enumerate(stage['outputs']):
+        shutil.copyfile(path, os.path.join(directory, str(index)))
+    os.utime(directory)
+
+    stage_dir = os.path.dirname(directory)
+    entries = sorted(
+        (os.path.join(stage_dir, entry) for entry in os.listdir(stage_dir)), key=os.path.getmtime, reverse=True
+    )
+    for entry in entries[PIPELINE_CONSTANTS['CACHE_ENTRIES']:]:
+        shutil.rmtree(entry, ignore_errors=True)
+
+def run_pipeline(target, force=(), dry_run=False, extra_args=(), now=None, source=None):
+    """
+    Run the stages needed for `target`, skipping every stage whose inputs are unchanged.
+
+    A stage runs when its key (see `stage_key`) differs from the last recorded run or when
+    one of its outputs is missing. If an earlier run with the same key is still cached, its
+    outputs are restored instead of recomputed. Outputs rewritten outside the pipeline (for
+    example by `calculate/update.py`) are never restored over: with an unchanged key they
+    are kept and recorded, so later stages build on them, and otherwise the stage reruns.
+    Stages whose inputs do not exist are skipped. Prices are fetched when the portfolio is calculated and refreshed
+    by the update stage once per `UPDATE_CONSTANTS['STALE_AFTER_MINUTES']`.
+
+    Args:
+        target (str): Stage to build, e.g. "calculate_portfolio" or "visualize_portfolio".
+        force (iterable): Stage names to run even if current; "all" forces every stage.
+        dry_run (bool): Only print what would run.
+        extra_args (iterable): Command-line arguments passed on to dashboard stages.
+        now (float, optional): Current time in seconds. Defaults to now.
+        source (str, optional): "merged" or "manual" portfolio source (see `get_stages`).
+
+    Returns:
+        dict: Stage name -> "ran", "restored", "kept", "skipped", "no input", "failed" or "would run".
+    """
+    stages = get_stages(now, source)
+    plan = get_plan(stages, target)
+    manifest = load_manifest()
+    force = set(stages) if "all" in force else set(force)
+    keys, results = {}, {}
+
+    for name in plan:
+        stage = stages[name]
+        if any(results.get(dep) == "failed" for dep in stage['deps']):
+            results[name] = "failed"
+            print(f"{name}: not run because a dependency failed")
+            continue
+        stage['inputs'] = [path for path in stage['inputs'] if os.path.exists(path)]
+        if not stage['inputs'] and not dry_run:
+            results[name] = "no input"
+            print(f"{name}: skipped, no input files")
+            continue
+        if stage['always']:
+            results[name] = "would run" if dry_run else "ran"
+            print(f"{name}: {'would run' if dry_run else 'running'}")
+            if not dry_run:
+                save_manifest(manifest)
+                stage['run'](stage, list(extra_args))
+            continue
+
+        key = stage_key(name, stage, manifest, keys)
+        keys[name] = key
+        edited = edited_outputs(stage, manifest)
+        if name not in force and edited and manifest['stages'].get(name, {}).get('key') == key:
+            results[name] = "kept"
+            print(f"{name}: keeping {', '.join(edited)} as changed outside the pipeline (--force {name} recomputes)")
+            if not dry_run:
+                for path in edited:
+                    manifest['outputs'][path] = hash_file(path, manifest)
+                save_manifest(manifest)
+            continue
+        if name not in force and is_current(stage, manifest, key, name):
+            results[name] = "skipped"
+            print(f"{name}: up to date")
+            continue
+        if dry_run:
+            results[name] = "would run"
+            print(f"{name}: would run")
+            continue
+
+        start = time.perf_counter()
+        in_place = bool(set(stage['outputs']) & set(stage['inputs']))
+        if name not in force and not in_place and not edited and restore_outputs(stage, name, key):
+            results[name] = "restored"
+        else:
+            try:
+                stage['run'](stage)
+            except Exception as error:
+                results[name] = "failed"
+                print(f"{name}: failed: {type(error).__name__}: {error}")
+                continue
+            results[name] = "ran"
+            if PIPELINE_CONSTANTS['CACHE_ENTRIES'] > 0 and not in_place and all(map(os.path.exists, stage['outputs'])):
+                store_outputs(stage, name, key)
+
+        # Record what this run produced so later runs can tell outside edits from our own
+        manifest['stages'][name] = {"key": key, "seconds": round(time.perf_counter() - start, 3)}
+        for path in stage['outputs']:
+            manifest['outputs'][path] = hash_file(path, manifest)
+        save_manifest(manifest)
+        print(f"{name}: {results[name]} in {time.perf_counter() - start:.2f}s")
+
+    if not dry_run:
+        save_manifest(manifest)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the portfolio workflow, skipping unchanged stages")
+    parser.add_argument("--target", default="calculate_portfolio", help="Stage to build")
+    parser.add_argument("--force", nargs="*", default=[], help="Stages to run even if current, or 'all'")
+    parser.add_argument("--dry-run", action="store_true", help="Only show which stages would run")
+    parser.add_argument("--source", choices=["merged", "manual"], default=None,
+                        help="Calculate from the Fidelity + crypto merge or from input/portfolio_input.csv alone")
+    args, extra_args = parser.parse_known_args()
+    run_pipeline(args.target, force=args.force, dry_run=args.dry_run, extra_args=extra_args, source=args.source)
@@ -0,0 +1,37 @@
+import os, sys
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from calculate.calculate_lots import match_lots
+from helpers.conversions.convert_fidelity_activity import replay_lots
+
+def make_events(rows):
+    return pd.DataFrame(rows, columns=["Account", "Ticker", "Date", "Kind", "Quantity", "Amount"]).assign(
+        Date=lambda df: pd.to_datetime(df['Date'])
+    )
+
+def test_match_lots_without_lots_returns_no_matches():
+    lot_index, sale_index, shares = match_lots(
+        np.array([], dtype=int), np.array([], dtype=float), np.array([], dtype=float),
+        np.array([0, 1]), np.array([5.0, 2.0])
+    )
+    assert len(lot_index) == len(sale_index) == len(shares) == 0
+
+def test_match_lots_group_with_sales_but_no_lots():
+    lot_index, sale_index, shares = match_lots(
+        np.array([0]), np.array([0.0]), np.array([10.0]),
+        np.array([0, 1]), np.array([4.0, 3.0])
+    )
+    assert lot_index.tolist() == [0]
+    assert sale_index.tolist() == [0]
+    assert shares.tolist() == [4.0]
+
+def test_replay_only_sales_export():
+    events = make_events([
+        ["X1", "AAPL", "2024-01-02", "sell", 5.0, 900.0],
+        ["X1", "MSFT", "2024-02-01", "sell", 2.0, 800.0],
+    ])
+    open_lots, realized, shortfall = replay_lots(events)
+    assert open_lots.empty
+    assert realized.empty
+    assert shortfall.to_dict() == {("X1", "AAPL"): 5.0, ("X1", "MSFT"): 2.0}
@@ -3,8 +3,12 @@ import pandas as pd
 import plotly.express as px, plotly.graph_objects as go
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from dash import Dash, dcc, html
-from helpers.utils.constants import FILE_PATHS, PORTS
+from calculate.calculate_budget import get_cash_flow, load_budget
+from calculate.calculate_forecast import load_forecast
+from helpers.utils.constants import BUDGET_CONSTANTS, FILE_PATHS, PORTS
 from helpers.utils.helpers import parse_args, kill_port, open_browser
+from helpers.utils.schema import CASH_FLOW_SCHEMA, as_text
+from helpers.utils.storage import read_table
 from helpers.utils.styling import (
     COLOR_SCHEMES,
     STYLES,
@@ -13,74 +17,228 @@ from helpers.utils.styling import (
 )
 from threading import Timer
 
-def visualize_budget(data_file):
+def load_cash_flow():
     """
-    Generate and display budget visualizations using Dash.
+    Load the data the budget dashboard shows.
+
+    With a transaction ledger the dashboard reads the precomputed rollups from
+    `calculate_budget.py` and the monthly trend from `calculate_forecast.py` (both
+    updated when the ledger changes) and shows the latest period; otherwise it reads
+    the Source/Category/Amount file directly.
+
+    Returns:
+        tuple: (Source/Category/Amount rows, period summary or None, monthly trend or None)
+    """
+    if os.path.exists(FILE_PATHS['LEDGER']):
+        rollups, summary = load_budget(FILE_PATHS['LEDGER'], FILE_PATHS['BUDGET_OUTPUT'], FILE_PATHS['BUDGET_SUMMARY'])
+        summary = summary[summary['Frequency'] == BUDGET_CONSTANTS['DASHBOARD_PERIOD']]
+        return get_cash_flow(rollups), summary, load_forecast(FILE_PATHS['LEDGER'])
+
+    # Categories are lower-cased by the schema
+    return read_table(FILE_PATHS['CASH_FLOW'], CASH_FLOW_SCHEMA), None, None
+
+def bucket_top(labels, amounts, top_n, other):
+    """
+    Keep the labels with the largest totals and relabel the rest as one `other` bucket.
 
     Args:
-        data_file (str): Path to the CSV file containing budget data.
+        labels (pd.Series): Label of each row.
+        amounts (pd.Series): Amount of each row.
+        top_n (int): Labels to keep. None or 0 keeps them all.
+        other (str): Label for the rest.
+
+    Returns:
+        pd.Series: The labels, with those outside the top `top_n` replaced by `other`.
     """
-    # Free the port for the budget visualization
-    kill_port(PORTS['PORT_BUDGET'])
+    totals = amounts.groupby(labels, sort=False).sum()
+    if not top_n or len(totals) <= top_n:
+        return labels
+    return labels.where(labels.isin(totals.nlargest(top_n).index), other)
+
+def build_sankey(data, top_n=None, merchants=False):
+    """
+    Build the nodes and links of the cash flow Sankey diagram.
 
-    # Load budget data
-    data = pd.read_csv(data_file)
+    Income sources flow into a Budget node, which flows out to expense sources and
+    Savings. Rows are summed per node pair before any link is made, so the diagram has
+    one link per pair however many transactions there are, and nodes are numbered with
+    a hash-based factorize rather than list searches.
 
-    # Split data into income and expenses
-    income_data = data[data["Category"].str.lower() == "income"].sort_values(by="Amount", ascending=False)
-    expenses_data = data[data["Category"].str.lower() == "expenses"].sort_values(by="Amount", ascending=False)
+    Args:
+        data (pd.DataFrame): Source, Category and Amount rows, optionally with Merchant.
+        top_n (int, optional): Largest income sources, expense sources and merchants to
+            show; the rest are combined into "Other Income", "Other Expenses" and
+            "Other Merchants". None shows them all.
+        merchants (bool): Add a second level from each expense source to its merchants.
+
+    Returns:
+        tuple: (node labels, links DataFrame with source, target, value and color columns)
+    """
+    merchant = data['Merchant'] if 'Merchant' in data else pd.Series(None, index=data.index, dtype=object)
+    flows = (
+        data.assign(Category=as_text(data['Category']), Source=as_text(data['Source']), Merchant=as_text(merchant))
+        .groupby(['Category', 'Source', 'Merchant'], sort=False)['Amount'].sum()
+        .reset_index()
+    )
+    income = flows[flows['Category'] == "income"]
+    expenses = flows[flows['Category'] == "expenses"]
+    expense_source = bucket_top(expenses['Source'], expenses['Amount'], top_n, "Other Expenses")
+
+    # Node keys carry their level so a source and a merchant with the same name stay apart
+    parts = [
+        pd.DataFrame({
+            "source": "income:" + bucket_top(income['Source'], income['Amount'], top_n, "Other Income"),
+            "target": "budget:Budget",
+            "value": income['Amount'],
+        }),
+        pd.DataFrame({"source": "budget:Budget", "target": "expense:" + expense_source, "value": expenses['Amount']}),
+    ]
+    savings = income['Amount'].sum() - expenses['Amount'].sum()
+    if savings > 0:
+        parts.append(pd.DataFrame({"source": ["budget:Budget"], "target": ["savings:Savings"], "value": [savings]}))
+    if merchants:
+        itemized = expenses['Merchant'] != ""
+        parts.append(pd.DataFrame({
+            "source": "expense:" + expense_source[itemized],
+            "target": "merchant:" + bucket_top(
+                expenses.loc[itemized, 'Merchant'], expenses.loc[itemized, 'Amount'], top_n, "Other Merchants"
+            ),
+            "value": expenses.loc[itemized, 'Amount'],
+        }))
+
+    links = pd.concat(parts, ignore_index=True).groupby(['source', 'target'], sort=False)['value'].sum().reset_index()
+    codes, keys = pd.factorize(pd.concat([links['source'], links['target']], ignore_index=True))
+    is_budget, is_savings = links['source'] == "budget:Budget", links['target'] == "savings:Savings"
+    links['source'], links['target'] = codes[:len(links)], codes[len(links):]
+
+    # Each link takes the color of the node on its far side from Budget
+    palette = COLOR_SCHEMES['PIE']
+    links['color'] = [palette[node % len(palette)] for node in links['target'].where(is_budget, links['source'])]
+    links.loc[is_savings, 'color'] = "#197"  # Custom savings color
+    return keys.str.split(":", n=1).str[1].tolist(), links
+
+def create_savings_chart(summary, show_dollar=True):
+    """
+    Income and expenses per period with the savings rate on a second axis.
+
+    Args:
+        summary (pd.DataFrame): Rows of one frequency from `compute_summary`.
+        show_dollar (bool): Show amounts; the savings rate is shown either way.
+
+    Returns:
+        go.Figure: The chart.
+    """
+    # Amounts are hidden along with the balance; the savings rate is always shown
+    hoverinfo = "all" if show_dollar else "x+name"
+    figure = go.Figure([
+        go.Bar(
+            x=summary["Period"], y=summary["Income"], name="Income", hoverinfo=hoverinfo,
+            marker_color=COLOR_SCHEMES['CONTRIBUTION']['investment']
+        ),
+        go.Bar(
+            x=summary["Period"], y=summary["Expenses"], name="Expenses", hoverinfo=hoverinfo,
+            marker_color=COLOR_SCHEMES['CONTRIBUTION']['current_value']
+        ),
+        go.Scatter(
+            x=summary["Period"], y=summary["Savings Rate (%)"], name="Savings Rate", yaxis="y2",
+            mode="lines+markers", line=dict(color=STYLES['DEFAULT']["color"])
+        ),
+    ])
+    return figure.update_layout(
+        barmode="group",
+        height=450,
+        paper_bgcolor=STYLES['TABLE']["backgroundColor"],
+        plot_bgcolor=STYLES['TABLE']["backgroundColor"],
+        font=dict(family=STYLES['DEFAULT']["fontFamily"], color=STYLES['DEFAULT']["color"]),
+        yaxis=dict(title="Amount", visible=show_dollar),
+        yaxis2=dict(title="Savings Rate (%)", overlaying="y", side="right", ticksuffix="%"),
+        legend=dict(orientation="h", y=1.1),
+    )
+
+def create_trend_chart(trend, show_dollar=True):
+    """
+    Monthly income and expenses with their rolling averages and the forecast months.
+
+    Args:
+        trend (pd.DataFrame): Output of `compute_trend`.
+        show_dollar (bool): Show amounts on hover and on the axis.
+
+    Returns:
+        go.Figure: The chart. The shortest rolling average is shown; the others can be
+                   switched on from the legend.
+    """
+    hoverinfo = "all" if show_dollar else "x+name"
+    colors = {
+        "income": COLOR_SCHEMES['CONTRIBUTION']['investment'],
+        "expenses": COLOR_SCHEMES['CONTRIBUTION']['current_value']
+    }
+    averages = [column for column in trend.columns if column.startswith("Avg ")]
+    traces = []
+    for category, rows in trend.groupby("Category", sort=False):
+        color = colors.get(category, STYLES['DEFAULT']["color"])
+        label = category.title()
+        traces.append(go.Scatter(
+            x=rows["Start"], y=rows["Actual"], name=label, hoverinfo=hoverinfo,
+            mode="lines+markers", line=dict(color=color)
+        ))
+        for column in averages:
+            traces.append(go.Scatter(
+                x=rows["Start"], y=rows[column], name=f"{label} {column}", hoverinfo=hoverinfo,
+                mode="lines", line=dict(color=color, dash="dot", width=1),
+                visible=True if column == averages[0] else "legendonly"
+            ))
+        # Start the forecast from the last actual month so the line is continuous
+        last_actual = rows.loc[rows["Actual"].notna(), "Start"].max()
+        forecast = rows["Forecast"].mask(rows["Start"] == last_actual, rows["Actual"])
+        traces.append(go.Scatter(
+            x=rows["Start"], y=forecast, name=f"{label} Forecast", hoverinfo=hoverinfo,
+            mode="lines", line=dict(color=color, dash="dash")
+        ))
+    return go.Figure(traces).update_layout(
+        height=450,
+        paper_bgcolor=STYLES['TABLE']["backgroundColor"],
+        plot_bgcolor=STYLES['TABLE']["backgroundColor"],
+        font=dict(family=STYLES['DEFAULT']["fontFamily"], color=STYLES['DEFAULT']["color"]),
+        xaxis=dict(title="Month"),
+        yaxis=dict(title="Amount", visible=show_dollar),
+        legend=dict(orientation="h", y=1.1),
+    )
+
+def create_budget_layout(data, summary=None, trend=None, show_dollar=True):
+    """
+    Build the budget dashboard layout.
+
+    Args:
+        data (pd.DataFrame): Source, Category and Amount rows to chart.
+        summary (pd.DataFrame, optional): Income, expenses and savings rate per period from
+            `calculate_budget.py`, shown as a Savings section when given.
+        trend (pd.DataFrame, optional): Monthly totals, rolling averages and forecast from
+            `calculate_forecast.py`, shown as a Trend section when given.
+        show_dollar (bool): Show dollar amounts; when False, amounts are shown as percentages.
+
+    Returns:
+        dash.html.Div: The dashboard page.
+    """
+    # Sources can span several merchants; the tables and pie show one row per source
+    totals = data.assign(Source=as_text(data["Source"]), Category=as_text(data["Category"]))
+    totals = totals.groupby(["Category", "Source"], sort=False)["Amount"].sum().reset_index()
+    income_data = totals[totals["Category"] == "income"].sort_values(by="Amount", ascending=False)
+    expenses_data = totals[totals["Category"] == "expenses"].sort_values(by="Amount", ascending=False)
 
     if income_data.empty or expenses_data.empty:
         raise ValueError("Both income and expenses data must be present.")
 
-    # Calculate totals and savings
+    # Calculate totals
     total_income = income_data["Amount"].sum()
     total_expenses = expenses_data["Amount"].sum()
-    savings = total_income - total_expenses
-
-    # Prepare data for the Sankey diagram
-    nodes = []
-    links = {"source": [], "target": [], "value": [], "color": []}
-    combined_colors = COLOR_SCHEMES['PIE'] * ((len(income_data) + len(expenses_data)) // len(COLOR_SCHEMES['PIE']) + 1)
-
-    def add_node(label):
-        """Add a unique node to the Sankey diagram."""
-        if label not in nodes:
-            nodes.append(label)
-        return nodes.index(label)
-
-    # Add income nodes to the Sankey diagram
-    for i, row in income_data.iterrows():
-        source_idx = add_node(row["Source"])
-        budget_idx = add_node("Budget")
-        links["source"].append(source_idx)
-        links["target"].append(budget_idx)
-        links["value"].append(row["Amount"])
-        links["color"].append(combined_colors[i])
-
-    # Add expense nodes to the Sankey diagram
-    for i, row in expenses_data.iterrows():
-        budget_idx = add_node("Budget")
-        expense_idx = add_node(row["Source"])
-        links["source"].append(budget_idx)
-        links["target"].append(expense_idx)
-        links["value"].append(row["Amount"])
-        links["color"].append(combined_colors[len(income_data) + i])
-
-    # Add savings node if savings are positive
-    if savings > 0:
-        budget_idx = add_node("Budget")
-        savings_idx = add_node("Savings")
-        links["source"].append(budget_idx)
-        links["target"].append(savings_idx)
-        links["value"].append(savings)
-        links["color"].append("#197")  # Custom savings color
-
-    # Create Dash app
-    app = Dash(__name__)
 
-    # Layout for the Dash app
-    app.layout = html.Div(style=STYLES['DEFAULT'], children=[
+    # Prepare data for the Sankey diagram and the pie, keeping the largest sources
+    nodes, links = build_sankey(data, BUDGET_CONSTANTS['SANKEY_TOP_N'], BUDGET_CONSTANTS['SANKEY_MERCHANTS'])
+    expenses_pie = expenses_data.assign(
+        Source=bucket_top(expenses_data["Source"], expenses_data["Amount"], BUDGET_CONSTANTS['SANKEY_TOP_N'], "Other Expenses")
+    ).groupby("Source", sort=False)["Amount"].sum().reset_index()
+
+    return html.Div(style=STYLES['DEFAULT'], children=[
         # Title Section
         html.H1("Budget Visualization", style=STYLES['H1']),
         html.Hr(style=STYLES['DIVIDER']),
@@ -104,12 +262,12 @@ def visualize_budget(data_file):
                         color=STYLES['DEFAULT']["color"]
                     ),
                     link=dict(
-                        source=links["source"],
-                        target=links["target"],
-                        value=links["value"],
-                        color=links["color"],
+                        source=links["source"].tolist(),
+                        target=links["target"].tolist(),
+                        value=links["value"].tolist(),
+                        color=links["color"].tolist(),
                         hovertemplate="<b>%{source.label} → %{target.label}</b><br>"
-                                      f"{'Amount: $%{value:,.2f}' if SHOW_DOLLAR else 'Percentage: %{value:.1f}%'}<extra></extra>"
+                                      f"{'Amount: $%{value:,.2f}' if show_dollar else 'Percentage: %{value:.1f}%'}<extra></extra>"
                     )
                 )).update_layout(
                     margin=dict(l=50, r=50, t=50, b=50),
@@ -120,6 +278,34 @@ def visualize_budget(data_file):
         ]),
         html.Hr(style=STYLES['DIVIDER']),
 
+        # Savings Section (precomputed period summary)
+        *([
+            html.Div(style={
+                "backgroundColor": STYLES['TABLE']["backgroundColor"],
+                "padding": "20px",
+                "borderRadius": "10px",
+                "marginBottom": "20px"
+            }, children=[
+                html.H2("Savings", style=STYLES['H2']),
+                dcc.Graph(figure=create_savings_chart(summary, show_dollar))
+            ]),
+            html.Hr(style=STYLES['DIVIDER']),
+        ] if summary is not None and not summary.empty else []),
+
+        # Trend Section (rolling averages and forecast)
+        *([
+            html.Div(style={
+                "backgroundColor": STYLES['TABLE']["backgroundColor"],
+                "padding": "20px",
+                "borderRadius": "10px",
+                "marginBottom": "20px"
+            }, children=[
+                html.H2("Trend", style=STYLES['H2']),
+                dcc.Graph(figure=create_trend_chart(trend, show_dollar))
+            ]),
+            html.Hr(style=STYLES['DIVIDER']),
+        ] if trend is not None and not trend.empty else []),
+
         # Expense Breakdown Section (Pie Chart)
         html.Div(style={
             "backgroundColor": STYLES['TABLE']["backgroundColor"],
@@ -131,7 +317,7 @@ def visualize_budget(data_file):
             dcc.Graph(
                 figure=configure_pie_traces(
                     px.pie(
-                        expenses_data,
+                        expenses_pie,
                         values="Amount",
                         names="Source",
                     ).update_layout(
@@ -141,8 +327,8 @@ def visualize_budget(data_file):
                             color=STYLES['DEFAULT']["color"]
                         )
                     ),
-                    expenses_data["Amount"],
-                    show_dollar=SHOW_DOLLAR
+                    expenses_pie["Amount"],
+                    show_dollar=show_dollar
                 )
             )
         ]),
@@ -173,7 +359,7 @@ def visualize_budget(data_file):
                     html.Tr([
                         html.Td(row["Source"], style={**STYLES['TABLE_ROW'], "width": "50%"}),
                         html.Td(
-                            f"${row['Amount']:,.2f}" if SHOW_DOLLAR else f"{(row['Amount'] / total_income) * 100:.1f}%",
+                            f"${row['Amount']:,.2f}" if show_dollar else f"{(row['Amount'] / total_income) * 100:.1f}%",
                             style={**STYLES['TABLE_ROW'], "width": "50%"}
                         )
                     ])
@@ -199,7 +385,7 @@ def visualize_budget(data_file):
                     html.Tr([
                         html.Td(row["Source"], style={**STYLES['TABLE_ROW'], "width": "50%"}),
                         html.Td(
-                            f"${row['Amount']:,.2f}" if SHOW_DOLLAR else f"{(row['Amount'] / total_expenses) * 100:.1f}%",
+                            f"${row['Amount']:,.2f}" if show_dollar else f"{(row['Amount'] / total_expenses) * 100:.1f}%",
                             style={**STYLES['TABLE_ROW'], "width": "50%"}
                         )
                     ])
@@ -209,6 +395,21 @@ def visualize_budget(data_file):
         ])
     ])
 
+def visualize_budget(data, summary=None, trend=None):
+    """
+    Serve the budget dashboard on its own port.
+
+    Args:
+        data (pd.DataFrame): Source, Category and Amount rows to chart.
+        summary (pd.DataFrame, optional): Period summary, see `create_budget_layout`.
+        trend (pd.DataFrame, optional): Monthly trend, see `create_budget_layout`.
+    """
+    # Free the port for the budget visualization
+    kill_port(PORTS['PORT_BUDGET'])
+
+    app = Dash(__name__)
+    app.layout = create_budget_layout(data, summary, trend, SHOW_DOLLAR)
+
     # Automatically open the app in the browser
     Timer(1, open_browser, args=[PORTS['PORT_BUDGET']]).start()
 
@@ -220,4 +421,4 @@ if __name__ == "__main__":
     args = parse_args()
     SHOW_DOLLAR = args.show_dollar
     set_current_theme(args.theme)
-    visualize_budget(FILE_PATHS['CASH_FLOW'])
\ No newline at end of file
+    visualize_budget(*load_cash_flow())
\ No newline at end of file
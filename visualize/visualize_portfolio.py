@@ -1,25 +1,31 @@
-from dash import Dash, dcc, html, Input, Output
+from dash import Dash, dcc, html
 from threading import Timer
 import os, sys
 import pandas as pd
 import plotly.express as px, plotly.graph_objects as go
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from helpers.utils.constants import FILE_PATHS, PORTS
+from helpers.utils.constants import FILE_PATHS, PORTS, RISK_CONSTANTS
+from helpers.utils.history import get_value_history, load_history
+from helpers.utils.storage import read_table
 from helpers.utils.helpers import parse_args, kill_port, open_browser
+from calculate.calculate_lots import build_lots, summarize_positions
+from calculate.calculate_rebalance import get_account_name
+from calculate.calculate_returns import compute_returns
 from helpers.utils.styling import COLOR_SCHEMES, STYLES, configure_pie_traces, set_current_theme
 
-def visualize_portfolio(portfolio_file):
+def create_portfolio_layout(portfolio_file, show_dollar=True):
     """
-    Generate and display portfolio visualizations using Dash.
+    Build the portfolio dashboard layout.
 
     Args:
-        portfolio_file (str): Path to the portfolio CSV file.
-    """
-    # Free up the specified port before running the app
-    kill_port(PORTS['PORT_PORTFOLIO'])
+        portfolio_file (str): Path to the portfolio file (CSV, Parquet or Feather).
+        show_dollar (bool): Show dollar amounts; when False, values are shown as percentages.
 
+    Returns:
+        dash.html.Div: The dashboard page.
+    """
     # Load and validate the portfolio data
-    portfolio = pd.read_csv(portfolio_file)
+    portfolio = read_table(portfolio_file)
     valid_portfolio = portfolio[portfolio["Value"] > 0].copy()
 
     if valid_portfolio.empty:
@@ -49,10 +55,69 @@ def visualize_portfolio(portfolio_file):
     )
     contribution_summary = contribution_summary[["Label", "Investment", "Value"]]
 
-    # Set up Dash app
-    app = Dash(__name__)
+    # 4. Daily portfolio value from the snapshot history
+    value_history = get_value_history()
+    if not show_dollar and not value_history.empty:
+        value_history["Value"] = (value_history["Value"] / value_history["Value"].iloc[0] - 1) * 100
+
+    # 5. Time-weighted and money-weighted returns per type and for the portfolio
+    returns_summary = compute_returns(portfolio, history=load_history())
+    returns_summary = returns_summary[returns_summary["Level"] != "Holding"].copy()
+    returns_summary["Name"] = returns_summary["Name"].str.upper()
+    twr_window = returns_summary["TWR Window"].iloc[0].lower() if len(returns_summary) else ""
 
-    app.layout = html.Div(
+    # 6. Positions aggregated from lots for the overview tables
+    positions_summary = summarize_positions(*build_lots(portfolio))
+    positions_summary = positions_summary[positions_summary["Value"] > 0].copy()
+    positions_summary["Ticker"] = positions_summary["Ticker"].str.upper()
+    positions_summary["Type"] = positions_summary["Type"].str.upper()
+
+    # 7. Risk analytics from calculate_risk.py, if they have been computed
+    risk_summary = read_table(FILE_PATHS['RISK_OUTPUT'], schema=None) if os.path.exists(FILE_PATHS['RISK_OUTPUT']) else pd.DataFrame()
+    if not risk_summary.empty:
+        risk_portfolio = risk_summary.iloc[-1]
+        risk_holdings = risk_summary.iloc[:-1]
+        risk_holdings = risk_holdings[risk_holdings["Volatility (%)"] > 0].copy()
+        risk_holdings["Ticker"] = risk_holdings["Ticker"].astype(str).str.upper()
+        risk_label = f"{RISK_CONSTANTS['CONFIDENCE']:.0%} {RISK_CONSTANTS['HORIZON_DAYS']}-Day"
+        risk_metrics = [
+            ("Volatility", f"{risk_portfolio['Volatility (%)']:.2f}%"),
+            ("Beta", f"{risk_portfolio['Beta']:.2f}"),
+            *[
+                (
+                    f"{risk_label} {name}",
+                    f"${risk_portfolio[column]:,.2f}" if show_dollar else f"{risk_portfolio[column] / risk_portfolio['Value'] * 100:.2f}%"
+                )
+                for name, column in [
+                    ("Historical VaR", "Historical VaR"),
+                    ("Monte Carlo VaR", "Monte Carlo VaR"),
+                    ("Expected Shortfall", "Expected Shortfall"),
+                ]
+            ],
+        ]
+
+    # 8. Planned trades from calculate_rebalance.py for this account, if any
+    rebalance_trades = read_table(FILE_PATHS['REBALANCE_OUTPUT'], schema=None) if os.path.exists(FILE_PATHS['REBALANCE_OUTPUT']) else pd.DataFrame()
+    if not rebalance_trades.empty:
+        rebalance_trades = rebalance_trades[rebalance_trades["Account"] == get_account_name(portfolio_file)].copy()
+        rebalance_trades["Type"] = rebalance_trades["Type"].str.upper()
+        rebalance_trades["Bucket"] = rebalance_trades["Bucket"].astype(str).str.upper()
+        rebalance_trades["Share (%)"] = rebalance_trades["Amount"] / valid_portfolio["Value"].sum() * 100
+        rebalance_columns = [
+            ("Action", lambda row: row["Action"]),
+            ("Ticker", lambda row: row["Ticker"]),
+            ("Target", lambda row: row["Bucket"]),
+            ("Quantity", lambda row: f"{row['Quantity']:,.4f}"),
+            *([
+                ("Price", lambda row: f"${row['Price']:,.2f}"),
+                ("Amount", lambda row: f"${row['Amount']:,.2f}"),
+                ("Long / Short-Term Gain", lambda row: f"${row['Long-Term Gain']:,.2f} / ${row['Short-Term Gain']:,.2f}"),
+            ] if show_dollar else [
+                ("Share of Portfolio", lambda row: f"{row['Share (%)']:.2f}%"),
+            ]),
+        ]
+
+    return html.Div(
         style=STYLES['DEFAULT'],
         children=[
             # Title
@@ -84,7 +149,7 @@ def visualize_portfolio(portfolio_file):
                                 )
                             ),
                             type_summary["Value"],
-                            show_dollar=SHOW_DOLLAR
+                            show_dollar=show_dollar
                         )
                     )
                 ]
@@ -118,7 +183,7 @@ def visualize_portfolio(portfolio_file):
                                         axis=1
                                     ),
                                     text=gain_loss_summary.apply(
-                                        lambda row: f"${row['Gain/Loss']:,.2f} ({row['% Gain/Loss']:.1f}%)" if SHOW_DOLLAR else f"{row['% Gain/Loss']:.1f}%",
+                                        lambda row: f"${row['Gain/Loss']:,.2f} ({row['% Gain/Loss']:.1f}%)" if show_dollar else f"{row['% Gain/Loss']:.1f}%",
                                         axis=1
                                     ),
                                     textposition="outside",
@@ -140,7 +205,7 @@ def visualize_portfolio(portfolio_file):
                             ),
                             yaxis=dict(
                                 title=dict(
-                                    text="Gain/Loss (%)" if not SHOW_DOLLAR else "Gain/Loss ($)",
+                                    text="Gain/Loss (%)" if not show_dollar else "Gain/Loss ($)",
                                     font=dict(
                                         size=int(STYLES['DEFAULT']["fontSize"].replace("px", "")),
                                         family=STYLES['DEFAULT']["fontFamily"],
@@ -187,7 +252,7 @@ def visualize_portfolio(portfolio_file):
                                 y=contribution_summary["Investment"],
                                 marker_color=COLOR_SCHEMES['CONTRIBUTION']["investment"],
                                 text=contribution_summary["Investment"].apply(
-                                    lambda x: f"${x:,.2f}" if SHOW_DOLLAR else ""),
+                                    lambda x: f"${x:,.2f}" if show_dollar else ""),
                                 textposition="outside"
                             ),
                             go.Bar(
@@ -196,7 +261,7 @@ def visualize_portfolio(portfolio_file):
                                 y=contribution_summary["Value"],
                                 marker_color=COLOR_SCHEMES['CONTRIBUTION']["current_value"],
                                 text=contribution_summary["Value"].apply(
-                                    lambda x: f"${x:,.2f}" if SHOW_DOLLAR else ""),
+                                    lambda x: f"${x:,.2f}" if show_dollar else ""),
                                 textposition="outside"
                             )
                         ]).update_layout(
@@ -240,11 +305,222 @@ def visualize_portfolio(portfolio_file):
                             ),
                             showlegend=True
                         )
-                    )
+                    ),
+                    dcc.Graph(
+                        figure=go.Figure(data=[
+                            go.Bar(
+                                name=label,
+                                x=returns_summary["Name"],
+                                y=returns_summary[column],
+                                marker_color=COLOR_SCHEMES['CONTRIBUTION'][color],
+                                text=returns_summary[column].apply(lambda x: f"{x:.1f}%" if pd.notna(x) else ""),
+                                textposition="outside"
+                            )
+                            for column, label, color in [
+                                ("TWR (%)", f"TWR ({twr_window})", "investment"),
+                                ("XIRR (%)", "XIRR (since purchase)", "current_value"),
+                            ]
+                        ]).update_layout(
+                            xaxis=dict(
+                                title=dict(
+                                    text="Type",
+                                    font=dict(
+                                        size=int(STYLES['DEFAULT']["fontSize"].replace("px", "")),
+                                        family=STYLES['DEFAULT']["fontFamily"],
+                                        color=STYLES['DEFAULT']["color"]
+                                    )
+                                ),
+                                tickfont=dict(color=STYLES['DEFAULT']["color"])
+                            ),
+                            yaxis=dict(
+                                title=dict(
+                                    text="Return (%)",
+                                    font=dict(
+                                        size=int(STYLES['DEFAULT']["fontSize"].replace("px", "")),
+                                        family=STYLES['DEFAULT']["fontFamily"],
+                                        color=STYLES['DEFAULT']["color"]
+                                    )
+                                ),
+                                tickfont=dict(color=STYLES['DEFAULT']["color"])
+                            ),
+                            barmode="group",
+                            paper_bgcolor=STYLES['TABLE']["backgroundColor"],
+                            legend=dict(
+                                itemsizing="constant",
+                                traceorder="normal",
+                                orientation="h",
+                                yanchor="bottom",
+                                y=1.02,
+                                xanchor="right",
+                                x=1,
+                                font=dict(
+                                    family=STYLES['H2']["fontFamily"],
+                                    color=STYLES['H2']["color"]
+                                )
+                            ),
+                            showlegend=True
+                        )
+                    ),
+                    *([
+                        dcc.Graph(
+                            figure=go.Figure(data=[
+                                go.Scatter(
+                                    name="Portfolio Value",
+                                    x=value_history["Date"],
+                                    y=value_history["Value"],
+                                    mode="lines",
+                                    line=dict(color=COLOR_SCHEMES['CONTRIBUTION']["current_value"]),
+                                    hovertemplate=(
+                                        "%{x|%Y-%m-%d}<br>%{y:$,.2f}<extra></extra>" if show_dollar else
+                                        "%{x|%Y-%m-%d}<br>%{y:.1f}%<extra></extra>"
+                                    )
+                                )
+                            ]).update_layout(
+                                xaxis=dict(
+                                    title=dict(
+                                        text="Date",
+                                        font=dict(
+                                            size=int(STYLES['DEFAULT']["fontSize"].replace("px", "")),
+                                            family=STYLES['DEFAULT']["fontFamily"],
+                                            color=STYLES['DEFAULT']["color"]
+                                        )
+                                    ),
+                                    tickfont=dict(color=STYLES['DEFAULT']["color"])
+                                ),
+                                yaxis=dict(
+                                    title=dict(
+                                        text="Value ($)" if show_dollar else "Change (%)",
+                                        font=dict(
+                                            size=int(STYLES['DEFAULT']["fontSize"].replace("px", "")),
+                                            family=STYLES['DEFAULT']["fontFamily"],
+                                            color=STYLES['DEFAULT']["color"]
+                                        )
+                                    ),
+                                    tickfont=dict(color=STYLES['DEFAULT']["color"])
+                                ),
+                                paper_bgcolor=STYLES['TABLE']["backgroundColor"],
+                                showlegend=False
+                            )
+                        )
+                    ] if not value_history.empty else [])
                 ]
             ),
             html.Hr(style=STYLES['DIVIDER']),
 
+            # Risk Section
+            *([
+                html.Div(
+                    style={
+                        "backgroundColor": STYLES['TABLE']["backgroundColor"],
+                        "padding": "20px",
+                        "borderRadius": "10px",
+                        "marginBottom": "20px"
+                    },
+                    children=[
+                        html.H2("Risk", style=STYLES['H2']),
+                        html.Table(
+                            children=[
+                                html.Tr([
+                                    html.Th(name, style={**STYLES['TABLE_HEADER'], "width": f"{100 // len(risk_metrics)}%"})
+                                    for name, _ in risk_metrics
+                                ]),
+                                html.Tr([
+                                    html.Td(value, style={**STYLES['TABLE_ROW'], "width": f"{100 // len(risk_metrics)}%"})
+                                    for _, value in risk_metrics
+                                ])
+                            ],
+                            style=STYLES['TABLE']
+                        ),
+                        dcc.Graph(
+                            figure=go.Figure(data=[
+                                go.Bar(
+                                    name=column.replace(" (%)", ""),
+                                    x=risk_holdings["Ticker"],
+                                    y=risk_holdings[column],
+                                    marker_color=COLOR_SCHEMES['CONTRIBUTION'][color],
+                                    text=risk_holdings[column].apply(lambda x: f"{x:.1f}%"),
+                                    textposition="outside"
+                                )
+                                for column, color in [("Volatility (%)", "investment"), ("Risk Contribution (%)", "current_value")]
+                            ]).update_layout(
+                                xaxis=dict(
+                                    title=dict(
+                                        text="Ticker",
+                                        font=dict(
+                                            size=int(STYLES['DEFAULT']["fontSize"].replace("px", "")),
+                                            family=STYLES['DEFAULT']["fontFamily"],
+                                            color=STYLES['DEFAULT']["color"]
+                                        )
+                                    ),
+                                    tickfont=dict(color=STYLES['DEFAULT']["color"]),
+                                    tickangle=45
+                                ),
+                                yaxis=dict(
+                                    title=dict(
+                                        text="Percent (%)",
+                                        font=dict(
+                                            size=int(STYLES['DEFAULT']["fontSize"].replace("px", "")),
+                                            family=STYLES['DEFAULT']["fontFamily"],
+                                            color=STYLES['DEFAULT']["color"]
+                                        )
+                                    ),
+                                    tickfont=dict(color=STYLES['DEFAULT']["color"])
+                                ),
+                                barmode="group",
+                                paper_bgcolor=STYLES['TABLE']["backgroundColor"],
+                                legend=dict(
+                                    itemsizing="constant",
+                                    traceorder="normal",
+                                    orientation="h",
+                                    yanchor="bottom",
+                                    y=1.02,
+                                    xanchor="right",
+                                    x=1,
+                                    font=dict(
+                                        family=STYLES['H2']["fontFamily"],
+                                        color=STYLES['H2']["color"]
+                                    )
+                                ),
+                                showlegend=True
+                            )
+                        )
+                    ]
+                ),
+                html.Hr(style=STYLES['DIVIDER']),
+            ] if not risk_summary.empty else []),
+
+            # Rebalance Section
+            *([
+                html.Div(
+                    style={
+                        "backgroundColor": STYLES['TABLE']["backgroundColor"],
+                        "padding": "20px",
+                        "borderRadius": "10px",
+                        "marginBottom": "20px"
+                    },
+                    children=[
+                        html.H2("Rebalance", style=STYLES['H2']),
+                        html.Table(
+                            children=[
+                                html.Tr([
+                                    html.Th(name, style={**STYLES['TABLE_HEADER'], "width": f"{100 // len(rebalance_columns)}%"})
+                                    for name, _ in rebalance_columns
+                                ]),
+                                *[
+                                    html.Tr([
+                                        html.Td(format_cell(row), style={**STYLES['TABLE_ROW'], "width": f"{100 // len(rebalance_columns)}%"})
+                                        for _, format_cell in rebalance_columns
+                                    ])
+                                    for _, row in rebalance_trades.iterrows()
+                                ]
+                            ],
+                            style=STYLES['TABLE']
+                        )
+                    ]
+                ),
+                html.Hr(style=STYLES['DIVIDER']),
+            ] if not rebalance_trades.empty else []),
+
             # Overview Section
             html.Div(
                 style={
@@ -263,24 +539,26 @@ def visualize_portfolio(portfolio_file):
                                     html.Table(
                                         children=[
                                             html.Tr([
-                                                html.Th("Ticker", style={**STYLES['TABLE_HEADER'], "width": "16%"}),
-                                                html.Th("Value", style={**STYLES['TABLE_HEADER'], "width": "16%"}),
-                                                html.Th("Quantity", style={**STYLES['TABLE_HEADER'], "width": "16%"}),
-                                                html.Th("Cost", style={**STYLES['TABLE_HEADER'], "width": "16%"}),
-                                                html.Th("Dollar Total Gain", style={**STYLES['TABLE_HEADER'], "width": "16%"}),
-                                                html.Th("Percentage Total Gain", style={**STYLES['TABLE_HEADER'], "width": "16%"})
+                                                html.Th("Ticker", style={**STYLES['TABLE_HEADER'], "width": "14%"}),
+                                                html.Th("Value", style={**STYLES['TABLE_HEADER'], "width": "14%"}),
+                                                html.Th("Quantity", style={**STYLES['TABLE_HEADER'], "width": "14%"}),
+                                                html.Th("Cost", style={**STYLES['TABLE_HEADER'], "width": "14%"}),
+                                                html.Th("Dollar Total Gain", style={**STYLES['TABLE_HEADER'], "width": "14%"}),
+                                                html.Th("Percentage Total Gain", style={**STYLES['TABLE_HEADER'], "width": "14%"}),
+                                                html.Th("Long / Short-Term Gain", style={**STYLES['TABLE_HEADER'], "width": "16%"})
                                             ]),
                                             *[
                                                 html.Tr([
-                                                    html.Td(row["Ticker"], style={**STYLES['TABLE_ROW'], "width": "16%"}),
-                                                    html.Td(f"${row['Value']:,.2f}", style={**STYLES['TABLE_ROW'], "width": "16%"}),
-                                                    html.Td(f"{row['Quantity']:,}", style={**STYLES['TABLE_ROW'], "width": "16%"}),
+                                                    html.Td(row["Ticker"], style={**STYLES['TABLE_ROW'], "width": "14%"}),
+                                                    html.Td(f"${row['Value']:,.2f}", style={**STYLES['TABLE_ROW'], "width": "14%"}),
+                                                    html.Td(f"{row['Quantity']:,}", style={**STYLES['TABLE_ROW'], "width": "14%"}),
+                                                    html.Td(f"${row['Cost Basis']:,.2f}", style={**STYLES['TABLE_ROW'], "width": "14%"}),
+                                                    html.Td(f"${row['Gain/Loss']:,.2f}", style={**STYLES['TABLE_ROW'], "width": "14%"}),
+                                                    html.Td(f"{row['% Gain/Loss']:.2f}%", style={**STYLES['TABLE_ROW'], "width": "14%"}),
                                                     html.Td(
-                                                        f"${row['Cost Basis'] * row['Quantity'] if row['Type'].upper() not in ['CASH', '401K', 'HSA'] else row['Cost Basis']:,.2f}",
+                                                        f"${row['Long-Term Gain']:,.2f} / ${row['Short-Term Gain']:,.2f}",
                                                         style={**STYLES['TABLE_ROW'], "width": "16%"}
-                                                    ),
-                                                    html.Td(f"${row['Gain/Loss']:,.2f}", style={**STYLES['TABLE_ROW'], "width": "16%"}),
-                                                    html.Td(f"{row['% Gain/Loss']:.2f}%", style={**STYLES['TABLE_ROW'], "width": "16%"})
+                                                    )
                                                 ])
                                                 for _, row in group.iterrows()
                                             ],
@@ -310,7 +588,7 @@ def visualize_portfolio(portfolio_file):
                                 ]
                             )
                             for type_group, group in sorted(
-                                valid_portfolio.groupby("Type"),
+                                positions_summary.groupby("Type"),
                                 key=lambda g: g[1]["Value"].sum(),
                                 reverse=True
                             )
@@ -330,10 +608,23 @@ def visualize_portfolio(portfolio_file):
                         )
                     ]
                 )
-            ) if SHOW_DOLLAR else []
+            ) if show_dollar else []
         ]
     )
 
+def visualize_portfolio(portfolio_file):
+    """
+    Serve the portfolio dashboard on its own port.
+
+    Args:
+        portfolio_file (str): Path to the portfolio file (CSV, Parquet or Feather).
+    """
+    # Free up the specified port before running the app
+    kill_port(PORTS['PORT_PORTFOLIO'])
+
+    app = Dash(__name__)
+    app.layout = create_portfolio_layout(portfolio_file, SHOW_DOLLAR)
+
     # Open the app in the browser
     Timer(1, open_browser, args=[PORTS['PORT_PORTFOLIO']]).start()
 